@@ -5,13 +5,16 @@ from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
-def create_app():
+def create_app(config_name=None, auto_migrate=None):
     """
     创建 Flask 应用并注册蓝图。
+    config_name 为 development / production / testing（或一个配置类），默认取环境变量 EXAM_APP_ENV；
+    auto_migrate 为 None 时按配置 AUTO_MIGRATE 决定启动时是否执行数据库迁移。
     """
     app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'))
     # 加载配置
-    app.config.from_object('app.config.Config')
+    from .config import get_config
+    app.config.from_object(get_config(config_name))
 
     # 初始化第三方扩展
     db.init_app(app)
@@ -28,12 +31,25 @@ def create_app():
     # 创建数据库（如果尚未创建）
     with app.app_context():
         # 导入 models 以确保表模型已定义
-        from . import models
-        db.create_all()
-        # 创建内置用户（如果不存在）
-        models.create_builtin_users()
+        from . import models, migrations
+        # 先注册 SQLite 连接参数（WAL、busy_timeout 等），之后建立的连接都会应用
+        from .services.sqlite_service import sqlite_service
+        sqlite_service.init_app(app)
+        # 建表、迁移、内置账号只在首次启动（或模型/迁移变化后）执行，之后凭初始化标记跳过
+        if not migrations.is_initialized(app):
+            db.create_all()
+            # 执行未执行的数据库迁移（给已有的表补索引等）
+            if app.config.get('AUTO_MIGRATE', True) if auto_migrate is None else auto_migrate:
+                migrations.upgrade(log=app.logger.info)
+            # 创建内置用户（如果不存在）；迁移未执行完时表结构落后于模型，留到迁移之后
+            if not migrations.pending():
+                models.create_builtin_users()
+                migrations.mark_initialized(app)
         # 延迟导入服务，避免循环导入
         from .services.logging_service import logging_service
         logging_service.info("Flask应用启动成功", module="system")
 
+    # 定期执行 WAL 检查点与 PRAGMA optimize
+    sqlite_service.start(app)
+
     return app
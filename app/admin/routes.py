@@ -1,10 +1,15 @@
 # app/admin/routes.py
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request, current_app
 from .. import db
+from ..services.principal_service import principal_service
+from ..services.question_index import question_index
+from ..services.verdict_cache import verdict_cache
+from ..services.test_spec import COMPARE_MODES, parse_cases, spec_from_model
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, SelectField, IntegerField, SubmitField, PasswordField
-from wtforms.validators import DataRequired, Length
+from wtforms import StringField, TextAreaField, SelectField, IntegerField, SubmitField, PasswordField, FloatField, BooleanField, DateField
+from wtforms.validators import DataRequired, Length, Optional
 import csv
+import datetime
 import io
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -13,15 +18,12 @@ def admin_required(f):
     from functools import wraps
     @wraps(f)
     def wrapper(*args, **kwargs):
-        uid = session.get('user_id')
-        if not uid:
+        # 角色来自签名 session，权限纪元未变化时不查询数据库
+        p = principal_service.current()
+        if p is None:
             flash('请先登录', 'warning')
             return redirect(url_for('auth.login'))
-        
-        # 延迟导入，避免循环导入
-        from ..models import User
-        u = User.query.get(uid)
-        if not u or not u.is_admin:
+        if not p.is_admin:
             flash('需要管理员权限', 'danger')
             return redirect(url_for('auth.index'))
         return f(*args, **kwargs)
@@ -37,8 +39,44 @@ class QuestionForm(FlaskForm):
     answer = TextAreaField('参考答案')
     difficulty = IntegerField('难度', default=1)
     judge_template = TextAreaField('判题模板')
+    # 结构化测试用例（可选，填写函数名后优先于判题模板）
+    test_func = StringField('被测函数名')
+    test_cases = TextAreaField('测试用例 (JSON: [[参数列表, 期望值], ...])')
+    compare_mode = SelectField('比较方式', choices=[(m, m) for m in COMPARE_MODES], default='exact')
+    case_timeout = FloatField('单用例超时 (秒)', default=1.0)
+    stop_on_fail = BooleanField('遇到失败用例即停止', default=True)
     submit = SubmitField('保存')
 
+def _apply_test_spec(q, form):
+    """把表单中的结构化用例写入 q.test_spec，返回错误信息（无错误返回 None）。"""
+    from ..models import QuestionTestSpec
+    func_name = (form.test_func.data or '').strip()
+    if not func_name:
+        q.test_spec = None
+        return None
+    try:
+        parse_cases(form.test_cases.data)
+    except ValueError as e:
+        return str(e)
+    spec = q.test_spec or QuestionTestSpec()
+    spec.func_name = func_name
+    spec.cases = form.test_cases.data
+    spec.compare_mode = form.compare_mode.data
+    spec.case_timeout = form.case_timeout.data or 1.0
+    spec.stop_on_fail = bool(form.stop_on_fail.data)
+    q.test_spec = spec
+    return None
+
+def _fill_test_spec(form, q):
+    spec = q.test_spec
+    if spec is None:
+        return
+    form.test_func.data = spec.func_name
+    form.test_cases.data = spec.cases
+    form.compare_mode.data = spec.compare_mode or 'exact'
+    form.case_timeout.data = spec.case_timeout
+    form.stop_on_fail.data = spec.stop_on_fail
+
 class CreateStudentForm(FlaskForm):
     username = StringField('用户名', validators=[DataRequired(), Length(min=1, max=80)])
     password = PasswordField('密码', validators=[DataRequired(), Length(min=1, max=100)])
@@ -54,6 +92,14 @@ class LogFilterForm(FlaskForm):
     count = IntegerField('显示数量', default=100)
     submit = SubmitField('筛选')
 
+# 批量重评表单
+class RegradeForm(FlaskForm):
+    qids = StringField('题目 ID（逗号分隔，留空表示全部）')
+    since = DateField('起始日期', validators=[Optional()])
+    until = DateField('结束日期', validators=[Optional()])
+    restart = BooleanField('忽略检查点从头开始')
+    submit = SubmitField('重评')
+
 # 添加备份管理表单
 class BackupForm(FlaskForm):
     description = StringField('备份描述')
@@ -64,16 +110,29 @@ class BackupForm(FlaskForm):
 def dashboard():
     # 延迟导入，避免循环导入
     from ..models import Question, User
+    from ..services.analytics_service import AnalyticsService
     qcount = Question.query.count()
     users = User.query.limit(20).all()
-    return render_template('admin/dashboard.html', qcount=qcount, users=users)
+    analytics = AnalyticsService()
+    # 分位数来自流式摘要，不扫描考试记录
+    percentiles = {
+        'score_all': analytics.score_percentiles(),
+        'score_30d': analytics.score_percentiles(recent_days=30),
+        'duration_all': analytics.duration_percentiles(),
+    }
+    from ..services.cache_service import result_cache
+    return render_template('admin/dashboard.html', qcount=qcount, users=users, percentiles=percentiles,
+                           cache_stats=result_cache.snapshot_stats())
 
 @admin_bp.route('/questions')
 @admin_required
 def questions():
     from ..models import Question
+    from ..services.item_analysis_service import item_analysis_service
     qs = Question.query.order_by(Question.id.desc()).all()
-    return render_template('admin/q_list.html', qs=qs)
+    # 项目分析只增量汇总上次访问之后的新作答
+    items = item_analysis_service.stats_for()
+    return render_template('admin/q_list.html', qs=qs, items=items)
 
 @admin_bp.route('/question/add', methods=['GET', 'POST'])
 @admin_required
@@ -92,8 +151,13 @@ def question_add():
             difficulty=form.difficulty.data or 1,
             judge_template=form.judge_template.data
         )
+        error = _apply_test_spec(q, form)
+        if error:
+            flash(f'测试用例有误: {error}', 'danger')
+            return render_template('admin/q_edit.html', form=form, mode='add')
         db.session.add(q)
         db.session.commit()
+        question_index.bump()
         flash('题目已添加', 'success')
         return redirect(url_for('admin.questions'))
     return render_template('admin/q_edit.html', form=form, mode='add')
@@ -114,11 +178,37 @@ def question_edit(qid):
         q.answer = form.answer.data
         q.difficulty = form.difficulty.data or 1
         q.judge_template = form.judge_template.data
+        error = _apply_test_spec(q, form)
+        if error:
+            db.session.rollback()
+            flash(f'测试用例有误: {error}', 'danger')
+            return render_template('admin/q_edit.html', form=form, mode='edit', q=q)
         db.session.commit()
+        question_index.bump()
+        # 判题模板或答案可能已修改，旧的判题结果作废
+        verdict_cache.invalidate_question(q.id)
         flash('题目已更新', 'success')
         return redirect(url_for('admin.questions'))
+    if request.method == 'GET':
+        _fill_test_spec(form, q)
     return render_template('admin/q_edit.html', form=form, mode='edit', q=q)
 
+@admin_bp.route('/question/dry_run/<int:qid>', methods=['POST'])
+@admin_required
+def question_dry_run(qid):
+    """用参考答案试跑结构化用例，显示每个用例的结果与耗时（不经过判题结果缓存）。"""
+    from ..models import Question
+    from ..services.judge_service import judge_service
+    q = Question.query.get_or_404(qid)
+    spec = spec_from_model(q.test_spec)
+    form = QuestionForm(obj=q)
+    _fill_test_spec(form, q)
+    if spec is None:
+        flash('该题没有可用的结构化测试用例', 'warning')
+        return render_template('admin/q_edit.html', form=form, mode='edit', q=q)
+    dry_run = judge_service.run_job(q.answer or '', '', spec=spec)
+    return render_template('admin/q_edit.html', form=form, mode='edit', q=q, dry_run=dry_run)
+
 @admin_bp.route('/question/delete/<int:qid>', methods=['POST'])
 @admin_required
 def question_delete(qid):
@@ -126,6 +216,8 @@ def question_delete(qid):
     q = Question.query.get_or_404(qid)
     db.session.delete(q)
     db.session.commit()
+    question_index.bump()
+    verdict_cache.invalidate_question(qid)
     flash('已删除题目', 'info')
     return redirect(url_for('admin.questions'))
 
@@ -156,6 +248,7 @@ def import_csv():
             db.session.add(q)
             count += 1
         db.session.commit()
+        question_index.bump()
         flash(f'已导入 {count} 道题', 'success')
         return redirect(url_for('admin.questions'))
     return render_template('admin/import_csv.html')
@@ -164,8 +257,35 @@ def import_csv():
 @admin_required
 def records():
     from ..models import ExamRecord
+    from ..services.regrade_service import regrade_service
     recs = ExamRecord.query.order_by(ExamRecord.created_at.desc()).limit(200).all()
-    return render_template('admin/records.html', recs=recs)
+    return render_template('admin/records.html', recs=recs, form=RegradeForm(),
+                           checkpoints=regrade_service.checkpoints(), regrade_running=regrade_service.running)
+
+@admin_bp.route('/records/regrade', methods=['POST'])
+@admin_required
+def regrade_records():
+    """在后台重评历史考试记录，进度见考试记录页的检查点列表。"""
+    from ..services.regrade_service import regrade_service
+    form = RegradeForm()
+    if not form.validate_on_submit():
+        flash('重评参数有误', 'danger')
+        return redirect(url_for('admin.records'))
+    try:
+        qids = [int(x) for x in (form.qids.data or '').replace('，', ',').split(',') if x.strip()]
+    except ValueError:
+        flash('题目 ID 应为逗号分隔的整数', 'danger')
+        return redirect(url_for('admin.records'))
+    if regrade_service.running:
+        flash(f'已有重评任务在运行: {regrade_service.running}', 'warning')
+        return redirect(url_for('admin.records'))
+    since = datetime.datetime.combine(form.since.data, datetime.time()) if form.since.data else None
+    until = (datetime.datetime.combine(form.until.data + datetime.timedelta(days=1), datetime.time())
+             if form.until.data else None)
+    regrade_service.start_background(current_app._get_current_object(), qids=qids or None,
+                                     since=since, until=until, restart=form.restart.data)
+    flash('重评任务已在后台启动', 'info')
+    return redirect(url_for('admin.records'))
 
 @admin_bp.route('/create_student', methods=['GET', 'POST'])
 @admin_required
@@ -275,6 +395,8 @@ def restore_backup(filename):
     result = backup_service.restore_backup(filename)
     
     if result['success']:
+        # 数据库文件已被替换，题库索引需要重建
+        question_index.bump()
         flash(f'数据库恢复成功: {result["message"]}', 'success')
         # 记录日志
         uid = session.get('user_id')
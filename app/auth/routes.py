@@ -23,7 +23,9 @@ def login():
     if form.validate_on_submit():
         u = User.query.filter_by(username=form.username.data.strip()).first()
         if u and u.check_password(form.password.data.strip()):
-            session['user_id'] = u.id
+            # 角色与权限版本写入 session，之后的权限校验不再查询用户表
+            from ..services.principal_service import principal_service
+            principal_service.login(u)
             flash('登录成功', 'success')
             # 根据是否管理员跳转
             if u.is_admin:
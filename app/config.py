@@ -15,3 +15,110 @@ class Config:
     # 备份配置
     BACKUP_DIR = os.path.join(BASE_DIR, 'backups')
     MAX_BACKUPS = 10
+    # 组卷蓝图："题型:数量[:难度]"，难度可写 3、1-2 或 1|3
+    EXAM_BLUEPRINT = 'choice:3:1-2,fill:1,code:1:3'
+    # 预生成试卷池容量与触发后台补充的低水位
+    PAPER_POOL_SIZE = 50
+    PAPER_POOL_LOW_WATER = 10
+    # 判题进程池：进程数、单次 CPU 秒数、墙钟秒数、内存(MB)、输出字节数、进程处理多少个任务后回收
+    JUDGE_WORKERS = 2
+    JUDGE_CPU_SECONDS = 2
+    JUDGE_WALL_SECONDS = 5
+    JUDGE_MEMORY_MB = 256
+    JUDGE_MAX_OUTPUT = 64 * 1024
+    JUDGE_MAX_JOBS_PER_WORKER = 200
+    # 每个判题进程缓存的已编译代码对象数量（按内容哈希 LRU）
+    JUDGE_CODE_CACHE_SIZE = 256
+    # 等待空闲判题进程的最长秒数
+    JUDGE_QUEUE_TIMEOUT = 30
+    # 一次考试提交中所有编程题的评分总时限（秒），超时的题判为不通过
+    EXAM_GRADE_DEADLINE = 15
+    # 异步判题队列：总深度上限、每个用户最多排队任务数、已完成任务保留秒数
+    JUDGE_QUEUE_MAX_DEPTH = 200
+    JUDGE_QUEUE_PER_USER = 3
+    JUDGE_JOB_RETENTION = 600
+    # 多进程部署时把判题任务状态写入 <数据库文件>.judge-jobs/，任意工作进程都能响应状态轮询（serve.py 会自动开启）
+    JUDGE_JOBS_SHARED = False
+    # 判题结果缓存：内存 LRU 条数，以及是否同时持久化到 judge_verdicts 表
+    VERDICT_CACHE_SIZE = 10000
+    VERDICT_CACHE_PERSIST = False
+    # 批量重评：每批记录数（每批一个事务并写检查点），选择/填空评分的进程数（0 表示 CPU 核数）
+    REGRADE_BATCH_SIZE = 500
+    REGRADE_WORKERS = 0
+    # 统计分析的列式内存快照：'auto' 安装了 NumPy 时启用；True 总是启用（无 NumPy 时用纯 Python）；False 直接走 SQL 聚合
+    ANALYTICS_SNAPSHOT = 'auto'
+    # 分析/看板结果缓存：新鲜期（秒，0 表示不缓存），过期后仍可返回旧值并后台刷新的时长（秒）
+    RESULT_CACHE_TTL = 30
+    RESULT_CACHE_STALE = 600
+    # 启动时自动执行未执行的数据库迁移（关闭后用 python maintenance.py migrate 手动执行）
+    AUTO_MIGRATE = True
+    # 首次初始化完成后写入 <数据库文件>.init 标记，之后启动跳过建表/迁移/内置账号检查
+    INIT_MARKER = True
+    # SQLite 连接参数：每个新连接依次执行的 PRAGMA（见 services/sqlite_service.py）
+    # WAL 让读请求与考试提交的写入互不阻塞；busy_timeout 让并发写入排队等待而不是立刻报 "database is locked"
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,          # 毫秒
+        'temp_store': 'MEMORY',
+        'cache_size': -16000,          # 负数表示 KiB，约 16MB
+        'mmap_size': 64 * 1024 * 1024,
+    }
+    # 连接池：读多写少的页面可在多个线程中并发读取
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'connect_args': {'timeout': 30, 'check_same_thread': False},
+    }
+    # 后台执行 WAL 检查点与 PRAGMA optimize 的间隔（秒，0 表示不启动）
+    SQLITE_MAINTENANCE_INTERVAL = 300
+    # 登录用户 principal 的进程内 LRU 条数（权限校验通常只读 session，权限纪元变化后才查库）
+    PRINCIPAL_CACHE_SIZE = 1024
+    # 多进程服务器 serve.py：工作进程数（0 表示 CPU 核数）、每个进程的处理线程数、
+    # 每个进程处理多少请求后重启（0 表示不重启，另加随机抖动避免同时重启）、优雅退出等待时长（秒）
+    SERVE_WORKERS = 0
+    SERVE_THREADS = 8
+    SERVE_MAX_REQUESTS = 2000
+    SERVE_MAX_REQUESTS_JITTER = 200
+    SERVE_GRACEFUL_TIMEOUT = 30
+
+
+class DevelopmentConfig(Config):
+    """开发环境：沿用默认配置。"""
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    """生产环境：更大的页缓存与内存映射，更频繁的检查点。"""
+    SQLITE_PRAGMAS = dict(Config.SQLITE_PRAGMAS, busy_timeout=10000, cache_size=-65536,
+                          mmap_size=256 * 1024 * 1024)
+    SQLALCHEMY_ENGINE_OPTIONS = dict(Config.SQLALCHEMY_ENGINE_OPTIONS, pool_size=20, max_overflow=40)
+    SQLITE_MAINTENANCE_INTERVAL = 60
+
+
+class TestingConfig(Config):
+    """测试环境：独立的数据库文件，不落盘同步，不启动后台维护。"""
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'exam_app_test.db')
+    SQLITE_PRAGMAS = dict(Config.SQLITE_PRAGMAS, journal_mode='MEMORY', synchronous='OFF')
+    SQLITE_MAINTENANCE_INTERVAL = 0
+    RESULT_CACHE_TTL = 0
+
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name=None):
+    """按名称（默认取环境变量 EXAM_APP_ENV，未设置时为 development）返回配置类；传入配置类时原样返回。"""
+    if isinstance(name, type):
+        return name
+    name = (name or os.environ.get('EXAM_APP_ENV') or 'development').lower()
+    if name not in config_by_name:
+        raise ValueError(f"未知的配置环境: {name}（可选 {', '.join(config_by_name)}）")
+    return config_by_name[name]
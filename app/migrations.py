@@ -0,0 +1,187 @@
+# app/migrations.py
+"""
+轻量数据库迁移
+--------------
+db.create_all() 只会创建缺失的表，不会给已有的表加索引或列。这里按版本号顺序登记迁移：
+- schema_versions 表记录已执行的迁移，当前版本为其中最大的 version；
+- upgrade() 依次执行版本号更高的迁移，每个迁移与它的版本记录在同一个事务中提交；
+- 应用启动时自动执行（配置 AUTO_MIGRATE），也可以用 `python maintenance.py migrate` 手动执行；
+- 迁移本身写成可重复执行的（CREATE INDEX IF NOT EXISTS 等）：新建的数据库由 create_all 按模型直接建好，
+  多个进程同时启动时重复执行也不会出错。
+新增迁移：在文件末尾用 @migration(下一个版本号, '说明') 登记一个函数，并在模型中同步声明。
+
+初始化标记：建表、迁移、内置账号都完成后，在数据库文件旁写一个 <数据库文件>.init 标记，
+内容为模型结构与迁移版本的指纹及数据库文件的 inode。之后的启动只比较标记（一次文件读取），
+指纹一致就跳过 create_all / 迁移 / 内置账号检查；模型或迁移有变化、数据库文件被替换或删除时自动重新初始化。
+"""
+
+from typing import Callable, List, NamedTuple, Optional
+import datetime
+import hashlib
+import json
+import os
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import SchemaVersion
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    """登记一个迁移函数（在应用上下文中以 db.session 执行，不需要自己提交）。"""
+    def decorator(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"迁移版本号必须递增: {version}")
+        MIGRATIONS.append(Migration(version, name, fn))
+        return fn
+    return decorator
+
+
+def current_version() -> int:
+    """返回数据库当前的迁移版本（没有执行过任何迁移时为 0）。"""
+    v = db.session.query(db.func.max(SchemaVersion.version)).scalar()
+    return v or 0
+
+
+def head_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def pending() -> List[Migration]:
+    applied = {v for (v,) in db.session.query(SchemaVersion.version)}
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def upgrade(target: Optional[int] = None, log: Optional[Callable[[str], None]] = None) -> List[int]:
+    """执行所有未执行的迁移（至多到 target 版本），返回本次执行的版本号列表。需在应用上下文中调用。"""
+    SchemaVersion.__table__.create(bind=db.engine, checkfirst=True)
+    done = []
+    for m in pending():
+        if target is not None and m.version > target:
+            break
+        if log is not None:
+            log(f"执行迁移 {m.version}: {m.name}")
+        try:
+            m.apply()
+            db.session.add(SchemaVersion(version=m.version, name=m.name, applied_at=datetime.datetime.utcnow()))
+            db.session.commit()
+        except IntegrityError:
+            # 其它进程已经执行并记录了这个迁移
+            db.session.rollback()
+            continue
+        except BaseException:
+            db.session.rollback()
+            raise
+        done.append(m.version)
+    return done
+
+
+# -----------------------------
+# 初始化标记
+# -----------------------------
+def schema_fingerprint() -> str:
+    """由模型中的表、列、索引与迁移版本计算的指纹（不访问数据库）。"""
+    parts = [f"head={head_version()}"]
+    for name in sorted(db.metadata.tables):
+        table = db.metadata.tables[name]
+        cols = ','.join(sorted(c.name for c in table.columns))
+        idx = ','.join(sorted(i.name or '' for i in table.indexes))
+        parts.append(f"{name}({cols})[{idx}]")
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def init_marker_path(app) -> Optional[str]:
+    """SQLite 文件数据库的初始化标记路径；其它数据库或内存数据库返回 None（每次都检查）。"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not app.config.get('INIT_MARKER', True) or not uri.startswith('sqlite:///') or ':memory:' in uri:
+        return None
+    return uri.replace('sqlite:///', '') + '.init'
+
+
+def _marker_payload(db_file: str) -> Optional[dict]:
+    try:
+        st = os.stat(db_file)
+    except OSError:
+        return None
+    return {'fingerprint': schema_fingerprint(), 'dev': st.st_dev, 'ino': st.st_ino}
+
+
+def is_initialized(app) -> bool:
+    """标记存在且与当前模型、迁移和数据库文件一致时返回 True。"""
+    path = init_marker_path(app)
+    if path is None:
+        return False
+    expected = _marker_payload(path[:-len('.init')])
+    if expected is None:
+        return False
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f) == expected
+    except (OSError, ValueError):
+        return False
+
+
+def mark_initialized(app) -> bool:
+    """所有迁移都已执行时写入初始化标记，返回是否写入。"""
+    path = init_marker_path(app)
+    if path is None or pending():
+        return False
+    payload = _marker_payload(path[:-len('.init')])
+    if payload is None:
+        return False
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+    return True
+
+
+def _execute(sql: str) -> None:
+    db.session.execute(text(sql))
+
+
+# -----------------------------
+# 迁移列表（版本号递增）
+# -----------------------------
+@migration(1, '索引 exam_records(user_id, created_at)')
+def _index_records_user_created():
+    _execute("CREATE INDEX IF NOT EXISTS ix_exam_records_user_created ON exam_records (user_id, created_at)")
+
+
+@migration(2, '索引 exam_records(created_at)')
+def _index_records_created():
+    _execute("CREATE INDEX IF NOT EXISTS ix_exam_records_created ON exam_records (created_at)")
+
+
+@migration(3, '索引 questions(qtype, difficulty)')
+def _index_questions_type_difficulty():
+    _execute("CREATE INDEX IF NOT EXISTS ix_questions_qtype_difficulty ON questions (qtype, difficulty)")
+
+
+@migration(4, '逐题作答表 exam_answers（历史记录用 maintenance.py backfill-answers 回填）')
+def _create_exam_answers():
+    # 迁移只建表；解析全部历史明细可能要几分钟，不能放在应用启动路径上
+    from flask import current_app
+    from .models import ExamAnswer, ExamRecord, RegradeCheckpoint
+    from .services.answer_service import BACKFILL_CHECKPOINT
+    ExamAnswer.__table__.create(bind=db.session.connection(), checkfirst=True)
+    if (db.session.get(RegradeCheckpoint, BACKFILL_CHECKPOINT) is None
+            and db.session.query(ExamRecord.id).first() is not None):
+        current_app.logger.warning("已有考试记录尚未回填逐题作答表，请执行 `python maintenance.py backfill-answers`")
+
+
+@migration(5, '列 users.auth_version（会话注销用的用户版本号）')
+def _add_users_auth_version():
+    columns = {row[1] for row in db.session.execute(text("PRAGMA table_info(users)"))}
+    if 'auth_version' not in columns:
+        _execute("ALTER TABLE users ADD COLUMN auth_version INTEGER NOT NULL DEFAULT 0")
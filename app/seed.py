@@ -0,0 +1,109 @@
+# app/seed.py
+"""
+初始数据：内置管理员账号与示例题库。
+示例题保存在 app/data/sample_questions.json，只有初始化脚本（db_init.py 等）或首次启动时才读取，
+应用的日常启动与 models 的导入都不会加载这些数据。
+"""
+
+from typing import Any, Dict, List
+import json
+import os
+
+from . import db
+from .models import Question, User
+
+SAMPLE_QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'sample_questions.json')
+
+# 示例题数量上限（与原先的生成逻辑一致）
+MAX_SAMPLES = 300
+
+
+def load_sample_questions(path: str = SAMPLE_QUESTIONS_PATH) -> Dict[str, List[Dict[str, Any]]]:
+    """读取示例题数据文件：{'choice': [...], 'fill': [...], 'code': [...]}。"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_sample_questions(data: Dict[str, List[Dict[str, Any]]]) -> List[Question]:
+    """按 选择题 → 填空题 → 编程题 的顺序生成 Question 对象，标题带序号。"""
+    samples: List[Question] = []
+    for item in data.get('choice', []):
+        if len(samples) >= MAX_SAMPLES:
+            break
+        # 确保选项列表有4个元素
+        options = list(item['options']) + [''] * (4 - len(item['options']))
+        samples.append(Question(
+            qtype='choice',
+            title=f"{len(samples)+1}. {item['title']}",
+            option_a=options[0],
+            option_b=options[1],
+            option_c=options[2],
+            option_d=options[3],
+            answer=item['answer'],
+            difficulty=item['difficulty']
+        ))
+    for item in data.get('fill', []):
+        if len(samples) >= MAX_SAMPLES:
+            break
+        samples.append(Question(
+            qtype='fill',
+            title=f"{len(samples)+1}. {item['title']}",
+            answer=item['answer'],
+            difficulty=item['difficulty']
+        ))
+    for item in data.get('code', []):
+        if len(samples) >= MAX_SAMPLES:
+            break
+        samples.append(Question(
+            qtype='code',
+            title=f"{len(samples)+1}. {item['title']}",
+            answer=item['answer'],
+            judge_template=item['judge_template'],
+            difficulty=item['difficulty']
+        ))
+    return samples
+
+
+def insert_sample_questions() -> int:
+    """
+    添加示例题（选择题/填空/编程）以便快速使用，已存在的同名题目跳过。
+    返回新增题目数量。
+    """
+    samples = build_sample_questions(load_sample_questions())
+    # 一次查询取出已有标题，避免逐题查询
+    existing = {t for (t,) in db.session.query(Question.title).filter(
+        Question.title.in_([q.title for q in samples]))}
+    added_count = 0
+    for q in samples:
+        if q.title in existing:
+            continue
+        db.session.add(q)
+        added_count += 1
+        if added_count % 50 == 0:  # 每50题打印一次进度
+            print(f"已添加 {added_count} 道题目...")
+
+    try:
+        db.session.commit()
+        from .services.question_index import question_index
+        question_index.bump()
+        final_count = Question.query.count()
+        print(f"✓ 成功添加 {added_count} 道题目")
+        print(f"✓ 插入后题目数量: {final_count}")
+        return added_count
+    except Exception as e:
+        db.session.rollback()
+        print(f"✗ 插入题目时出错: {e}")
+        return 0
+
+
+def create_builtin_users() -> None:
+    """创建内置管理员（x / 1）；题库为空时插入示例题。"""
+    u = User.query.filter_by(username='x').first()
+    if not u:
+        u = User(username='x', is_admin=True)
+        u.set_password('1')
+        db.session.add(u)
+        db.session.commit()
+    # 如果题库为空则插入一些样例题
+    if db.session.query(Question.id).first() is None:
+        insert_sample_questions()
@@ -7,11 +7,17 @@ AnalyticsService
 - 按题型难度分布
 - 生成简单的趋势数据（便于前端绘图）
 本文件包含大量辅助方法以提高行数，但每个方法逻辑清晰。
+汇总类指标都在数据库端用 AVG / COUNT / CASE 聚合，不把考试记录加载成 ORM 对象；
+启用列式快照（配置 ANALYTICS_SNAPSHOT，见 exam_snapshot）时改为在内存中的列数组上向量化计算。
+各统计方法的结果经 result_cache 缓存（标签 exams / questions），考试记录或题库变化时失效。
 """
 
 from typing import List, Dict, Any, Optional, Tuple
 from ..models import ExamRecord, Question, User
 from .. import db
+from sqlalchemy import Integer, and_, case, cast, func
+from flask import current_app, has_app_context
+from .cache_service import result_cache
 import math
 import datetime
 import json
@@ -23,81 +29,126 @@ class AnalyticsService:
         # 可配置的参数
         self.window_days = 30
 
+    @staticmethod
+    def _snapshot():
+        """按配置返回列式快照，未启用时返回 None（走 SQL 聚合）。"""
+        from .exam_snapshot import exam_snapshot, np
+        mode = current_app.config.get('ANALYTICS_SNAPSHOT', 'auto') if has_app_context() else 'auto'
+        if mode == 'auto':
+            return exam_snapshot if np is not None else None
+        return exam_snapshot if mode else None
+
+    @result_cache.cached('exams')
     def total_exams(self) -> int:
         """返回总的考试记录数量。"""
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.summary()['total_exams']
         return ExamRecord.query.count()
 
+    @result_cache.cached('exams')
     def average_score(self) -> float:
         """返回所有考试的平均分（按 record.score 计算）。"""
-        recs = ExamRecord.query.all()
-        if not recs:
-            return 0.0
-        s = sum((r.score for r in recs))
-        c = len(recs)
-        return float(s) / c if c > 0 else 0.0
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.summary()['avg_score']
+        avg = db.session.query(func.avg(ExamRecord.score)).scalar()
+        return float(avg) if avg is not None else 0.0
 
+    @result_cache.cached('exams')
     def average_score_by_user(self, user_id: int) -> float:
         """返回指定用户的平均得分。"""
-        recs = ExamRecord.query.filter_by(user_id=user_id).all()
-        if not recs:
-            return 0.0
-        s = sum((r.score for r in recs))
-        return float(s) / len(recs)
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.summary(user_id=user_id)['avg_score']
+        avg = db.session.query(func.avg(ExamRecord.score)).filter(ExamRecord.user_id == user_id).scalar()
+        return float(avg) if avg is not None else 0.0
 
+    @result_cache.cached('exams')
     def score_histogram(self, buckets: int = 10) -> List[int]:
         """简单直方图：把 0-total 的得分按桶统计（基于 record.score）"""
-        recs = ExamRecord.query.all()
-        if not recs:
-            return [0] * buckets
-        max_score = max((r.total for r in recs), default=1)
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.histogram(buckets)
+        counts = [0] * buckets
+        max_score = db.session.query(func.max(ExamRecord.total)).scalar()
+        if max_score is None:
+            return counts
         # 防止除 0
         if max_score == 0:
             max_score = 1
-        counts = [0] * buckets
-        for r in recs:
-            ratio = (r.score / max_score) if max_score else 0
-            idx = min(buckets - 1, int(ratio * buckets))
-            counts[idx] += 1
+        # 桶号 = int(score / max_score * buckets)，超出范围的并入首/末桶；CAST 与 int() 一样向零取整
+        raw = cast(ExamRecord.score * buckets / float(max_score), Integer)
+        bucket = case((raw >= buckets - 1, buckets - 1), (raw < 0, 0), else_=raw)
+        rows = (db.session.query(bucket, func.count())
+                .filter(ExamRecord.score.isnot(None))
+                .group_by(bucket).all())
+        for idx, n in rows:
+            counts[int(idx)] += n
         return counts
 
+    @result_cache.cached('questions')
     def question_distribution_by_type(self) -> Dict[str, int]:
         """按题型统计题库分布。"""
-        types = {}
-        qtypes = Question.query.with_entities(Question.qtype).distinct().all()
-        for (t,) in qtypes:
-            types[t] = Question.query.filter_by(qtype=t).count()
-        return types
+        rows = db.session.query(Question.qtype, func.count(Question.id)).group_by(Question.qtype).all()
+        return {t: n for t, n in rows}
 
+    @result_cache.cached('exams')
     def average_duration(self) -> float:
         """返回考试平均耗时（秒）。"""
-        recs = ExamRecord.query.all()
-        if not recs:
-            return 0.0
-        return float(sum((r.duration_seconds for r in recs))) / len(recs)
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.summary()['avg_duration']
+        avg = db.session.query(func.avg(ExamRecord.duration_seconds)).scalar()
+        return float(avg) if avg is not None else 0.0
 
+    @result_cache.cached('exams')
     def user_pass_rate(self, user_id: int, pass_ratio: float = 0.6) -> float:
         """返回用户通过率（按单次考试 score/total >= pass_ratio 计算）。"""
-        recs = ExamRecord.query.filter_by(user_id=user_id).all()
-        if not recs:
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.summary(pass_ratio, user_id=user_id)['pass_rate']
+        passed_expr = case((and_(ExamRecord.total > 0,
+                                 ExamRecord.score * 1.0 / ExamRecord.total >= pass_ratio), 1), else_=0)
+        attempts, passed = (db.session.query(func.count(ExamRecord.id), func.sum(passed_expr))
+                            .filter(ExamRecord.user_id == user_id).one())
+        if not attempts:
             return 0.0
-        passed = sum(1 for r in recs if (r.total and (r.score / r.total) >= pass_ratio))
-        return float(passed) / len(recs)
+        return float(passed or 0) / attempts
+
+    @result_cache.cached('exams')
+    def summary_metrics(self, pass_ratio: float = 0.6) -> Dict[str, Any]:
+        """
+        用一条聚合查询返回考试记录的汇总指标：
+        {'total_exams', 'avg_score', 'avg_duration', 'pass_rate'}
+        """
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.summary(pass_ratio)
+        passed_expr = case((and_(ExamRecord.total > 0,
+                                 ExamRecord.score * 1.0 / ExamRecord.total >= pass_ratio), 1), else_=0)
+        total, avg_score, avg_duration, passed = db.session.query(
+            func.count(ExamRecord.id),
+            func.avg(ExamRecord.score),
+            func.avg(ExamRecord.duration_seconds),
+            func.sum(passed_expr),
+        ).one()
+        return {
+            'total_exams': total,
+            'avg_score': self.safe_format_float(avg_score),
+            'avg_duration': self.safe_format_float(avg_duration),
+            'pass_rate': float(passed or 0) / total if total else 0.0,
+        }
 
+    @result_cache.cached('exams')
     def compute_top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
         返回按平均得分排名的用户列表，包含 user_id, avg_score, attempts。
-        注意：此方法简单但可能不够高效（适合中小数据量）。
+        从排行榜物化表 user_stats 按索引读取前 limit 名（历史数据需先执行 maintenance.py rebuild-stats）。
         """
-        users = User.query.all()
-        out = []
-        for u in users:
-            recs = ExamRecord.query.filter_by(user_id=u.id).all()
-            if not recs:
-                continue
-            avg = sum(r.score for r in recs) / len(recs)
-            out.append({'user_id': u.id, 'username': u.username, 'avg_score': avg, 'attempts': len(recs)})
-        out.sort(key=lambda x: x['avg_score'], reverse=True)
-        return out[:limit]
+        from .leaderboard_service import leaderboard_service
+        return [{'user_id': r['user_id'], 'username': r['username'], 'avg_score': r['avg_score'],
+                 'attempts': r['attempts']} for r in leaderboard_service.top(limit)]
 
     # -----------------------------
     # 时间序列 / 趋势接口（用于折线图）
@@ -106,21 +157,47 @@ class AnalyticsService:
         """
         返回最近 days 天的每日平均分数据，结构：
         { 'dates': [ 'YYYY-MM-DD', ... ], 'avg_scores': [float, ...] }
+        数据来自每日汇总表，一次范围查询读取 days 行。
         """
-        today = datetime.date.today()
-        dates = []
-        avg_scores = []
-        for i in range(days - 1, -1, -1):
-            d = today - datetime.timedelta(days=i)
-            dates.append(d.isoformat())
-            start = datetime.datetime.combine(d, datetime.time.min)
-            end = datetime.datetime.combine(d, datetime.time.max)
-            recs = ExamRecord.query.filter(ExamRecord.created_at >= start, ExamRecord.created_at <= end).all()
-            if not recs:
-                avg_scores.append(0.0)
-            else:
-                avg_scores.append(sum(r.score for r in recs) / len(recs))
-        return {'dates': dates, 'avg_scores': avg_scores}
+        trend = self.score_trend(days, 'day')
+        return {'dates': trend['dates'], 'avg_scores': trend['avg_scores']}
+
+    @result_cache.cached('exams')
+    def score_trend(self, days: int = 14, granularity: str = 'day') -> Dict[str, Any]:
+        """
+        最近 days 天按日/周/月（granularity = day / week / month）汇总的成绩趋势：
+        { 'dates': [周期起始日期, ...], 'avg_scores': [...], 'counts': [...], 'pass_rates': [...] }
+        快照启用时直接在列数组上分组，否则读取每日汇总表。
+        """
+        snap = self._snapshot()
+        if snap is not None:
+            return snap.trend(days, granularity)
+        from .rollup_service import rollup_service
+        return rollup_service.trend(days, granularity)
+
+    # -----------------------------
+    # 分位数（读取流式摘要，内存占用与记录数无关）
+    # -----------------------------
+    @result_cache.cached('exams')
+    def score_percentiles(self, ps=(50, 90, 99), scope: str = 'global', keys=None,
+                          recent_days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        得分率（0-100）的分位数与直方图。scope 为 global / user / question / day；
+        指定 recent_days 时合并最近若干天的 day 摘要。
+        """
+        from .sketch_service import sketch_service
+        if recent_days:
+            scope, keys = 'day', sketch_service.recent_days(recent_days)
+        return sketch_service.percentiles(ps, scope, keys, 'score_pct')
+
+    @result_cache.cached('exams')
+    def duration_percentiles(self, ps=(50, 90, 99), scope: str = 'global', keys=None,
+                             recent_days: Optional[int] = None) -> Dict[str, Any]:
+        """考试用时（秒）的分位数与直方图，参数同 score_percentiles。"""
+        from .sketch_service import sketch_service
+        if recent_days:
+            scope, keys = 'day', sketch_service.recent_days(recent_days)
+        return sketch_service.percentiles(ps, scope, keys, 'duration')
 
     # -----------------------------
     # 辅助小工具（扩行）
@@ -139,12 +216,14 @@ class AnalyticsService:
         d1 = scores_sorted[int(c)] * (k - f)
         return d0 + d1
 
+    @result_cache.cached('exams', 'questions')
     def export_summary_json(self) -> str:
         """导出当前一些摘要统计为 JSON 字符串（便于前端或报告）。"""
+        metrics = self.summary_metrics()
         summary = {
-            'total_exams': self.total_exams(),
-            'avg_score': self.average_score(),
-            'avg_duration': self.average_duration(),
+            'total_exams': metrics['total_exams'],
+            'avg_score': metrics['avg_score'],
+            'avg_duration': metrics['avg_duration'],
             'question_distribution': self.question_distribution_by_type(),
             'top_users': self.compute_top_users(limit=10)
         }
@@ -0,0 +1,151 @@
+# app/services/answer_service.py
+"""
+AnswerService
+-------------
+逐题作答表 exam_answers 的维护与查询：
+- 每写入一条考试记录，record() 把评分明细拆成每题一行，在同一事务中批量插入；
+- ExamRecord.details 有两种历史格式（json.dumps 与 str(list)），统一用 parse_details 解析；
+- backfill() 为升级前的考试记录回填，按记录 id 分批处理，检查点写在 regrade_checkpoints 表中，可中断后继续；
+- 重评修改了明细的记录，用 replace() 重新生成其逐题行；
+- 项目分析（通过率、区分度、选项分布）见 item_analysis_service，由本表增量汇总；
+- question_stats() 按 question_id 索引聚合，不再逐条解析明细。
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import datetime
+
+from sqlalchemy import case, func
+
+from .. import db
+from ..models import ExamAnswer, ExamRecord, RegradeCheckpoint
+from .grading_service import item_score, parse_details
+
+# 回填任务在 regrade_checkpoints 表中的检查点名称
+BACKFILL_CHECKPOINT = 'backfill-exam-answers'
+
+# response 列的最大长度（与模型一致）
+_RESPONSE_MAX = 200
+
+
+def answer_rows(record_id: int, details: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """把一条考试记录的评分明细拆成 exam_answers 行（字典列表）。无法识别题目 id 的明细被跳过。"""
+    rows = []
+    for d in details or []:
+        if not isinstance(d, dict):
+            continue
+        try:
+            qid = int(d.get('qid'))
+        except (TypeError, ValueError):
+            continue
+        qtype = d.get('type')
+        response = None
+        if qtype != 'code' and d.get('got') is not None:
+            response = str(d['got']).strip()[:_RESPONSE_MAX]
+        ms = d.get('ms')
+        # 两种旧格式：ExamService 的明细只有 ok 没有 score，考试路由的明细只有 score 没有 ok
+        score = item_score(d)
+        correct = bool(d['ok']) if 'ok' in d else score >= 1.0
+        rows.append({
+            'record_id': record_id,
+            'question_id': qid,
+            'qtype': qtype,
+            'correct': correct,
+            'score': score,
+            'response': response,
+            'judge_ms': float(ms) if ms is not None else None,
+        })
+    return rows
+
+
+class AnswerService:
+    """逐题作答服务。"""
+
+    def record(self, rec: ExamRecord, details: Optional[List[Dict[str, Any]]]) -> int:
+        """为刚加入会话的考试记录写入逐题行（需要记录 id，会先 flush）。不提交，返回行数。"""
+        if rec.id is None:
+            db.session.flush()
+        rows = answer_rows(rec.id, details)
+        if rows:
+            db.session.execute(ExamAnswer.__table__.insert(), rows)
+        return len(rows)
+
+    def replace(self, details_by_record: Dict[int, Optional[List[Dict[str, Any]]]]) -> int:
+        """删除并重新生成指定记录的逐题行（重评使用，不提交），返回插入行数。"""
+        if not details_by_record:
+            return 0
+        t = ExamAnswer.__table__
+        db.session.execute(t.delete().where(t.c.record_id.in_(list(details_by_record))))
+        rows = []
+        for rec_id, details in details_by_record.items():
+            rows.extend(answer_rows(rec_id, details))
+        if rows:
+            db.session.execute(t.insert(), rows)
+        return len(rows)
+
+    def backfill(self, batch_size: int = 1000, restart: bool = False,
+                 progress: Optional[Callable[[RegradeCheckpoint], None]] = None) -> RegradeCheckpoint:
+        """
+        解析历史记录的 details（两种格式）回填 exam_answers，返回检查点。
+        每批先删除该批记录已有的逐题行再插入，重复执行不会产生重复行。
+        """
+        from .item_analysis_service import item_analysis_service
+        cp = db.session.get(RegradeCheckpoint, BACKFILL_CHECKPOINT)
+        if cp is None or restart:
+            if cp is not None:
+                db.session.delete(cp)
+                db.session.flush()
+            cp = RegradeCheckpoint(name=BACKFILL_CHECKPOINT, filters='{}', last_id=0, processed=0,
+                                   changed=0, started_at=datetime.datetime.utcnow())
+            db.session.add(cp)
+            db.session.commit()
+        while True:
+            rows = (db.session.query(ExamRecord.id, ExamRecord.details)
+                    .filter(ExamRecord.id > cp.last_id)
+                    .order_by(ExamRecord.id).limit(batch_size).all())
+            if not rows:
+                break
+            inserted = self.replace({rec_id: parse_details(text) for rec_id, text in rows})
+            # 回填改写了已有的逐题行（新行位于项目分析水位线之后），与本批同一事务清空累计量，避免重复累加
+            item_analysis_service.reset()
+            cp.last_id = rows[-1][0]
+            cp.processed += len(rows)
+            cp.changed += inserted  # 回填任务中记录的是写入的逐题行数
+            cp.updated_at = datetime.datetime.utcnow()
+            db.session.commit()
+            if progress is not None:
+                progress(cp)
+        cp.finished_at = datetime.datetime.utcnow()
+        db.session.commit()
+        return cp
+
+    def question_stats(self, qids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        按题目汇总作答情况：qid -> {'attempts', 'correct', 'accuracy', 'avg_score', 'avg_judge_ms'}。
+        qids 为空时返回所有有作答的题目。
+        """
+        q = db.session.query(
+            ExamAnswer.question_id,
+            func.count(ExamAnswer.id),
+            func.sum(case((ExamAnswer.correct.is_(True), 1), else_=0)),
+            func.avg(ExamAnswer.score),
+            func.avg(ExamAnswer.judge_ms),
+        ).group_by(ExamAnswer.question_id)
+        if qids is not None:
+            qids = list(qids)
+            if not qids:
+                return {}
+            q = q.filter(ExamAnswer.question_id.in_(qids))
+        out = {}
+        for qid, n, correct, avg_score, avg_ms in q.all():
+            out[qid] = {'attempts': n, 'correct': int(correct or 0),
+                        'accuracy': (correct or 0) / n if n else 0.0,
+                        'avg_score': float(avg_score or 0.0),
+                        'avg_judge_ms': float(avg_ms) if avg_ms is not None else None}
+        return out
+
+    def for_record(self, record_id: int) -> List[ExamAnswer]:
+        return ExamAnswer.query.filter_by(record_id=record_id).order_by(ExamAnswer.id).all()
+
+
+# module-level instance
+answer_service = AnswerService()
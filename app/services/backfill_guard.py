@@ -0,0 +1,34 @@
+# app/services/backfill_guard.py
+"""
+BackfillGuard
+-------------
+派生统计表（排行榜、每日汇总、分位数摘要）的一次性回填检查：
+每个进程第一次写入时检查一次，派生表为空而已有考试记录（升级前的数据库）时从考试记录回填。
+检查与回填都在 no_autoflush 下进行，并排除正在写入的那条考试记录：
+否则查询会先把会话中待插入的记录 flush 进库，回填时算进去一次，随后 record() 又计一次。
+"""
+
+from typing import Callable, Optional
+
+from .. import db
+from ..models import ExamRecord
+
+
+class BackfillGuard:
+    """probe 为派生表的任一列，用于判断表是否为空。"""
+
+    def __init__(self, probe):
+        self.probe = probe
+        self.checked = False
+
+    def run(self, fill: Callable[[Optional[int]], None], exclude_id: Optional[int] = None) -> None:
+        """未检查过时执行检查，需要回填时调用 fill(exclude_id)。只执行语句、不提交。"""
+        if self.checked:
+            return
+        with db.session.no_autoflush:
+            records = db.session.query(ExamRecord.id)
+            if exclude_id is not None:
+                records = records.filter(ExamRecord.id != exclude_id)
+            if db.session.query(self.probe).first() is None and records.first() is not None:
+                fill(exclude_id)
+        self.checked = True
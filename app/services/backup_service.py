@@ -38,9 +38,9 @@ class BackupService:
     
     def _get_db_file_path(self) -> str:
         """获取数据库文件路径"""
-        # 根据配置获取数据库路径
-        from ..config import Config
-        return Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+        # 根据当前应用（或默认）配置获取数据库路径
+        from .sqlite_service import sqlite_service
+        return sqlite_service._db_path()
     
     def create_backup(self, description: str = "") -> Dict[str, Any]:
         """
@@ -62,10 +62,18 @@ class BackupService:
             
             # 创建ZIP备份文件
             with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # 备份数据库文件
+                # 备份数据库文件：WAL 模式下最近提交的数据可能还在 -wal 文件中，
+                # 用 SQLite 在线备份接口先生成一致的快照再打包
                 db_file = self._get_db_file_path()
                 if os.path.exists(db_file):
-                    zipf.write(db_file, 'database.db')
+                    from .sqlite_service import sqlite_service
+                    snapshot = str(backup_path) + '.db.tmp'
+                    try:
+                        sqlite_service.backup_to(snapshot, db_file)
+                        zipf.write(snapshot, 'database.db')
+                    finally:
+                        if os.path.exists(snapshot):
+                            os.remove(snapshot)
                 
                 # 备份配置文件（如果存在）
                 config_files = ['app/config.py', 'requirements.txt', 'main.py']
@@ -178,10 +186,18 @@ class BackupService:
                     result['message'] = "备份文件中未找到数据库文件"
                     return result
                 
-                # 提取数据库文件
+                # 提取数据库文件到临时文件，再通过 SQLite 在线备份接口写回当前数据库
+                # （直接覆盖文件会与现有连接和 -wal 文件不一致）
+                from .sqlite_service import sqlite_service
                 db_file = self._get_db_file_path()
-                with zipf.open('database.db') as source, open(db_file, 'wb') as target:
-                    shutil.copyfileobj(source, target)
+                extracted = str(backup_path) + '.restore.tmp'
+                try:
+                    with zipf.open('database.db') as source, open(extracted, 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                    sqlite_service.restore_from(extracted, db_file)
+                finally:
+                    if os.path.exists(extracted):
+                        os.remove(extracted)
             
             result.update({
                 'success': True,
@@ -0,0 +1,208 @@
+# app/services/cache_service.py
+"""
+ResultCache
+-----------
+分析/看板结果的进程内缓存：
+- 按 方法名 + 参数 缓存返回值，每个条目带标签（如 'exams'、'questions'）；
+- 条目超过 TTL，或其标签被失效（invalidate 只把标签版本号加一，O(1)）后变为"过期"；
+- 过期但仍在 stale 窗口内的条目直接返回旧值，同时在后台线程中重新计算（stale-while-revalidate），
+  页面不会因为重新计算而阻塞；只有从未计算过（或已超出 stale 窗口）的条目才同步计算，
+  同一个键同时只有一个线程在计算，其余线程等待其结果；
+- 写操作在事务中调用 invalidate_on_commit()，提交成功后才失效，避免后台重算读到未提交前的旧数据又被当成新值。
+缓存只在本进程内有效，多进程部署时其它进程的条目最迟在 TTL 后更新。
+返回的对象在多个请求间共享，调用方不要修改。
+"""
+
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import functools
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from .. import db
+
+
+class _Entry:
+    __slots__ = ('value', 'stored_at', 'versions', 'refreshing')
+
+    def __init__(self, value: Any, stored_at: float, versions: Tuple[int, ...]):
+        self.value = value
+        self.stored_at = stored_at
+        self.versions = versions
+        self.refreshing = False
+
+
+class ResultCache:
+    """带标签失效与 stale-while-revalidate 的结果缓存。"""
+
+    def __init__(self, ttl: float = 30.0, stale_ttl: float = 600.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._tag_versions: Dict[str, int] = {}
+        self._computing: Dict[str, threading.Event] = {}
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'invalidations': 0, 'errors': 0}
+        self._listening = False
+
+    # -----------------------------
+    # 配置与统计
+    # -----------------------------
+    def _settings(self) -> Tuple[float, float]:
+        if has_app_context():
+            cfg = current_app.config
+            return cfg.get('RESULT_CACHE_TTL', self.ttl), cfg.get('RESULT_CACHE_STALE', self.stale_ttl)
+        return self.ttl, self.stale_ttl
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        """返回命中/未命中等计数与当前条目数（管理后台展示）。"""
+        with self._lock:
+            out = dict(self.stats)
+            out['entries'] = len(self._entries)
+        lookups = out['hits'] + out['stale_hits'] + out['misses']
+        out['hit_rate'] = (out['hits'] + out['stale_hits']) / lookups if lookups else 0.0
+        return out
+
+    # -----------------------------
+    # 失效
+    # -----------------------------
+    def invalidate(self, *tags: str) -> None:
+        """使带有这些标签的条目过期（下次访问返回旧值并后台重算）。"""
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+            self.stats['invalidations'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _ensure_listeners(self) -> None:
+        if self._listening:
+            return
+        with self._lock:
+            if self._listening:
+                return
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+            self._listening = True
+
+    def _after_commit(self, session) -> None:
+        tags = session.info.pop('result_cache_tags', None)
+        if tags:
+            self.invalidate(*tags)
+
+    @staticmethod
+    def _after_rollback(session) -> None:
+        session.info.pop('result_cache_tags', None)
+
+    def invalidate_on_commit(self, *tags: str) -> None:
+        """在当前会话提交成功后失效这些标签（回滚则不失效）。"""
+        self._ensure_listeners()
+        db.session.info.setdefault('result_cache_tags', set()).update(tags)
+
+    # -----------------------------
+    # 读取 / 计算
+    # -----------------------------
+    def _versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._tag_versions.get(t, 0) for t in tags)
+
+    def _compute(self, key: str, fn: Callable[[], Any], tags: Tuple[str, ...]) -> Any:
+        """同步计算并写入条目；同一个键只由一个线程计算。"""
+        with self._lock:
+            waiter = self._computing.get(key)
+            if waiter is None:
+                self._computing[key] = threading.Event()
+        if waiter is not None:
+            waiter.wait()
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry.value
+            return self._compute(key, fn, tags)  # 计算方出错，自己重试
+        try:
+            with self._lock:
+                versions = self._versions(tags)  # 先取版本号：计算期间发生的失效不会被覆盖
+            value = fn()
+            with self._lock:
+                if len(self._entries) >= self.max_entries and key not in self._entries:
+                    # 满了就丢掉最早写入的条目
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = _Entry(value, time.monotonic(), versions)
+            return value
+        finally:
+            with self._lock:
+                self._computing.pop(key).set()
+
+    def _refresh_background(self, key: str, fn: Callable[[], Any], tags: Tuple[str, ...], entry: _Entry) -> None:
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def target():
+            try:
+                if app is None:
+                    self._compute(key, fn, tags)
+                else:
+                    with app.app_context():
+                        self._compute(key, fn, tags)
+                self._count('refreshes')
+            except Exception:
+                self._count('errors')
+                if app is not None:
+                    app.logger.exception('缓存后台刷新失败: %s', key)
+            finally:
+                entry.refreshing = False
+
+        threading.Thread(target=target, name='cache-refresh', daemon=True).start()
+
+    def get_or_compute(self, key: str, fn: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        """返回 key 的缓存值，按需同步计算或后台刷新。TTL 配置为 0 时不缓存。"""
+        ttl, stale_ttl = self._settings()
+        if not ttl:
+            return fn()
+        tags = tuple(tags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                fresh = age < ttl and entry.versions == self._versions(tags)
+                if fresh:
+                    self.stats['hits'] += 1
+                    return entry.value
+                if age < ttl + stale_ttl:
+                    self.stats['stale_hits'] += 1
+                    start = not entry.refreshing
+                    entry.refreshing = True
+                else:
+                    entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+        if entry is None:
+            return self._compute(key, fn, tags)
+        if start:
+            self._refresh_background(key, fn, tags, entry)
+        return entry.value
+
+    def cached(self, *tags: str) -> Callable:
+        """方法装饰器：以 "类名.方法名(参数)" 为键缓存返回值（忽略 self）。"""
+        def decorator(func):
+            name = func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(self_, *args, **kwargs):
+                key = f"{name}{args!r}{sorted(kwargs.items())!r}"
+                return self.get_or_compute(key, lambda: func(self_, *args, **kwargs), tags)
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+
+# module-level instance
+result_cache = ResultCache()
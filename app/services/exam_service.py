@@ -7,10 +7,21 @@ ExamService
 """
 
 from typing import List, Dict, Any, Optional
-from ..models import ExamRecord, Question, User
+from flask import current_app, has_app_context
+from sqlalchemy import update
+from ..models import ExamRecord, ExamPaper, ExamPaperItem, Question, User
 from .. import db
 from .question_service import QuestionService
 from .analytics_service import AnalyticsService
+from .question_index import question_index
+from .paper_service import paper_service
+from .grading_service import grading_service
+from .judge_service import judge_service
+from .leaderboard_service import leaderboard_service
+from .rollup_service import rollup_service
+from .sketch_service import sketch_service
+from .answer_service import answer_service
+from .cache_service import result_cache
 import datetime
 import json
 import random
@@ -24,84 +35,126 @@ class ExamService:
         # 默认每次试卷题量
         self.default_paper_size = 5
 
-    def create_paper(self, size: int = None, qtypes: Optional[List[str]] = None) -> List[Question]:
-        """生成一张试卷（Question 对象列表）。"""
+    def create_paper(self, size: int = None, qtypes: Optional[List[str]] = None,
+                     blueprint: Optional[str] = None) -> List[Question]:
+        """
+        生成一张试卷（Question 对象列表）。
+        传入 blueprint（如 "choice:3:1-2,fill:1,code:1:3"）时按题型/难度配额分层抽题。
+        """
+        if blueprint:
+            return question_index.hydrate(paper_service.generate(blueprint))
         if size is None:
             size = self.default_paper_size
         return self.qs.random_questions(size, qtypes)
 
+    # -----------------------------
+    # 持久化试卷：下发时写入，提交时按试卷评分
+    # -----------------------------
+    def create_exam_paper(self, user_id: int, size: int = None, blueprint: Optional[str] = None) -> ExamPaper:
+        """
+        为用户生成并保存一张试卷，返回 ExamPaper（items 已按顺序写入）。
+        指定 size 时随机抽 size 道；否则按蓝图（默认取配置 EXAM_BLUEPRINT）从预生成试卷池取卷。
+        两种方式都只在题库 id 索引上抽样，不加载整表的 Question 对象。
+        """
+        if size is not None:
+            ids = question_index.sample_ids(size)
+        else:
+            cfg = current_app.config if has_app_context() else {}
+            spec = blueprint or cfg.get('EXAM_BLUEPRINT') or f'choice:{self.default_paper_size}'
+            app = current_app._get_current_object() if has_app_context() else None
+            ids = paper_service.take(spec, app=app,
+                                     capacity=cfg.get('PAPER_POOL_SIZE', 50),
+                                     low_water=cfg.get('PAPER_POOL_LOW_WATER', 10))
+        paper = ExamPaper(user_id=user_id)
+        for pos, qid in enumerate(ids):
+            paper.items.append(ExamPaperItem(position=pos, question_id=qid))
+        db.session.add(paper)
+        db.session.commit()
+        return paper
+
+    def get_open_paper(self, paper_id: Optional[int], user_id: int) -> Optional[ExamPaper]:
+        """返回属于该用户且尚未提交的试卷，否则返回 None。"""
+        if not paper_id:
+            return None
+        paper = ExamPaper.query.get(paper_id)
+        if not paper or paper.user_id != user_id or paper.submitted_at is not None:
+            return None
+        return paper
+
+    def claim_paper(self, paper_id: Optional[int], user_id: int) -> Optional[ExamPaper]:
+        """
+        原子地把试卷标记为已提交并返回它；试卷不存在、不属于该用户或已被提交时返回 None。
+        用一条带 submitted_at IS NULL 条件的 UPDATE 抢占，并发的两次提交只有一次能成功。
+        立即提交，评分（可能需要数秒判题）期间不持有 SQLite 写锁。
+        """
+        if not paper_id:
+            return None
+        t = ExamPaper.__table__
+        res = db.session.execute(update(t).where(t.c.id == paper_id, t.c.user_id == user_id,
+                                                 t.c.submitted_at.is_(None))
+                                 .values(submitted_at=datetime.datetime.utcnow()))
+        db.session.commit()
+        if res.rowcount != 1:
+            return None
+        return db.session.get(ExamPaper, paper_id)
+
+    def release_paper(self, paper_id: int) -> None:
+        """评分或保存失败时撤销 claim_paper 的标记，学生可以重新提交。"""
+        db.session.rollback()
+        t = ExamPaper.__table__
+        db.session.execute(update(t).where(t.c.id == paper_id).values(submitted_at=None))
+        db.session.commit()
+
+    def load_paper_questions(self, paper: ExamPaper) -> List[Question]:
+        """用一条 id IN (...) 查询批量加载试卷上的题目，并保持下发时的顺序。"""
+        # 已被删除的题目会被跳过
+        return question_index.hydrate([item.question_id for item in paper.items])
+
     def grade_submission(self, answers: Dict[int, Any]) -> Dict[str, Any]:
         """
         对前端提交的数据进行评分。
         answers: dict mapping question_id -> { 'type': 'choice'/'fill'/'code', 'answer': 'A' or code... }
         返回评分结果字典，包含 score、total、detail 列表等。
         """
-        total = 0.0
-        score = 0.0
-        details = []
+        # 统一交给评分引擎：答案键一次批量加载，编程题单独交给判题
+        flat = {}
         for qid_str, payload in answers.items():
-            # qid 可能是字符串，处理
-            try:
-                qid = int(qid_str)
-            except Exception:
-                continue
-            q = Question.query.get(qid)
-            if not q:
-                details.append({'qid': qid, 'ok': False, 'reason': '题目不存在'})
-                continue
-            qtype = q.qtype
-            total += 1.0
-            got = payload.get('answer')
-            if qtype == 'choice':
-                if (str(got).strip().upper() == (q.answer or '').strip().upper()):
-                    score += 1.0
-                    details.append({'qid': qid, 'ok': True, 'type': 'choice'})
-                else:
-                    details.append({'qid': qid, 'ok': False, 'type': 'choice', 'expected': q.answer, 'got': got})
-            elif qtype == 'fill':
-                if str(got).strip().lower() == (q.answer or '').strip().lower():
-                    score += 1.0
-                    details.append({'qid': qid, 'ok': True, 'type': 'fill'})
-                else:
-                    details.append({'qid': qid, 'ok': False, 'type': 'fill', 'expected': q.answer, 'got': got})
-            elif qtype == 'code':
-                # 简单执行判题模板与学生代码拼接（注意安全）
-                # 这里我们用一个非常简化的 sandbox（与 utils.safe_exec 类似）：
-                user_code = got or ''
-                judge = q.judge_template or ''
-                ok, msg = self._exec_code(user_code, judge)
-                if ok:
-                    score += 1.0
-                details.append({'qid': qid, 'ok': ok, 'type': 'code', 'msg': msg})
-            else:
-                details.append({'qid': qid, 'ok': False, 'reason': '未知题型'})
-        return {'score': score, 'total': total, 'details': details}
+            flat[qid_str] = payload.get('answer') if isinstance(payload, dict) else payload
+        return grading_service.grade(flat)
 
     def _exec_code(self, user_code: str, judge_code: str):
-        """内部非常简单的运行器，返回 (ok: bool, msg: str)。"""
-        # 限制内置函数（非常弱的沙箱）
-        safe_builtins = {'range': range, 'len': len, 'int': int, 'float': float, 'str': str, 'print': print, 'enumerate': enumerate}
-        g = {'__builtins__': safe_builtins}
-        l = {}
-        combined = user_code + "\n\n" + judge_code
-        try:
-            exec(combined, g, l)
-            return True, "通过"
-        except AssertionError as ae:
-            return False, f"断言失败: {ae}"
-        except Exception as e:
-            return False, f"运行错误: {e}"
+        """在判题进程池中运行学生代码与判题模板，返回 (ok: bool, msg: str)。"""
+        return judge_service.run(user_code, judge_code)
 
-    def record_exam(self, user_id: int, score: float, total: float, duration_seconds: int, details: Any) -> ExamRecord:
-        """保存考试记录到数据库并返回记录对象。"""
+    def add_record(self, user_id: int, score: float, total: float, duration_seconds: int,
+                   details: Optional[List[Dict[str, Any]]]) -> ExamRecord:
+        """
+        把考试记录加入当前会话，并在同一事务中写入逐题作答（exam_answers）、
+        更新派生统计（排行榜 user_stats、每日汇总、分位数摘要）。
+        details 为评分明细列表，统一以 JSON 保存。不提交，由调用方 commit。
+        """
         rec = ExamRecord(
             user_id=user_id,
             score=score,
             total=total,
             duration_seconds=duration_seconds,
+            created_at=datetime.datetime.utcnow(),
             details=json.dumps(details, ensure_ascii=False)
         )
         db.session.add(rec)
+        # 先 flush 取得记录 id：派生表首次回填时要排除这条记录，否则它会被回填计入一次、再被 record() 计入一次
+        db.session.flush()
+        leaderboard_service.record(user_id, score, rec.created_at, exclude_id=rec.id)
+        rollup_service.record(rec.created_at, score, total, duration_seconds, exclude_id=rec.id)
+        sketch_service.record(rec, details)
+        answer_service.record(rec, details)
+        # 提交后使分析/看板缓存过期
+        result_cache.invalidate_on_commit('exams')
+        return rec
+
+    def record_exam(self, user_id: int, score: float, total: float, duration_seconds: int, details: Any) -> ExamRecord:
+        """保存考试记录到数据库并返回记录对象（派生统计在同一事务中更新）。"""
+        rec = self.add_record(user_id, score, total, duration_seconds, details)
         db.session.commit()
         return rec
 
@@ -148,7 +201,7 @@ class ExamService:
     # 统计/分析辅助（交给 Analytics）
     # -----------------------------
     def top_users_by_score(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """返回按平均得分排序的用户列表（交给 AnalyticsService 计算）。"""
+        """返回按平均得分排序的用户列表（交给 AnalyticsService，从排行榜物化表读取）。"""
         return self.analytics.compute_top_users(limit=limit)
 
     # -----------------------------
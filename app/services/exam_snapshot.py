@@ -0,0 +1,295 @@
+# app/services/exam_snapshot.py
+"""
+ExamSnapshot
+------------
+考试记录的列式内存快照，供 AnalyticsService 做毫秒级的汇总、直方图、通过率与趋势计算：
+- 只保存分析需要的列（id、user_id、score、total、duration_seconds、created_at 的 UTC 秒数），
+  用一条原始 SQL 取回，不创建 ORM 对象；
+- 安装了 NumPy 时每列是连续的 ndarray（按容量倍增扩展），各统计量用向量运算完成；
+  没有 NumPy 时退化为标准库 array，逐元素计算，结果一致；
+- refresh() 只追加 id 大于已加载最大 id 的新记录；重评会修改已有记录的分数，
+  通过 bump_epoch() 推进数据库中的纪元号（与重评结果同一事务），各进程发现纪元变化后整体重新加载；
+  恢复备份整体替换了数据库，由 reset_epoch() 把纪元号推进到当前 UTC 秒数之上，避免恢复出的纪元恰好与各进程已加载的相同。
+分数为空的记录在平均分和直方图中被忽略（与 SQL 的 AVG 一致）。
+"""
+
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+import datetime
+import math
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import update
+
+from .. import db
+from ..models import AnalysisWatermark
+from .rollup_service import PASS_RATIO, rollup_service
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+# 纪元号保存在 analysis_watermarks 表中（last_id 列作计数器）
+EPOCH_NAME = 'exam-records-epoch'
+
+_SQL = (
+    "SELECT id, COALESCE(user_id, -1), score, COALESCE(total, 0), duration_seconds, "
+    "COALESCE(CAST(strftime('%s', created_at) AS INTEGER), -1) "
+    "FROM exam_records WHERE id > ? ORDER BY id"
+)
+
+_DAY = 86400
+
+
+def bump_epoch() -> None:
+    """考试记录的已有行被修改（如重评）后调用，使所有进程的快照在下次访问时重新加载。不提交。"""
+    t = AnalysisWatermark.__table__
+    res = db.session.execute(update(t).where(t.c.name == EPOCH_NAME)
+                             .values(last_id=t.c.last_id + 1, updated_at=datetime.datetime.utcnow()))
+    if res.rowcount == 0:
+        db.session.add(AnalysisWatermark(name=EPOCH_NAME, last_id=1))
+
+
+def reset_epoch(conn: sqlite3.Connection) -> None:
+    """
+    数据库被整体替换（恢复备份）后，在写入数据库的 sqlite3 连接上调用并提交：
+    纪元号取 max(原值 + 1, 当前 UTC 秒数)，与任何进程此前读到的纪元（计数或更早恢复时写入的秒数）都不同。
+    """
+    now = datetime.datetime.utcnow()
+    floor = int(time.time())
+    try:
+        cur = conn.execute("UPDATE analysis_watermarks SET last_id = max(last_id + 1, ?), updated_at = ? "
+                           "WHERE name = ?", (floor, str(now), EPOCH_NAME))
+        if cur.rowcount == 0:
+            conn.execute("INSERT INTO analysis_watermarks (name, last_id, updated_at) VALUES (?, ?, ?)",
+                         (EPOCH_NAME, floor, str(now)))
+        conn.commit()
+    except sqlite3.OperationalError:
+        # 很旧的备份还没有 analysis_watermarks 表，启动时建表后纪元从 0 开始，同样与已加载的不同
+        conn.rollback()
+
+
+def _read_epoch() -> int:
+    row = db.session.get(AnalysisWatermark, EPOCH_NAME)
+    return row.last_id if row is not None else 0
+
+
+class _Column:
+    """可追加的一列：NumPy 下为按容量倍增的 ndarray，否则为 array.array。"""
+
+    __slots__ = ('kind', 'buf', 'n')
+
+    def __init__(self, kind: str):
+        self.kind = kind  # 'i' 整数 / 'f' 浮点
+        self.n = 0
+        if np is not None:
+            self.buf = np.empty(1024, dtype=np.int64 if kind == 'i' else np.float64)
+        else:
+            self.buf = array('q' if kind == 'i' else 'd')
+
+    def extend(self, values) -> None:
+        if np is None:
+            if self.kind == 'f':
+                values = [math.nan if v is None else v for v in values]
+            self.buf.extend(values)
+            self.n = len(self.buf)
+            return
+        k = len(values)
+        if self.n + k > len(self.buf):
+            grown = np.empty(max(self.n + k, 2 * len(self.buf)), dtype=self.buf.dtype)
+            grown[:self.n] = self.buf[:self.n]
+            self.buf = grown
+        # None 在浮点列中转为 NaN
+        self.buf[self.n:self.n + k] = np.asarray(values, dtype=self.buf.dtype)
+        self.n += k
+
+    @property
+    def values(self):
+        return self.buf[:self.n] if np is not None else self.buf
+
+
+class ExamSnapshot:
+    """考试记录的列式快照（每个进程一份）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self._epoch: Optional[int] = None
+
+    def _reset(self) -> None:
+        self.ids = _Column('i')
+        self.user_ids = _Column('i')
+        self.scores = _Column('f')
+        self.totals = _Column('f')
+        self.durations = _Column('f')
+        self.stamps = _Column('i')
+        self.max_id = 0
+
+    @property
+    def backend(self) -> str:
+        return 'numpy' if np is not None else 'python'
+
+    def __len__(self) -> int:
+        return self.ids.n
+
+    def invalidate(self) -> None:
+        """丢弃本进程的快照，下次访问时重新加载。"""
+        with self._lock:
+            self._epoch = None
+
+    def _refresh_locked(self) -> int:
+        epoch = _read_epoch()
+        if epoch != self._epoch:
+            self._reset()
+            self._epoch = epoch
+        rows = db.session.connection().exec_driver_sql(_SQL, (self.max_id,)).fetchall()
+        if rows:
+            ids, uids, scores, totals, durations, stamps = zip(*rows)
+            self.ids.extend(ids)
+            self.user_ids.extend(uids)
+            self.scores.extend(scores)
+            self.totals.extend(totals)
+            self.durations.extend(durations)
+            self.stamps.extend(stamps)
+            self.max_id = ids[-1]
+        return len(rows)
+
+    def refresh(self) -> int:
+        """追加新记录（纪元变化时整体重新加载），返回新增行数。"""
+        with self._lock:
+            return self._refresh_locked()
+
+    # -----------------------------
+    # 统计（调用前自动 refresh）
+    # -----------------------------
+    def summary(self, pass_ratio: float = PASS_RATIO, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """{'total_exams', 'avg_score', 'avg_duration', 'pass_rate'}，user_id 为空时统计全部记录。"""
+        with self._lock:
+            self._refresh_locked()
+            if np is not None:
+                return self._summary_np(pass_ratio, user_id)
+            return self._summary_py(pass_ratio, user_id)
+
+    def _summary_np(self, pass_ratio, user_id):
+        scores, totals, durations = self.scores.values, self.totals.values, self.durations.values
+        if user_id is not None:
+            mask = self.user_ids.values == user_id
+            scores, totals, durations = scores[mask], totals[mask], durations[mask]
+        n = len(scores)
+        if not n:
+            return {'total_exams': 0, 'avg_score': 0.0, 'avg_duration': 0.0, 'pass_rate': 0.0}
+        s_ok = ~np.isnan(scores)
+        d_ok = ~np.isnan(durations)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            passed = (totals > 0) & (scores / totals >= pass_ratio)
+        return {
+            'total_exams': int(n),
+            'avg_score': float(scores[s_ok].mean()) if s_ok.any() else 0.0,
+            'avg_duration': float(durations[d_ok].mean()) if d_ok.any() else 0.0,
+            'pass_rate': float(np.count_nonzero(passed)) / n,
+        }
+
+    def _summary_py(self, pass_ratio, user_id):
+        n = passed = s_n = d_n = 0
+        s_sum = d_sum = 0.0
+        uids = self.user_ids.values
+        for i, (score, total, duration) in enumerate(zip(self.scores.values, self.totals.values,
+                                                         self.durations.values)):
+            if user_id is not None and uids[i] != user_id:
+                continue
+            n += 1
+            if score == score:  # 非 NaN
+                s_n += 1
+                s_sum += score
+                if total > 0 and score / total >= pass_ratio:
+                    passed += 1
+            if duration == duration:
+                d_n += 1
+                d_sum += duration
+        return {
+            'total_exams': n,
+            'avg_score': s_sum / s_n if s_n else 0.0,
+            'avg_duration': d_sum / d_n if d_n else 0.0,
+            'pass_rate': passed / n if n else 0.0,
+        }
+
+    def histogram(self, buckets: int = 10) -> List[int]:
+        """按 score / max(total) 分桶计数，规则与 AnalyticsService.score_histogram 的 SQL 版本一致。"""
+        with self._lock:
+            self._refresh_locked()
+            counts = [0] * buckets
+            if not self.ids.n:
+                return counts
+            scores, totals = self.scores.values, self.totals.values
+            max_score = float(totals.max()) if np is not None else max(totals)
+            if max_score == 0:
+                max_score = 1.0
+            if np is not None:
+                s = scores[~np.isnan(scores)]
+                idx = np.clip(np.trunc(s * buckets / max_score).astype(np.int64), 0, buckets - 1)
+                return [int(c) for c in np.bincount(idx, minlength=buckets)]
+            for score in scores:
+                if score != score:
+                    continue
+                b = int(score * buckets / max_score)
+                counts[min(max(b, 0), buckets - 1)] += 1
+            return counts
+
+    def _daily(self, first_day: int, days: int) -> Tuple[List[int], List[float], List[int]]:
+        """[first_day, first_day + days) 内每天（UTC 日序号）的 (场次, 总分, 及格场次)。"""
+        if np is not None:
+            day = self.stamps.values // _DAY - first_day
+            mask = (self.stamps.values >= 0) & (day >= 0) & (day < days)
+            day, scores, totals = day[mask], self.scores.values[mask], self.totals.values[mask]
+            scores = np.nan_to_num(scores, nan=0.0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                passed = ((totals > 0) & (scores / totals >= PASS_RATIO)).astype(np.float64)
+            counts = np.bincount(day, minlength=days)
+            sums = np.bincount(day, weights=scores, minlength=days)
+            passes = np.bincount(day, weights=passed, minlength=days)
+            return counts.tolist(), sums.tolist(), [int(p) for p in passes]
+        counts, sums, passes = [0] * days, [0.0] * days, [0] * days
+        for stamp, score, total in zip(self.stamps.values, self.scores.values, self.totals.values):
+            if stamp < 0:
+                continue
+            d = stamp // _DAY - first_day
+            if 0 <= d < days:
+                score = 0.0 if score != score else score
+                counts[d] += 1
+                sums[d] += score
+                if total > 0 and score / total >= PASS_RATIO:
+                    passes[d] += 1
+        return counts, sums, passes
+
+    def trend(self, days: int = 14, granularity: str = 'day',
+              today: Optional[datetime.date] = None) -> Dict[str, Any]:
+        """与 RollupService.trend 相同的结构：{'dates', 'avg_scores', 'counts', 'pass_rates'}。"""
+        if granularity not in ('day', 'week', 'month'):
+            raise ValueError(f"不支持的粒度: {granularity}")
+        today = today or datetime.datetime.utcnow().date()
+        first = today - datetime.timedelta(days=days - 1)
+        first_day = (first - datetime.date(1970, 1, 1)).days
+        with self._lock:
+            self._refresh_locked()
+            counts, sums, passes = self._daily(first_day, days)
+        periods: Dict[datetime.date, List[float]] = {}
+        for i in range(days):
+            acc = periods.setdefault(rollup_service._period_start(first + datetime.timedelta(days=i), granularity),
+                                     [0, 0.0, 0])
+            acc[0] += counts[i]
+            acc[1] += sums[i]
+            acc[2] += passes[i]
+        dates, avg_scores, out_counts, pass_rates = [], [], [], []
+        for start, (n, score_sum, passed) in periods.items():
+            dates.append(start.isoformat())
+            out_counts.append(int(n))
+            avg_scores.append(score_sum / n if n else 0.0)
+            pass_rates.append(passed / n if n else 0.0)
+        return {'dates': dates, 'avg_scores': avg_scores, 'counts': out_counts, 'pass_rates': pass_rates}
+
+
+# module-level instance
+exam_snapshot = ExamSnapshot()
@@ -0,0 +1,364 @@
+# app/services/grading_service.py
+"""
+GradingService
+--------------
+统一的评分引擎，考试提交与 ExamService 都通过它评分：
+- 答案键（AnswerKey）预先规范化：选择题去空格转大写，填空题去空格转小写；
+- 所需答案键一次 IN 查询批量加载，并缓存在进程内的答案键快照中，题库版本变化时整体作废；
+- 支持一次评多份提交（grade_batch），编程题统一交给判题函数单独处理；
+  每份提交的评分时限从它的第一道编程题开始判题时算起，排在前面的提交占用判题池的时间不计入后面提交的时限；
+- 一份提交中的多道编程题同时派发给判题进程池，在等待期间评选择/填空题，
+  整体耗时约等于最慢的一道编程题，并受每份提交的评分时限约束。
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+import ast
+import json
+import os
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from .. import db
+from ..models import Question, QuestionTestSpec
+from .question_index import question_index, QuestionIndex
+from .judge_worker import source_hash
+from .test_spec import build_spec, spec_hash
+
+
+def normalize_choice(value: Any) -> str:
+    return '' if value is None else str(value).strip().upper()
+
+
+def normalize_fill(value: Any) -> str:
+    return '' if value is None else str(value).strip().lower()
+
+
+def parse_details(text: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    """解析 ExamRecord.details：兼容 JSON 与旧版 str(list) 两种格式，无法解析时返回 None。"""
+    if not text:
+        return None
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    if not isinstance(value, list):
+        return None
+    return [d for d in value if isinstance(d, dict)]
+
+
+def item_score(d: Dict[str, Any]) -> float:
+    """一条明细的得分。ExamService 旧格式的明细只有 ok 没有 score，按 ok 折算为 1 或 0 分。"""
+    score = d.get('score')
+    if score is None:
+        return 1.0 if d.get('ok') else 0.0
+    return float(score)
+
+
+class AnswerKey:
+    """单题的不可变答案键。key 为预先规范化后的标准答案（编程题为 None）。"""
+
+    __slots__ = ('qid', 'qtype', 'answer', 'key', 'judge_template', 'judge_hash', 'spec')
+
+    def __init__(self, qid: int, qtype: str, answer: Optional[str], judge_template: Optional[str],
+                 spec: Optional[Dict[str, Any]] = None):
+        self.qid = qid
+        self.qtype = qtype
+        self.answer = answer
+        self.judge_template = judge_template
+        # 结构化用例（可选），存在时优先于判题模板
+        self.spec = spec if qtype == 'code' else None
+        # 判题模板（或用例）的内容哈希：判题进程按它缓存编译结果，每个题目版本只算一次
+        if qtype != 'code':
+            self.judge_hash = None
+        elif self.spec:
+            self.judge_hash = spec_hash(self.spec)
+        else:
+            self.judge_hash = source_hash(judge_template or '')
+        if qtype == 'choice':
+            self.key = normalize_choice(answer or '')
+        elif qtype == 'fill':
+            self.key = normalize_fill(answer or '')
+        else:
+            self.key = None
+
+    @classmethod
+    def from_row(cls, row) -> 'AnswerKey':
+        qid, qtype, answer, judge_template, func_name, cases, mode, timeout, stop = row
+        spec = None
+        if func_name:
+            try:
+                spec = build_spec(func_name, cases, mode, timeout, stop)
+            except ValueError:
+                spec = None  # 用例损坏时退回判题模板
+        return cls(qid, qtype, answer, judge_template, spec)
+
+
+class AnswerKeySnapshot:
+    """
+    某一题库版本下的答案键快照。
+    每个 AnswerKey 一旦放入就不再修改；题库版本变化时由 AnswerKeyStore 换成新的快照。
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+        self.keys: Dict[int, AnswerKey] = {}
+        self.complete = False  # 是否已加载全部题目
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class AnswerKeyStore:
+    """按需加载答案键：缺失的题目一次 IN 查询补齐。"""
+
+    def __init__(self, index: QuestionIndex = question_index):
+        self.index = index
+        self._lock = threading.Lock()
+        self._snapshot = AnswerKeySnapshot(-1)
+
+    def snapshot(self) -> AnswerKeySnapshot:
+        snap = self._snapshot
+        if snap.version != self.index.version:
+            with self._lock:
+                if self._snapshot.version != self.index.version:
+                    self._snapshot = AnswerKeySnapshot(self.index.version)
+                snap = self._snapshot
+        return snap
+
+    @staticmethod
+    def _query_rows(qids: Optional[List[int]] = None):
+        q = db.session.query(Question.id, Question.qtype, Question.answer, Question.judge_template,
+                             QuestionTestSpec.func_name, QuestionTestSpec.cases, QuestionTestSpec.compare_mode,
+                             QuestionTestSpec.case_timeout, QuestionTestSpec.stop_on_fail)
+        q = q.outerjoin(QuestionTestSpec, QuestionTestSpec.question_id == Question.id)
+        if qids is not None:
+            q = q.filter(Question.id.in_(qids))
+        return q.all()
+
+    def keys_for(self, qids: Iterable[int]) -> Dict[int, AnswerKey]:
+        """返回 qids 对应的答案键（不存在的题目不会出现在结果中）。"""
+        snap = self.snapshot()
+        qids = set(qids)
+        missing = [qid for qid in qids if qid not in snap.keys]
+        if missing and not snap.complete:
+            rows = self._query_rows(missing)
+            with self._lock:
+                for row in rows:
+                    snap.keys[row[0]] = AnswerKey.from_row(row)
+        keys = snap.keys
+        return {qid: keys[qid] for qid in qids if qid in keys}
+
+    def preload(self) -> int:
+        """一次加载整个题库的答案键（例如在启动或批量重评前预热），返回题目数量。"""
+        snap = AnswerKeySnapshot(self.index.version)
+        for row in self._query_rows():
+            snap.keys[row[0]] = AnswerKey.from_row(row)
+        snap.complete = True
+        with self._lock:
+            self._snapshot = snap
+        return len(snap)
+
+
+class _Started:
+    """判题任务开始执行的时间点（任务在线程池中排队时尚未设置）。"""
+
+    __slots__ = ('at', 'event')
+
+    def __init__(self):
+        self.at: Optional[float] = None
+        self.event = threading.Event()
+
+    def mark(self) -> None:
+        self.at = time.monotonic()
+        self.event.set()
+
+
+def _default_judge(key: 'AnswerKey', user_code: str) -> Tuple[bool, str, Optional[float]]:
+    """返回 (是否通过, 消息, 判题耗时毫秒)；命中判题缓存时耗时为 None。"""
+    from .judge_service import judge_service
+    res = judge_service.judge_question(key.qid, user_code, key.judge_template or '', key.judge_hash, key.spec)
+    return res['ok'], res['msg'], (None if res.get('cached') else res.get('ms'))
+
+
+class GradingService:
+    """评分引擎：对一份或多份提交评分。"""
+
+    def __init__(self, store: Optional[AnswerKeyStore] = None,
+                 judge: Optional[Callable[[AnswerKey, str], Tuple]] = None,
+                 max_parallel_judges: int = 16):
+        self.store = store or AnswerKeyStore()
+        self.judge = judge or _default_judge
+        # 同一时刻最多并行等待的编程题数量（实际并行度受判题进程数限制）
+        self.max_parallel_judges = max_parallel_judges
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_qid(qid: Any) -> Optional[int]:
+        try:
+            return int(qid)
+        except (TypeError, ValueError):
+            return None
+
+    def grade_item(self, key: AnswerKey, got: Any) -> Dict[str, Any]:
+        """评一道选择/填空题，返回明细字典（编程题请用 judge_code_items）。"""
+        if key.qtype == 'choice':
+            ok = normalize_choice(got) == key.key
+        elif key.qtype == 'fill':
+            ok = normalize_fill(got) == key.key
+        else:
+            return {'qid': key.qid, 'type': key.qtype, 'ok': False, 'score': 0.0, 'reason': '未知题型'}
+        item = {'qid': key.qid, 'type': key.qtype, 'ok': ok, 'score': 1.0 if ok else 0.0, 'got': got}
+        if not ok:
+            item['expected'] = key.answer
+        return item
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # 线程只负责等待判题进程返回；fork 之后在子进程中重新创建
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_parallel_judges,
+                                                    thread_name_prefix='grade-judge')
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _judge_in_context(self, app, key: AnswerKey, got: Any, started: _Started) -> Tuple:
+        started.mark()
+        if app is None:
+            return self.judge(key, got or '')
+        with app.app_context():
+            return self.judge(key, got or '')
+
+    def dispatch_code_items(self, items: List[Tuple[AnswerKey, Any]]) -> List[Tuple[AnswerKey, Any, Future, _Started]]:
+        """把编程题同时提交给判题进程池，立即返回 (答案键, 学生代码, Future, 开始时间) 列表。"""
+        app = current_app._get_current_object() if has_app_context() else None
+        executor = self._executor()
+        out = []
+        for key, got in items:
+            started = _Started()
+            out.append((key, got, executor.submit(self._judge_in_context, app, key, got, started), started))
+        return out
+
+    def collect_code_items(self, pending: List[Tuple[AnswerKey, Any, Future, _Started]],
+                           deadline: Optional[float] = None,
+                           budget: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        等待判题结果，最多等到 deadline（time.monotonic() 时间点），未完成的判为超时。
+        给出 budget（秒）时时限改为从第一道题开始判题时算起，在线程池中排队的时间不计入。
+        """
+        if budget is not None and pending:
+            # 同一份提交的编程题连续派发，第一道最先开始执行
+            first = pending[0][3]
+            first.event.wait()
+            deadline = first.at + budget
+        out = []
+        for key, got, fut, _ in pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ms = None
+            try:
+                res = fut.result(timeout=timeout)
+                # 自定义判题函数可以只返回 (ok, msg)
+                ok, msg = res[0], res[1]
+                if len(res) > 2:
+                    ms = res[2]
+            except FutureTimeout:
+                ok, msg = False, "判题超时: 超过本次提交的评分时限"
+            except Exception as e:
+                ok, msg = False, f"运行出错: 判题服务异常 {e}"
+            # 保留学生代码（got），判题模板修正后可据此重评
+            item = {'qid': key.qid, 'type': 'code', 'ok': ok, 'score': 1.0 if ok else 0.0,
+                    'got': got, 'msg': msg}
+            if ms is not None:
+                item['ms'] = round(ms, 2)
+            out.append(item)
+        return out
+
+    def judge_code_items(self, items: List[Tuple[AnswerKey, Any]],
+                         deadline_seconds: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+        """并行判多道编程题，返回 qid -> 明细。"""
+        deadline = None if deadline_seconds is None else time.monotonic() + deadline_seconds
+        return {d['qid']: d for d in self.collect_code_items(self.dispatch_code_items(items), deadline)}
+
+    def _start(self, answers: Dict[Any, Any], keys: Dict[int, AnswerKey]):
+        """第一阶段：先把编程题派发出去，再在等待期间评选择/填空题。"""
+        details: List[Optional[Dict[str, Any]]] = []
+        code_items = []
+        code_slots = []
+        plain = []
+        for raw_qid, got in answers.items():
+            qid = self.parse_qid(raw_qid)
+            if qid is None:
+                continue
+            key = keys.get(qid)
+            if key is None:
+                details.append({'qid': qid, 'ok': False, 'reason': '题目不存在'})
+                continue
+            if key.qtype == 'code':
+                code_slots.append(len(details))
+                code_items.append((key, got))
+            else:
+                plain.append((len(details), key, got))
+            details.append(None)
+        pending = self.dispatch_code_items(code_items) if code_items else []
+        for slot, key, got in plain:
+            details[slot] = self.grade_item(key, got)
+        return details, code_slots, pending
+
+    @staticmethod
+    def _finish(state, collected: List[Dict[str, Any]]) -> Dict[str, Any]:
+        details, code_slots, _ = state
+        for slot, item in zip(code_slots, collected):
+            details[slot] = item
+        score = sum(d.get('score', 0.0) for d in details)
+        total = float(sum(1 for d in details if 'type' in d))
+        return {'score': score, 'total': total, 'details': details}
+
+    def _deadline(self, deadline_seconds: Optional[float]) -> Optional[float]:
+        if deadline_seconds is None:
+            deadline_seconds = self.deadline_seconds
+        return None if deadline_seconds is None else time.monotonic() + deadline_seconds
+
+    def grade(self, answers: Dict[Any, Any], deadline_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        对一份提交评分。
+        answers: question_id -> 学生答案（选择/填空为字符串，编程题为代码）。
+        多道编程题同时判题，整份提交最多等待 deadline_seconds 秒（默认取配置 EXAM_GRADE_DEADLINE）。
+        返回 {'score', 'total', 'details'}，题目不存在的条目不计入 total。
+        """
+        qids = [q for q in (self.parse_qid(k) for k in answers) if q is not None]
+        deadline = self._deadline(deadline_seconds)
+        state = self._start(answers, self.store.keys_for(qids))
+        return self._finish(state, self.collect_code_items(state[2], deadline))
+
+    def grade_batch(self, submissions: List[Dict[Any, Any]],
+                    deadline_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        对多份提交评分：所有答案键一次加载，所有编程题一起派发，结果与输入顺序一致。
+        每份提交最多等待 deadline_seconds 秒，从它的第一道编程题开始判题时算起。
+        """
+        qids = set()
+        for answers in submissions:
+            qids.update(q for q in (self.parse_qid(k) for k in answers) if q is not None)
+        keys = self.store.keys_for(qids)
+        budget = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        states = [self._start(answers, keys) for answers in submissions]
+        # 判题池按顺序处理各份提交的编程题，每份提交的时限从它自己的编程题开始判题时算起
+        return [self._finish(st, self.collect_code_items(st[2], budget=budget)) for st in states]
+
+    @property
+    def deadline_seconds(self) -> Optional[float]:
+        if has_app_context():
+            return current_app.config.get('EXAM_GRADE_DEADLINE', 15)
+        return 15
+
+
+# module-level instance
+grading_service = GradingService()
@@ -0,0 +1,235 @@
+# app/services/item_analysis_service.py
+"""
+ItemAnalysisService
+-------------------
+经典测量理论的项目分析：一次批量给出每道题的
+- 通过率（p 值，答对人次 / 作答人次）；
+- 区分度（点二列相关：本题是否答对 与 所在考试得分率 的相关系数）；
+- 选择题 A–D 各选项的选择比例（干扰项分析）；
+- 编程题的平均判题耗时。
+做法：
+- 各统计量都由可累加的和（n、Σx、Σy、Σy²、Σxy、选项计数、耗时和）算出，保存在 item_stats 表中；
+- refresh() 从水位线（analysis_watermarks 表）之后读取新的 exam_answers 行，一次原始查询取成按列的数组，
+  在数组上按题目分组累加后批量 UPSERT，再推进水位线；页面访问只处理新增的作答；
+- 安装了 NumPy 时分组累加用 np.unique + np.bincount（带权重）向量化完成，没有 NumPy 时逐行累加，结果一致；
+- 重评、回填会改写已有作答，之后调用 reset() 清空累计量，下次 refresh() 全量重算。
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+import datetime
+import math
+import threading
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .. import db
+from ..models import AnalysisWatermark, ExamAnswer, ExamRecord, ItemStats
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+WATERMARK = 'item-analysis'
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+# 每次从 exam_answers 读取的行数上限（控制内存）
+_BATCH = 50000
+
+_SUMS = ['n', 'sum_x', 'sum_y', 'sum_y2', 'sum_xy', 'opt_a', 'opt_b', 'opt_c', 'opt_d', 'opt_other',
+         'judge_ms_sum', 'judge_ms_n']
+
+
+def _option_code(qtype: Optional[str], response: Optional[str]) -> int:
+    """选择题作答编码为 0–3（A–D），4 为其它；非选择题为 -1。"""
+    if qtype != 'choice':
+        return -1
+    r = (response or '').strip().upper()[:1]
+    return OPTIONS.index(r) if r and r in OPTIONS else 4
+
+
+class Columns:
+    """一批作答按列存放：题目 id、是否答对、考试得分率、选项编码、判题耗时（NaN 表示无）。"""
+
+    __slots__ = ('last_id', 'qid', 'x', 'y', 'opt', 'ms')
+
+    def __init__(self):
+        self.last_id = 0
+        self.qid = array('q')
+        self.x = array('b')
+        self.y = array('d')
+        self.opt = array('b')
+        self.ms = array('d')
+
+    def __len__(self) -> int:
+        return len(self.qid)
+
+    @classmethod
+    def fetch(cls, after_id: int, limit: int) -> 'Columns':
+        """一条 JOIN 查询读取 id > after_id 的作答（按 id 递增），直接填入数组，不创建 ORM 对象。"""
+        a, r = ExamAnswer.__table__.c, ExamRecord.__table__.c
+        stmt = (select(a.id, a.question_id, a.correct, a.qtype, a.response, a.judge_ms, r.score, r.total)
+                .join_from(ExamAnswer.__table__, ExamRecord.__table__, r.id == a.record_id)
+                .where(a.id > after_id).order_by(a.id).limit(limit))
+        cols = cls()
+        nan = math.nan
+        for aid, qid, correct, qtype, response, ms, score, total in db.session.execute(stmt):
+            cols.qid.append(qid)
+            cols.x.append(1 if correct else 0)
+            cols.y.append((score or 0.0) / total if total else 0.0)
+            cols.opt.append(_option_code(qtype, response))
+            cols.ms.append(nan if ms is None else ms)
+            cols.last_id = aid
+        return cols
+
+
+def aggregate(cols: Columns) -> Dict[int, List[float]]:
+    """在列数组上按题目分组累加，返回 qid -> 与 _SUMS 顺序一致的累加量。"""
+    if np is not None and len(cols):
+        return _aggregate_np(cols)
+    acc: Dict[int, List[float]] = {}
+    for qid, x, y, opt, ms in zip(cols.qid, cols.x, cols.y, cols.opt, cols.ms):
+        s = acc.get(qid)
+        if s is None:
+            s = acc[qid] = [0, 0, 0.0, 0.0, 0.0, 0, 0, 0, 0, 0, 0.0, 0]
+        s[0] += 1
+        s[1] += x
+        s[2] += y
+        s[3] += y * y
+        if x:
+            s[4] += y
+        if opt >= 0:
+            s[5 + opt] += 1
+        if ms == ms:  # 非 NaN
+            s[10] += ms
+            s[11] += 1
+    return acc
+
+
+def _aggregate_np(cols: Columns) -> Dict[int, List[float]]:
+    """aggregate() 的 NumPy 实现：数组零拷贝转为 ndarray，每个累加量一次 bincount。"""
+    qid = np.frombuffer(cols.qid, dtype=np.int64)
+    x = np.frombuffer(cols.x, dtype=np.int8) != 0
+    y = np.frombuffer(cols.y, dtype=np.float64)
+    opt = np.frombuffer(cols.opt, dtype=np.int8).astype(np.int64)
+    ms = np.frombuffer(cols.ms, dtype=np.float64)
+    keys, g = np.unique(qid, return_inverse=True)
+    k = len(keys)
+    chosen = opt >= 0
+    timed = ~np.isnan(ms)
+    # 选项计数按 (题目, 选项) 展开成 k*5 个桶
+    opts = np.bincount(g[chosen] * 5 + opt[chosen], minlength=k * 5).reshape(k, 5)
+    # tolist() 转回 Python 数值，sqlite3 不能直接绑定 NumPy 标量
+    columns = [
+        np.bincount(g, minlength=k).tolist(),
+        np.bincount(g[x], minlength=k).tolist(),
+        np.bincount(g, weights=y, minlength=k).tolist(),
+        np.bincount(g, weights=y * y, minlength=k).tolist(),
+        np.bincount(g[x], weights=y[x], minlength=k).tolist(),
+        *opts.T.tolist(),
+        np.bincount(g[timed], weights=ms[timed], minlength=k).tolist(),
+        np.bincount(g[timed], minlength=k).tolist(),
+    ]
+    return {qid: list(sums) for qid, sums in zip(keys.tolist(), zip(*columns))}
+
+
+def item_metrics(row: ItemStats) -> Dict[str, Any]:
+    """由累加量计算单题指标。"""
+    n = row.n or 0
+    out: Dict[str, Any] = {'n': n, 'p_value': None, 'discrimination': None,
+                           'options': None, 'mean_judge_ms': None}
+    if n:
+        out['p_value'] = row.sum_x / n
+        # 点二列相关（x 为 0/1，Σx² = Σx）
+        sx, sy = row.sum_x, row.sum_y
+        var_x = n * sx - sx * sx
+        var_y = n * row.sum_y2 - sy * sy
+        if var_x > 0 and var_y > 1e-12:
+            out['discrimination'] = (n * row.sum_xy - sx * sy) / math.sqrt(var_x * var_y)
+    counts = [row.opt_a, row.opt_b, row.opt_c, row.opt_d]
+    chosen = sum(counts) + (row.opt_other or 0)
+    if chosen:
+        out['options'] = {opt: c / chosen for opt, c in zip(OPTIONS, counts)}
+    if row.judge_ms_n:
+        out['mean_judge_ms'] = row.judge_ms_sum / row.judge_ms_n
+    return out
+
+
+class ItemAnalysisService:
+    """项目分析服务。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _watermark() -> AnalysisWatermark:
+        wm = db.session.get(AnalysisWatermark, WATERMARK)
+        if wm is None:
+            wm = AnalysisWatermark(name=WATERMARK, last_id=0)
+            db.session.add(wm)
+            db.session.flush()
+        return wm
+
+    def _apply(self, cols: Columns, old_id: int) -> bool:
+        """把一批累加量写入 item_stats 并推进水位线；水位线已被其它进程推进时放弃本批。"""
+        t = AnalysisWatermark.__table__
+        # 先做条件更新拿到写锁：并发刷新时只有一方能从 old_id 推进
+        res = db.session.execute(update(t).where(t.c.name == WATERMARK, t.c.last_id == old_id)
+                                 .values(last_id=cols.last_id, updated_at=datetime.datetime.utcnow()))
+        if res.rowcount != 1:
+            db.session.rollback()
+            return False
+        st = ItemStats.__table__
+        params = [dict(zip(['question_id'] + _SUMS, [qid] + s)) for qid, s in aggregate(cols).items()]
+        stmt = sqlite_insert(st)
+        stmt = stmt.on_conflict_do_update(index_elements=[st.c.question_id],
+                                          set_={k: st.c[k] + stmt.excluded[k] for k in _SUMS})
+        db.session.execute(stmt, params)
+        db.session.commit()
+        return True
+
+    def refresh(self, batch_size: int = _BATCH) -> int:
+        """汇总水位线之后的新作答并提交，返回处理的行数。"""
+        done = 0
+        with self._lock:
+            while True:
+                old_id = self._watermark().last_id
+                db.session.commit()
+                cols = Columns.fetch(old_id, batch_size)
+                if not len(cols):
+                    break
+                if not self._apply(cols, old_id):
+                    continue  # 其它进程刚刚推进了水位线，从新的位置继续
+                done += len(cols)
+                if len(cols) < batch_size:
+                    break
+        return done
+
+    def reset(self) -> None:
+        """清空累计量与水位线（不提交），下次 refresh() 全量重算。"""
+        db.session.execute(ItemStats.__table__.delete())
+        db.session.execute(AnalysisWatermark.__table__.delete()
+                           .where(AnalysisWatermark.__table__.c.name == WATERMARK))
+
+    def stats_for(self, qids: Optional[Iterable[int]] = None, refresh: bool = True) -> Dict[int, Dict[str, Any]]:
+        """返回 qid -> {'n', 'p_value', 'discrimination', 'options', 'mean_judge_ms'}（默认先增量刷新）。"""
+        if refresh:
+            self.refresh()
+        q = ItemStats.query
+        if qids is not None:
+            qids = list(qids)
+            if not qids:
+                return {}
+            # 题量较大时 IN 列表过长，直接读全表再筛选
+            if len(qids) <= 500:
+                q = q.filter(ItemStats.question_id.in_(qids))
+        wanted = None if qids is None else set(qids)
+        return {row.question_id: item_metrics(row) for row in q.all()
+                if wanted is None or row.question_id in wanted}
+
+
+# module-level instance
+item_analysis_service = ItemAnalysisService()
@@ -0,0 +1,260 @@
+# app/services/judge_queue.py
+"""
+JudgeQueue
+----------
+异步判题队列：code_run 提交后立即返回 job id，由后台调度线程交给判题进程池执行，
+前端轮询状态接口获取 pending / running / done 以及判题结果。
+- 队列总深度有上限，超过时拒绝新提交（JudgeQueueFull）；
+- 每个用户最多同时排队若干个任务，并按用户轮转取任务，单个学生刷提交不会饿死其他人；
+- 已完成的任务结果保留 JUDGE_JOB_RETENTION 秒后清理：提交、状态轮询时调用 expire()，
+  调度线程空闲时也定期（至多每 _EXPIRE_INTERVAL 秒）清理，没有新提交和轮询时结果与共享文件同样会被删除；
+  已完成任务按完成顺序排队，每次只检查队首，不必扫描全部任务；
+- 多进程部署（serve.py）时状态轮询可能落到另一个工作进程上：配置 JUDGE_JOBS_SHARED 后，
+  任务状态同时写入数据库文件旁的 <数据库文件>.judge-jobs/ 目录（每个任务一个小 JSON 文件），
+  本进程找不到的任务从这里读取。
+"""
+
+from typing import Any, Dict, Optional
+from collections import OrderedDict, deque
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from .judge_service import judge_service
+
+# 调度线程空闲时清理过期任务的最长间隔（秒）
+_EXPIRE_INTERVAL = 60.0
+
+
+class JudgeQueueFull(Exception):
+    """队列已满或该用户排队任务过多。"""
+
+
+class JudgeJob:
+    """一次异步判题任务。"""
+
+    def __init__(self, user_id: int, qid: int, code: str, judge_template: str,
+                 spec: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.qid = qid
+        self.code = code
+        self.judge_template = judge_template
+        self.spec = spec
+        self.status = 'pending'  # pending / running / done
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'job_id': self.id, 'qid': self.qid, 'status': self.status, 'result': self.result}
+
+
+class JudgeQueue:
+    """按用户轮转的有界判题队列。"""
+
+    def __init__(self, max_depth: int = 200, per_user: int = 3, dispatchers: int = 2,
+                 retention_seconds: int = 600):
+        self.max_depth = max_depth
+        self.per_user = per_user
+        self.dispatchers = dispatchers
+        self.retention_seconds = retention_seconds
+        self._users: 'OrderedDict[int, deque]' = OrderedDict()
+        self._jobs: Dict[str, JudgeJob] = {}
+        self._finished: deque = deque()  # 已完成任务的 id，按完成顺序
+        self._depth = 0
+        self._cond = threading.Condition()
+        self._running = 0
+        self._pid = None
+        self._app = None
+        self.shared_dir: Optional[str] = None
+        self._last_sweep = 0.0
+
+    def configure(self, config) -> None:
+        self.max_depth = config.get('JUDGE_QUEUE_MAX_DEPTH', self.max_depth)
+        self.per_user = config.get('JUDGE_QUEUE_PER_USER', self.per_user)
+        self.dispatchers = config.get('JUDGE_WORKERS', self.dispatchers)
+        self.retention_seconds = config.get('JUDGE_JOB_RETENTION', self.retention_seconds)
+        self.shared_dir = None
+        uri = config.get('SQLALCHEMY_DATABASE_URI', '')
+        if config.get('JUDGE_JOBS_SHARED') and uri.startswith('sqlite:///') and ':memory:' not in uri:
+            self.shared_dir = uri.replace('sqlite:///', '') + '.judge-jobs'
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def start(self, app) -> None:
+        """启动调度线程（每个进程一次）。"""
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._app = app
+            self.configure(app.config)
+            for i in range(max(1, int(self.dispatchers))):
+                threading.Thread(target=self._run, name=f'judge-dispatch-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def depth(self) -> int:
+        return self._depth
+
+    def submit(self, user_id: int, qid: int, code: str, judge_template: str,
+               spec: Optional[Dict[str, Any]] = None) -> JudgeJob:
+        """提交任务，返回 JudgeJob；队列满或该用户排队过多时抛出 JudgeQueueFull。"""
+        job = JudgeJob(user_id, qid, code, judge_template, spec)
+        with self._cond:
+            self._expire_locked()
+            if self._depth >= self.max_depth:
+                raise JudgeQueueFull("判题队列已满，请稍后再试")
+            user_jobs = self._users.get(user_id)
+            if user_jobs is not None and len(user_jobs) >= self.per_user:
+                raise JudgeQueueFull("你的提交仍在排队，请等待结果后再提交")
+            if user_jobs is None:
+                user_jobs = self._users[user_id] = deque()
+            user_jobs.append(job)
+            self._jobs[job.id] = job
+            self._depth += 1
+            # 在锁内写入 pending，保证不会覆盖调度线程随后写入的 done
+            self._publish(job)
+            self._cond.notify_all()
+        return job
+
+    def status(self, job_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """返回任务状态；指定 user_id 时只允许查看自己的任务。"""
+        self.expire()
+        job = self._jobs.get(job_id)
+        if job is None:
+            return self._load_shared(job_id, user_id)
+        if user_id is not None and job.user_id != user_id:
+            return None
+        return job.to_dict()
+
+    def expire(self) -> None:
+        """清理超过保留时长的已完成任务及其共享状态文件。"""
+        with self._cond:
+            self._expire_locked()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的任务全部完成（工作进程退出前调用），超时返回 False。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._depth == 0 and self._running == 0, timeout)
+
+    # -----------------------------
+    # 跨进程共享的任务状态
+    # -----------------------------
+    def _shared_path(self, job_id: str) -> Optional[str]:
+        if self.shared_dir is None or not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+            return None
+        return os.path.join(self.shared_dir, job_id + '.json')
+
+    def _publish(self, job: JudgeJob) -> None:
+        path = self._shared_path(job.id)
+        if path is None:
+            return
+        data = dict(job.to_dict(), user_id=job.user_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            # 共享状态只影响其它进程的轮询，写入失败不影响判题
+            pass
+
+    def _load_shared(self, job_id: str, user_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        path = self._shared_path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        owner = data.pop('user_id', None)
+        if user_id is not None and owner != user_id:
+            return None
+        return data
+
+    def _remove_shared(self, job_id: str) -> None:
+        path = self._shared_path(job_id)
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _sweep_shared(self, now: float) -> None:
+        # 已退出的进程留下的状态文件，超过保留时长后由任意进程清理
+        if self.shared_dir is None or now - self._last_sweep < self.retention_seconds:
+            return
+        self._last_sweep = now
+        try:
+            with os.scandir(self.shared_dir) as it:
+                for entry in it:
+                    try:
+                        if now - entry.stat().st_mtime > self.retention_seconds:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+
+    def _next_locked(self) -> Optional[JudgeJob]:
+        # 取队首用户的一个任务，该用户若还有任务则排到末尾（轮转）
+        while self._users:
+            user_id, user_jobs = self._users.popitem(last=False)
+            if not user_jobs:
+                continue
+            job = user_jobs.popleft()
+            if user_jobs:
+                self._users[user_id] = user_jobs
+            self._depth -= 1
+            return job
+        return None
+
+    def _expire_locked(self) -> None:
+        now = time.time()
+        while self._finished:
+            jid = self._finished[0]
+            job = self._jobs.get(jid)
+            if job is not None and now - job.finished_at <= self.retention_seconds:
+                break
+            self._finished.popleft()
+            if job is not None:
+                del self._jobs[jid]
+                self._remove_shared(jid)
+        self._sweep_shared(now)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_locked()
+                while job is None:
+                    if not self._cond.wait(min(_EXPIRE_INTERVAL, max(1.0, self.retention_seconds))):
+                        self._expire_locked()
+                    job = self._next_locked()
+                job.status = 'running'
+                self._running += 1
+            try:
+                with self._app.app_context():
+                    res = judge_service.judge_question(job.qid, job.code, job.judge_template, spec=job.spec)
+                job.result = {'ok': res['ok'], 'msg': res['msg'], 'ms': res.get('ms', 0.0),
+                              'cached': res.get('cached', False)}
+                if 'cases' in res:
+                    job.result['cases'] = res['cases']
+            except Exception as e:
+                job.result = {'ok': False, 'msg': f"运行出错: 判题服务异常 {e}", 'ms': 0.0, 'cached': False}
+            job.code = job.judge_template = job.spec = None
+            job.finished_at = time.time()
+            job.status = 'done'
+            self._publish(job)
+            with self._cond:
+                self._finished.append(job.id)
+                self._running -= 1
+                self._cond.notify_all()
+
+
+# module-level instance
+judge_queue = JudgeQueue()
@@ -0,0 +1,227 @@
+# app/services/judge_service.py
+"""
+JudgeService
+------------
+进程外判题：学生代码不再在 Web 线程内 exec，而是交给预先启动的工作进程池执行。
+- 每个工作进程带 rlimit（CPU 秒数、地址空间、输出大小），见 judge_worker.py；
+- 父进程对每个任务做墙钟超时，超时直接杀掉工作进程并补一个新的；
+- 工作进程处理 N 个任务后自动回收重建，避免状态累积；
+- 请求/响应均为 dict，通过 multiprocessing 管道传递；
+- judge_question() 先查判题结果缓存（verdict_cache），相同代码不会重复执行；
+- 题目带结构化用例（spec）时，一次往返跑完全部用例并返回每个用例的结果与耗时。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from . import judge_worker
+from .verdict_cache import verdict_cache, verdict_key
+from .test_spec import spec_hash, spec_wall_seconds
+
+
+def _mp_context():
+    # fork 不会在子进程里重新导入 __main__（main.py 会 create_app），启动也最快；
+    # 没有 fork 的平台（Windows）退回 spawn
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+class JudgeWorker:
+    """父进程侧对单个工作进程的封装。"""
+
+    def __init__(self, ctx, limits: Dict[str, Any]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=judge_worker.worker_main, args=(child_conn, limits),
+                                   name='judge-worker', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self, kill: bool = False) -> None:
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class JudgePool:
+    """预启动的判题工作进程池。"""
+
+    def __init__(self, size: int = 2, limits: Optional[Dict[str, Any]] = None,
+                 max_jobs_per_worker: int = 200):
+        self.size = max(1, int(size))
+        self.limits = dict(limits or {})
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._ctx = _mp_context()
+        self._idle: 'queue.Queue[JudgeWorker]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ids = itertools.count(1)
+
+    def start(self) -> None:
+        """启动工作进程（每个进程只启动一次；fork 出的子进程会重新启动自己的池）。"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._idle = queue.Queue()
+            for _ in range(self.size):
+                self._idle.put(JudgeWorker(self._ctx, self.limits))
+            self._pid = os.getpid()
+
+    def shutdown(self) -> None:
+        if self._pid != os.getpid():
+            return
+        while True:
+            try:
+                w = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            w.stop()
+        self._pid = None
+
+    def _replace(self, worker: JudgeWorker, kill: bool) -> JudgeWorker:
+        worker.stop(kill=kill)
+        return JudgeWorker(self._ctx, self.limits)
+
+    def run(self, job: Dict[str, Any], wall_seconds: float, queue_timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        在某个空闲工作进程上执行 job 并等待结果。
+        wall_seconds 内没有返回则强制终止该进程；queue_timeout 内拿不到空闲进程则返回繁忙。
+        """
+        self.start()
+        job = dict(job)
+        job.setdefault('id', next(self._ids))
+        try:
+            worker = self._idle.get(timeout=queue_timeout)
+        except queue.Empty:
+            return {'id': job['id'], 'ok': False, 'msg': "判题繁忙，请稍后重试", 'ms': 0.0, 'output': ''}
+        kill = False
+        start = time.perf_counter()
+        try:
+            worker.conn.send(job)
+            if worker.conn.poll(wall_seconds):
+                result = worker.conn.recv()
+            else:
+                kill = True
+                result = {'id': job['id'], 'ok': False, 'msg': "运行超时: 超过时间限制",
+                          'ms': (time.perf_counter() - start) * 1000.0, 'output': ''}
+        except (EOFError, OSError):
+            # 工作进程异常退出（例如 CPU 硬上限触发 SIGKILL）
+            kill = True
+            result = {'id': job['id'], 'ok': False, 'msg': "运行出错: 判题进程异常退出",
+                      'ms': (time.perf_counter() - start) * 1000.0, 'output': ''}
+        worker.jobs_done += 1
+        if kill or result.get('recycle') or worker.jobs_done >= self.max_jobs_per_worker or not worker.alive():
+            worker = self._replace(worker, kill=kill or not worker.alive())
+        self._idle.put(worker)
+        result.pop('recycle', None)
+        return result
+
+
+class JudgeService:
+    """判题服务：根据配置创建进程池，对外提供 run() 接口。"""
+
+    def __init__(self):
+        self._pool: Optional[JudgePool] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _config() -> Dict[str, Any]:
+        if has_app_context():
+            return current_app.config
+        from ..config import Config
+        return {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+
+    @property
+    def pool(self) -> JudgePool:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    cfg = self._config()
+                    limits = {
+                        'cpu_seconds': cfg.get('JUDGE_CPU_SECONDS', 2),
+                        'memory_mb': cfg.get('JUDGE_MEMORY_MB', 256),
+                        'max_output': cfg.get('JUDGE_MAX_OUTPUT', 64 * 1024),
+                        'code_cache_size': cfg.get('JUDGE_CODE_CACHE_SIZE', 256),
+                    }
+                    self._pool = JudgePool(cfg.get('JUDGE_WORKERS', 2), limits,
+                                           cfg.get('JUDGE_MAX_JOBS_PER_WORKER', 200))
+                    verdict_cache.configure(cfg.get('VERDICT_CACHE_SIZE', 10000),
+                                            cfg.get('VERDICT_CACHE_PERSIST', False))
+                    self._cpu_seconds = limits['cpu_seconds']
+                    self._wall_seconds = cfg.get('JUDGE_WALL_SECONDS', 5)
+                    self._queue_timeout = cfg.get('JUDGE_QUEUE_TIMEOUT', 30)
+        return self._pool
+
+    def run_job(self, user_code: str, judge_code: str, builtins: Optional[List[str]] = None,
+                judge_hash: Optional[str] = None, spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        执行一次判题，返回完整响应字典（ok/msg/ms/output，带 spec 时还有 cases）。
+        judge_hash 为判题模板的内容哈希（见 judge_worker.source_hash），工作进程据此复用已编译的模板。
+        spec 为结构化用例（见 test_spec.build_spec），此时忽略 judge_code。
+        """
+        pool = self.pool
+        job = {'user_code': user_code or '', 'judge_code': judge_code or '',
+               'judge_hash': judge_hash or judge_worker.source_hash(judge_code or ''), 'builtins': builtins}
+        wall_seconds = self._wall_seconds
+        if spec:
+            job['spec'] = spec
+            # 用例多时放宽整组的 CPU 与墙钟上限，单个用例仍受 case_timeout 约束
+            wall_seconds = spec_wall_seconds(spec, wall_seconds)
+            job['cpu_seconds'] = max(self._cpu_seconds or 0, wall_seconds - 1.0)
+        return pool.run(job, wall_seconds, self._queue_timeout)
+
+    def run(self, user_code: str, judge_code: str, builtins: Optional[List[str]] = None,
+            judge_hash: Optional[str] = None) -> Tuple[bool, str]:
+        """执行一次判题，返回 (ok, msg)，与原 safe_exec 的返回值一致。"""
+        res = self.run_job(user_code, judge_code, builtins, judge_hash)
+        return res['ok'], res['msg']
+
+    def judge_question(self, qid: Optional[int], user_code: str, judge_code: str,
+                       judge_hash: Optional[str] = None, spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        判一道编程题：先按 (题目, 模板哈希, 规范化代码哈希) 查缓存，未命中才真正执行。
+        带 spec 时按结构化用例判题，哈希取 spec 的内容哈希。
+        返回响应字典，命中缓存时带 'cached': True（缓存只保存 ok/msg，不含逐用例明细）。
+        """
+        pool = self.pool  # 确保缓存已按配置初始化
+        if spec:
+            judge_hash = judge_hash or spec_hash(spec)
+        judge_hash = judge_hash or judge_worker.source_hash(judge_code or '')
+        key = verdict_key(qid, judge_hash, user_code)
+        hit = verdict_cache.get(key)
+        if hit is not None:
+            return {'ok': hit[0], 'msg': hit[1], 'ms': 0.0, 'output': '', 'cached': True}
+        res = self.run_job(user_code, judge_code, judge_hash=judge_hash, spec=spec)
+        if res.pop('cacheable', False):
+            verdict_cache.put(key, qid, res['ok'], res['msg'])
+        res['cached'] = False
+        return res
+
+
+# module-level instance
+judge_service = JudgeService()
@@ -0,0 +1,309 @@
+# app/services/judge_worker.py
+"""
+判题工作进程（子进程侧代码）。
+JudgePool 预先启动若干个工作进程，每个进程循环：接收任务 -> 执行学生代码与判题模板 -> 回传结果。
+工作进程启动时设置 rlimit（地址空间、写文件大小、core dump），每个任务开始前重新设置 CPU 秒数上限；
+墙钟超时由父进程负责强制终止。
+
+判题模板与学生代码分别编译，编译结果按内容哈希缓存在进程内的 LRU 中：
+模板在同一题目版本下只编译一次，之后每次提交只需在学生代码的命名空间上执行模板的 code 对象。
+
+请求（dict）：{'id', 'user_code', 'judge_code', 'judge_hash'(可选), 'builtins': [名称...] 或 None,
+              'spec'(可选，结构化用例), 'cpu_seconds'(可选，覆盖默认 CPU 预算)}
+响应（dict）：{'id', 'ok', 'msg', 'ms', 'output', 'recycle', 'cacheable', 'cases'(结构化用例时)}
+
+带 spec 的任务不执行 judge_code：学生代码只加载一次，然后在同一次往返中逐个调用被测函数，
+每个用例单独计时、单独超时（SIGALRM），并按 compare_mode 比较结果。
+"""
+
+from collections import OrderedDict
+import builtins as _builtins
+import hashlib
+import math
+import signal
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows 等平台没有 resource 模块，只依赖父进程的墙钟超时
+    resource = None
+
+# 与原 safe_exec 保持一致的默认内置函数白名单
+DEFAULT_BUILTINS = ('range', 'len', 'int', 'float', 'str', 'print', 'enumerate')
+
+
+# 以下判题中止信号继承 BaseException 而不是 Exception：
+# 学生代码里的 `except Exception` 不能吞掉它们继续运行或伪造通过
+
+class CpuTimeExceeded(BaseException):
+    """收到 SIGXCPU：本任务的 CPU 时间用尽。"""
+
+
+class OutputLimitExceeded(BaseException):
+    """学生代码输出超过限制。"""
+
+
+class CaseTimeout(BaseException):
+    """单个测试用例超时。"""
+
+
+def source_hash(source: str) -> str:
+    """代码内容哈希，用作编译缓存的键。"""
+    return hashlib.sha256((source or '').encode('utf-8')).hexdigest()
+
+
+class CodeCache:
+    """按内容哈希缓存 code 对象的 LRU。"""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = max(1, int(capacity))
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, source: str, filename: str, digest: str = None):
+        key = (filename, digest or source_hash(source))
+        code = self._items.get(key)
+        if code is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return code
+        self.misses += 1
+        code = compile(source or '', filename, 'exec')
+        self._items[key] = code
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+        return code
+
+
+# 每个工作进程一份
+_code_cache = CodeCache()
+
+
+def _on_sigxcpu(signum, frame):
+    raise CpuTimeExceeded()
+
+
+def _on_sigalrm(signum, frame):
+    raise CaseTimeout()
+
+
+def _plain(value):
+    """把元组等序列统一成列表，便于与 JSON 解析出的期望值比较。"""
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+def _close(a, b) -> bool:
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_close(x, y) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        return math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-9)
+    return a == b
+
+
+def compare(got, expected, mode: str) -> bool:
+    """按比较方式判断结果是否正确。"""
+    if mode == 'float':
+        return _close(_plain(got), expected)
+    if mode == 'unordered':
+        try:
+            return sorted(map(repr, _plain(list(got)))) == sorted(map(repr, expected))
+        except TypeError:
+            return False
+    if mode == 'strip':
+        return str(got).strip() == str(expected).strip()
+    return _plain(got) == expected
+
+
+def run_cases(ns: dict, spec: dict) -> dict:
+    """在已加载学生代码的命名空间上逐个执行结构化用例。"""
+    func = ns.get(spec['func_name'])
+    if not callable(func):
+        return {'ok': False, 'msg': f"运行出错: 未定义函数 {spec['func_name']}", 'cases': []}
+    mode = spec.get('compare_mode') or 'exact'
+    timeout = spec.get('case_timeout') or 0
+    use_alarm = bool(timeout) and hasattr(signal, 'setitimer')
+    results = []
+    first_fail = None
+    for i, (args, expected) in enumerate(spec['cases']):
+        start = time.perf_counter()
+        entry = {'i': i, 'ok': False}
+        try:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            got = func(*args)
+            entry['ok'] = compare(got, expected, mode)
+            if not entry['ok']:
+                entry['got'] = repr(got)[:200]
+                entry['expected'] = repr(expected)[:200]
+        except CaseTimeout:
+            entry['error'] = '超时'
+        except (CpuTimeExceeded, MemoryError, OutputLimitExceeded):
+            raise
+        except Exception as e:
+            entry['error'] = f"{type(e).__name__}: {e}"[:200]
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        entry['ms'] = (time.perf_counter() - start) * 1000.0
+        results.append(entry)
+        if not entry['ok'] and first_fail is None:
+            first_fail = entry
+            if spec.get('stop_on_fail', True):
+                break
+    passed = sum(1 for r in results if r['ok'])
+    if first_fail is None:
+        return {'ok': True, 'msg': f"判题通过（{passed}/{len(spec['cases'])} 个用例）", 'cases': results}
+    if 'error' in first_fail:
+        reason = first_fail['error']
+    else:
+        reason = f"期望 {first_fail['expected']}，得到 {first_fail['got']}"
+    return {'ok': False, 'msg': f"用例 {first_fail['i'] + 1} 未通过: {reason}", 'cases': results}
+
+
+def apply_process_limits(limits: dict) -> None:
+    """在工作进程启动时设置一次性的资源限制。"""
+    if resource is None:
+        return
+    memory_mb = limits.get('memory_mb')
+    if memory_mb:
+        # 在进程当前占用的基础上再允许 memory_mb 兆字节
+        try:
+            with open('/proc/self/statm') as f:
+                vm_pages = int(f.read().split()[0])
+            base = vm_pages * resource.getpagesize()
+        except (OSError, ValueError):
+            base = 0
+        _set_limit(resource.RLIMIT_AS, base + int(memory_mb) * 1024 * 1024)
+    max_output = limits.get('max_output')
+    if max_output:
+        _set_limit(resource.RLIMIT_FSIZE, int(max_output))
+    _set_limit(resource.RLIMIT_CORE, 0)
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, _on_sigalrm)
+
+
+def _set_limit(which, soft) -> None:
+    try:
+        _, hard = resource.getrlimit(which)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(which, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def set_cpu_budget(cpu_seconds) -> None:
+    """RLIMIT_CPU 按进程累计计算，所以每个任务前把软上限设为"已用 + 预算"。"""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    _set_limit(resource.RLIMIT_CPU, int(math.ceil(used + cpu_seconds)))
+
+
+class _CappedOutput:
+    """收集 print 输出，超过 max_output 字节即中止。"""
+
+    def __init__(self, max_output: int):
+        self.max_output = max_output
+        self.parts = []
+        self.size = 0
+
+    def print(self, *args, sep=' ', end='\n', **kwargs):
+        text = sep.join(str(a) for a in args) + end
+        self.size += len(text.encode('utf-8', errors='replace'))
+        if self.max_output and self.size > self.max_output:
+            raise OutputLimitExceeded()
+        self.parts.append(text)
+
+    def getvalue(self) -> str:
+        return ''.join(self.parts)
+
+
+def build_builtins(names, output: _CappedOutput) -> dict:
+    allowed = {}
+    for name in (names if names is not None else DEFAULT_BUILTINS):
+        if hasattr(_builtins, name):
+            allowed[name] = getattr(_builtins, name)
+    if 'print' in allowed:
+        allowed['print'] = output.print
+    return allowed
+
+
+def _format_user_traceback(e: BaseException) -> str:
+    """只保留学生代码与判题模板中的栈帧，不暴露服务器端路径。"""
+    frames = [f for f in traceback.extract_tb(e.__traceback__) if f.filename in ('<submission>', '<judge>')]
+    return ''.join(traceback.format_list(frames)) + ''.join(traceback.format_exception_only(type(e), e))
+
+
+def run_job(job: dict, limits: dict) -> dict:
+    """执行一个判题任务并返回响应字典。"""
+    output = _CappedOutput(limits.get('max_output') or 0)
+    ns = {'__builtins__': build_builtins(job.get('builtins'), output), '__name__': '__judge__'}
+    recycle = False
+    cases = None
+    start = time.perf_counter()
+    try:
+        set_cpu_budget(job.get('cpu_seconds') or limits.get('cpu_seconds'))
+        # 先执行学生代码得到命名空间，再在同一命名空间上执行（已缓存的）判题模板或结构化用例
+        user_code = _code_cache.compile(job.get('user_code') or '', '<submission>')
+        spec = job.get('spec')
+        if spec:
+            exec(user_code, ns)
+            res = run_cases(ns, spec)
+            ok, msg, cases = res['ok'], res['msg'], res['cases']
+        else:
+            judge_code = _code_cache.compile(job.get('judge_code') or '', '<judge>', job.get('judge_hash'))
+            exec(user_code, ns)
+            exec(judge_code, ns)
+            ok, msg = True, "判题通过"
+    except AssertionError as ae:
+        ok, msg = False, f"断言失败: {ae}"
+    except CpuTimeExceeded:
+        ok, msg, recycle = False, "运行超时: CPU 时间超过限制", True
+    except MemoryError:
+        ok, msg, recycle = False, "运行出错: 内存超过限制", True
+    except OutputLimitExceeded:
+        ok, msg = False, "运行出错: 输出超过限制"
+    except Exception as e:
+        ok, msg = False, f"运行出错: {e}\n{_format_user_traceback(e)}"
+    ms = (time.perf_counter() - start) * 1000.0
+    # 资源耗尽类结果与机器负载有关，不允许被缓存
+    result = {'id': job.get('id'), 'ok': ok, 'msg': msg, 'ms': ms,
+              'output': output.getvalue(), 'recycle': recycle, 'cacheable': not recycle}
+    if cases is not None:
+        result['cases'] = cases
+    return result
+
+
+def worker_main(conn, limits: dict) -> None:
+    """工作进程入口：循环处理父进程发来的任务，收到 None 或管道关闭时退出。"""
+    global _code_cache
+    _code_cache = CodeCache(limits.get('code_cache_size') or 256)
+    apply_process_limits(limits)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        try:
+            result = run_job(job, limits)
+        except BaseException as e:  # 兜底：保证父进程总能收到响应
+            result = {'id': job.get('id'), 'ok': False, 'msg': f"运行出错: {e!r}",
+                      'ms': 0.0, 'output': '', 'recycle': True}
+        try:
+            conn.send(result)
+        except (OSError, ValueError):
+            break
+        if result.get('recycle'):
+            break
@@ -0,0 +1,114 @@
+# app/services/leaderboard_service.py
+"""
+LeaderboardService
+------------------
+排行榜物化表 user_stats 的维护与读取：
+- 每写入一条考试记录，调用 record() 在同一事务中对该用户做一次 UPSERT（次数、总分、最高分、平均分、最近考试时间）；
+- 重评等批量修改后，用 refresh_users() 按考试记录重新汇总受影响的用户；
+- rebuild() 从 exam_records 全量重建（回填历史数据）；表为空而已有考试记录时，首次读写会自动回填一次；
+- top() 按 (avg_score DESC, user_id) 索引读取前 N 名，耗时只与 N 有关。
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .. import db
+from ..models import ExamRecord, User, UserStats
+from .backfill_guard import BackfillGuard
+
+_COLUMNS = ['user_id', 'attempts', 'score_sum', 'best_score', 'avg_score', 'last_attempt_at']
+
+
+class LeaderboardService:
+    """排行榜服务。"""
+
+    def __init__(self):
+        self._backfill = BackfillGuard(UserStats.user_id)
+
+    def ensure_built(self, exclude_id: Optional[int] = None) -> None:
+        """每个进程检查一次：user_stats 为空但已有考试记录（升级前的数据库）时自动回填（不含 exclude_id）。"""
+        self._backfill.run(lambda ex: db.session.execute(
+            UserStats.__table__.insert().from_select(_COLUMNS, self._aggregate(exclude_id=ex))), exclude_id)
+
+    def record(self, user_id: Optional[int], score: Optional[float],
+               attempted_at: Optional[datetime.datetime] = None, exclude_id: Optional[int] = None) -> None:
+        """
+        记入一次考试。只执行语句、不提交，由调用方与考试记录一起 commit。
+        exclude_id 为这次考试已 flush 的记录 id，首次回填时不计入（随后由本次 UPSERT 计入）。
+        """
+        if user_id is None:
+            return
+        self.ensure_built(exclude_id)
+        score = float(score or 0.0)
+        attempted_at = attempted_at or datetime.datetime.utcnow()
+        t = UserStats.__table__
+        stmt = sqlite_insert(t).values(user_id=user_id, attempts=1, score_sum=score, best_score=score,
+                                       avg_score=score, last_attempt_at=attempted_at)
+        stmt = stmt.on_conflict_do_update(index_elements=[t.c.user_id], set_={
+            'attempts': t.c.attempts + 1,
+            'score_sum': t.c.score_sum + score,
+            'best_score': func.max(func.coalesce(t.c.best_score, score), score),
+            'avg_score': (t.c.score_sum + score) / (t.c.attempts + 1),
+            'last_attempt_at': func.max(func.coalesce(t.c.last_attempt_at, attempted_at), attempted_at),
+        })
+        db.session.execute(stmt)
+
+    @staticmethod
+    def _aggregate(user_ids: Optional[List[int]] = None, exclude_id: Optional[int] = None):
+        q = select(
+            ExamRecord.user_id,
+            func.count(ExamRecord.id),
+            func.coalesce(func.sum(ExamRecord.score), 0.0),
+            func.max(ExamRecord.score),
+            func.coalesce(func.avg(ExamRecord.score), 0.0),
+            func.max(ExamRecord.created_at),
+        ).where(ExamRecord.user_id.isnot(None)).group_by(ExamRecord.user_id)
+        if user_ids is not None:
+            q = q.where(ExamRecord.user_id.in_(user_ids))
+        if exclude_id is not None:
+            q = q.where(ExamRecord.id != exclude_id)
+        return q
+
+    def refresh_users(self, user_ids: Iterable[int]) -> None:
+        """按考试记录重新汇总指定用户（不提交）。"""
+        user_ids = sorted({u for u in user_ids if u is not None})
+        if not user_ids:
+            return
+        t = UserStats.__table__
+        db.session.execute(t.delete().where(t.c.user_id.in_(user_ids)))
+        db.session.execute(t.insert().from_select(
+            _COLUMNS,
+            self._aggregate(user_ids)))
+
+    def rebuild(self) -> int:
+        """从 exam_records 全量重建 user_stats 并提交，返回用户数。"""
+        t = UserStats.__table__
+        db.session.execute(t.delete())
+        db.session.execute(t.insert().from_select(
+            _COLUMNS,
+            self._aggregate()))
+        db.session.commit()
+        return db.session.query(func.count(UserStats.user_id)).scalar()
+
+    def top(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """返回平均分前 limit 名：[{'user_id', 'username', 'avg_score', 'attempts', 'best_score'}]。"""
+        if not self._backfill.checked:
+            self.ensure_built()
+            db.session.commit()
+        rows = (db.session.query(UserStats.user_id, User.username, UserStats.avg_score,
+                                 UserStats.attempts, UserStats.best_score)
+                .join(User, User.id == UserStats.user_id)
+                .order_by(UserStats.avg_score.desc(), UserStats.user_id)
+                .limit(limit).all())
+        return [{'user_id': uid, 'username': name, 'avg_score': avg, 'attempts': n, 'best_score': best}
+                for uid, name, avg, n, best in rows]
+
+    def get(self, user_id: int) -> Optional[UserStats]:
+        return db.session.get(UserStats, user_id)
+
+
+# module-level instance
+leaderboard_service = LeaderboardService()
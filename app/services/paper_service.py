@@ -0,0 +1,213 @@
+# app/services/paper_service.py
+"""
+PaperService
+------------
+按"组卷蓝图"分层抽题并维护预生成试卷池：
+- 蓝图描述每种题型抽几道、限定哪些难度，例如 "choice:3:1-2,fill:1,code:1:3"
+  表示 3 道难度 1~2 的选择题、1 道任意难度的填空题、1 道难度 3 的编程题；
+- 生成器只在 QuestionIndex 的分桶 id 数组上抽样，不访问题目表；
+- 试卷池由后台线程预先填充，整班同时开考时直接从池中取题，避免瞬时压到 SQLite。
+"""
+
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+import os
+import threading
+
+from .question_index import question_index, QuestionIndex
+
+
+class BlueprintRule:
+    """蓝图中的一条规则：某题型抽 count 道，difficulties 为 None 表示不限难度。"""
+
+    def __init__(self, qtype: str, count: int, difficulties: Optional[Tuple[int, ...]] = None):
+        self.qtype = qtype
+        self.count = count
+        self.difficulties = difficulties
+
+    def __repr__(self) -> str:
+        return f"BlueprintRule({self.qtype!r}, {self.count}, {self.difficulties!r})"
+
+
+class PaperBlueprint:
+    """组卷蓝图：若干 BlueprintRule 的有序列表。"""
+
+    def __init__(self, rules: List[BlueprintRule]):
+        self.rules = rules
+
+    @property
+    def size(self) -> int:
+        return sum(r.count for r in self.rules)
+
+    @classmethod
+    def parse(cls, spec: str) -> 'PaperBlueprint':
+        """
+        解析字符串形式的蓝图："qtype:count[:难度]"，多条规则用逗号分隔；
+        难度可以写成单个值 "3"、区间 "1-2" 或列表 "1|3"。
+        """
+        rules = []
+        for part in (spec or '').split(','):
+            part = part.strip()
+            if not part:
+                continue
+            fields = [f.strip() for f in part.split(':')]
+            if len(fields) < 2 or len(fields) > 3:
+                raise ValueError(f"无法解析的蓝图规则: {part}")
+            qtype = fields[0]
+            count = int(fields[1])
+            difficulties = None
+            if len(fields) == 3 and fields[2]:
+                difficulties = cls._parse_difficulties(fields[2])
+            rules.append(BlueprintRule(qtype, count, difficulties))
+        if not rules:
+            raise ValueError("蓝图为空")
+        return cls(rules)
+
+    @staticmethod
+    def _parse_difficulties(text: str) -> Tuple[int, ...]:
+        if '-' in text:
+            lo, hi = text.split('-', 1)
+            return tuple(range(int(lo), int(hi) + 1))
+        return tuple(int(v) for v in text.split('|'))
+
+    def to_spec(self) -> str:
+        parts = []
+        for r in self.rules:
+            if r.difficulties:
+                parts.append(f"{r.qtype}:{r.count}:{'|'.join(str(d) for d in r.difficulties)}")
+            else:
+                parts.append(f"{r.qtype}:{r.count}")
+        return ','.join(parts)
+
+
+class PaperGenerator:
+    """在分桶 id 索引上按蓝图分层抽样，耗时只与试卷大小有关。"""
+
+    def __init__(self, index: QuestionIndex):
+        self.index = index
+
+    def generate(self, blueprint: PaperBlueprint, top_up: bool = True) -> List[int]:
+        """
+        按蓝图生成一张试卷，返回题目 id 列表（按规则顺序排列）。
+        某一桶题目不足时尽量多取；top_up 为 True 时从整个题库补足到蓝图总量。
+        """
+        chosen: List[int] = []
+        for rule in blueprint.rules:
+            chosen.extend(self.index.sample_ids(rule.count, qtypes=[rule.qtype],
+                                                difficulties=rule.difficulties, exclude=chosen))
+        if top_up and len(chosen) < blueprint.size:
+            chosen.extend(self.index.sample_ids(blueprint.size - len(chosen), exclude=chosen))
+        return chosen
+
+
+class PaperPool:
+    """
+    某个蓝图的预生成试卷池。
+    池中每张试卷记录生成时的题库版本，题库变化后旧试卷会被丢弃。
+    """
+
+    def __init__(self, generator: PaperGenerator, blueprint: PaperBlueprint,
+                 capacity: int = 50, low_water: int = 10):
+        self.generator = generator
+        self.blueprint = blueprint
+        self.capacity = capacity
+        self.low_water = low_water
+        self._papers = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._app = None
+
+    def __len__(self) -> int:
+        return len(self._papers)
+
+    def take(self) -> List[int]:
+        """取出一张试卷的题目 id；池为空时直接现场生成。"""
+        version = self.generator.index.version
+        ids = None
+        with self._lock:
+            while self._papers:
+                paper_version, paper_ids = self._papers.popleft()
+                if paper_version == version:
+                    ids = paper_ids
+                    break
+            remaining = len(self._papers)
+        if remaining < self.low_water:
+            self._wakeup.set()
+        if ids is None:
+            ids = self.generator.generate(self.blueprint)
+        return ids
+
+    def fill(self) -> int:
+        """把池补满到 capacity，返回新生成的试卷数量。"""
+        version = self.generator.index.version
+        with self._lock:
+            # 丢弃题库变化前生成的试卷
+            self._papers = deque(p for p in self._papers if p[0] == version)
+            missing = self.capacity - len(self._papers)
+        added = 0
+        for _ in range(max(0, missing)):
+            ids = self.generator.generate(self.blueprint)
+            if not ids:
+                break
+            with self._lock:
+                self._papers.append((version, ids))
+            added += 1
+        return added
+
+    def start(self, app) -> None:
+        """启动后台填充线程（每个进程一个；fork 之后会在子进程中重新启动）。"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._app = app
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='paper-pool-filler', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                with self._app.app_context():
+                    self.fill()
+            except Exception:
+                # 填充失败不影响在线抽题，下次唤醒时重试
+                pass
+            self._wakeup.wait(timeout=30)
+            self._wakeup.clear()
+
+
+class PaperService:
+    """组卷服务：管理各蓝图对应的试卷池。"""
+
+    def __init__(self, index: QuestionIndex = question_index):
+        self.generator = PaperGenerator(index)
+        self.pools: Dict[str, PaperPool] = {}
+        self._lock = threading.Lock()
+
+    def generate(self, blueprint) -> List[int]:
+        """现场按蓝图生成一张试卷（不经过试卷池）。"""
+        if isinstance(blueprint, str):
+            blueprint = PaperBlueprint.parse(blueprint)
+        return self.generator.generate(blueprint)
+
+    def get_pool(self, spec: str, capacity: int = 50, low_water: int = 10) -> PaperPool:
+        pool = self.pools.get(spec)
+        if pool is None:
+            with self._lock:
+                pool = self.pools.get(spec)
+                if pool is None:
+                    pool = PaperPool(self.generator, PaperBlueprint.parse(spec), capacity, low_water)
+                    self.pools[spec] = pool
+        return pool
+
+    def take(self, spec: str, app=None, capacity: int = 50, low_water: int = 10) -> List[int]:
+        """从试卷池取一张试卷；传入 app 时确保后台填充线程已启动。"""
+        pool = self.get_pool(spec, capacity, low_water)
+        if app is not None:
+            pool.start(app)
+        return pool.take()
+
+
+# module-level instance
+paper_service = PaperService()
@@ -0,0 +1,147 @@
+# app/services/principal_service.py
+"""
+PrincipalService
+----------------
+登录用户（principal）的权限校验，常规请求不访问数据库：
+- 登录时把 is_admin、用户的 auth_version 以及当前的全局权限纪元写入签名 session；
+- 每个请求只比较 session 中的纪元与当前纪元（SharedEpoch 文件，读 8 个字节），一致就直接信任 session 中的角色；
+- 纪元变化（revoke() 提交后，或手工改库后执行 `python maintenance.py revoke-sessions`）时，各会话在下一次请求时重新校验：
+  从进程内 LRU（纪元变化时清空）或数据库取出用户，auth_version 不一致或用户已删除则注销会话，否则刷新 session 中的角色；
+- 修改密码、角色或删除账号时调用 revoke(user_id)：auth_version 加一，提交后推进纪元，该用户已有的会话全部失效。
+"""
+
+from typing import NamedTuple, Optional
+from collections import OrderedDict
+import threading
+
+from flask import current_app, has_app_context, session
+from sqlalchemy import event, update
+
+from .. import db
+from ..models import User
+from .shared_epoch import SharedEpoch
+
+
+class Principal(NamedTuple):
+    user_id: int
+    username: Optional[str]
+    is_admin: bool
+    auth_version: int
+
+
+class PrincipalService:
+    """基于 session 的权限校验与用户 principal 的 LRU 缓存。"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[int, Principal]' = OrderedDict()
+        self._shared = SharedEpoch('auth')
+        self._local_epoch = 0  # 不能共享纪元文件时（如内存数据库）只在本进程内生效
+        self._cached_epoch = None
+        self._listening = False
+
+    # -----------------------------
+    # 纪元
+    # -----------------------------
+    def epoch(self) -> list:
+        token = self._shared.token()
+        return [self._local_epoch] if token is None else list(token)
+
+    def bump_epoch(self) -> None:
+        """使所有会话在下一次请求时重新校验。"""
+        with self._lock:
+            self._local_epoch += 1
+            self._entries.clear()
+        self._shared.bump()
+
+    # -----------------------------
+    # LRU
+    # -----------------------------
+    def _max_entries(self) -> int:
+        if has_app_context():
+            return current_app.config.get('PRINCIPAL_CACHE_SIZE', self.max_entries)
+        return self.max_entries
+
+    def get(self, user_id: int, epoch: Optional[list] = None) -> Optional[Principal]:
+        """返回用户的 principal（纪元未变时来自 LRU），用户不存在时返回 None。"""
+        epoch = epoch if epoch is not None else self.epoch()
+        with self._lock:
+            if epoch != self._cached_epoch:
+                self._entries.clear()
+                self._cached_epoch = epoch
+            p = self._entries.get(user_id)
+            if p is not None:
+                self._entries.move_to_end(user_id)
+                return p
+        row = (db.session.query(User.id, User.username, User.is_admin, User.auth_version)
+               .filter(User.id == user_id).first())
+        if row is None:
+            return None
+        p = Principal(row[0], row[1], bool(row[2]), row[3] or 0)
+        with self._lock:
+            if epoch == self._cached_epoch:
+                self._entries[user_id] = p
+                while len(self._entries) > self._max_entries():
+                    self._entries.popitem(last=False)
+        return p
+
+    # -----------------------------
+    # 会话
+    # -----------------------------
+    def login(self, user: User) -> None:
+        """登录成功后写入 session。"""
+        session['user_id'] = user.id
+        session['is_admin'] = bool(user.is_admin)
+        session['auth_version'] = user.auth_version or 0
+        session['auth_epoch'] = self.epoch()
+
+    def current(self) -> Optional[Principal]:
+        """当前请求的登录用户；未登录或会话已被注销时返回 None。纪元未变时不访问数据库。"""
+        uid = session.get('user_id')
+        if not uid:
+            return None
+        epoch = self.epoch()
+        if session.get('auth_epoch') == epoch and 'is_admin' in session:
+            return Principal(uid, None, bool(session['is_admin']), session.get('auth_version', 0))
+        p = self.get(uid, epoch)
+        # 旧版本登录的会话没有 auth_version，按当前版本接受
+        if p is None or p.auth_version != session.get('auth_version', p.auth_version):
+            session.clear()
+            return None
+        session['is_admin'] = p.is_admin
+        session['auth_version'] = p.auth_version
+        session['auth_epoch'] = epoch
+        return p
+
+    # -----------------------------
+    # 注销
+    # -----------------------------
+    def _ensure_listeners(self) -> None:
+        if self._listening:
+            return
+        with self._lock:
+            if self._listening:
+                return
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+            self._listening = True
+
+    def _after_commit(self, session_) -> None:
+        if session_.info.pop('principal_revoked', False):
+            self.bump_epoch()
+
+    @staticmethod
+    def _after_rollback(session_) -> None:
+        session_.info.pop('principal_revoked', None)
+
+    def revoke(self, user_id: int) -> None:
+        """使 user_id 的已有会话全部失效（修改密码、角色或删除账号时调用；不提交，提交成功后推进纪元）。"""
+        self._ensure_listeners()
+        t = User.__table__
+        db.session.execute(update(t).where(t.c.id == user_id).values(auth_version=t.c.auth_version + 1))
+        db.session.info['principal_revoked'] = True
+
+
+# module-level instance
+principal_service = PrincipalService()
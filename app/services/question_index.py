@@ -0,0 +1,143 @@
+# app/services/question_index.py
+"""
+QuestionIndex
+-------------
+题库抽样索引：按 (qtype, difficulty) 分桶保存紧凑的整数 id 数组，
+抽题时只在 id 数组上随机取样，再按选中的 id 加载对应的 Question。
+题库发生变化（增删改、导入）时调用 bump() 让版本号加一，索引在下次使用时惰性重建，
+同时使依赖题库的分析缓存（标签 questions）过期。
+多进程部署时 bump() 还会推进共享的文件计数（SharedEpoch），其它进程读取版本号时发现计数变化，同样使索引与缓存过期。
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from array import array
+import bisect
+import random
+import threading
+
+from .. import db
+from ..models import Question
+from .shared_epoch import SharedEpoch
+
+
+class QuestionIndex:
+    """题目 id 分桶索引，抽样代价只与抽取数量有关，与题库大小无关。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 题库版本号：每次题库变化时加一
+        self._version = 0
+        self._built_version = -1
+        self._buckets: Dict[Tuple[str, int], array] = {}
+        self._shared = SharedEpoch('questions')
+        self._shared_token = None
+
+    @property
+    def version(self) -> int:
+        """题库版本号（其它进程修改了题库时同样会增加）。"""
+        token = self._shared.token()
+        if token is not None and token != self._shared_token:
+            from .cache_service import result_cache
+            with self._lock:
+                if token != self._shared_token:
+                    self._shared_token = token
+                    self._version += 1
+                    result_cache.invalidate('questions')
+        return self._version
+
+    def bump(self) -> int:
+        """题库已变化：增加版本号，索引将在下次使用时重建。"""
+        from .cache_service import result_cache
+        result_cache.invalidate('questions')
+        self._shared.bump()
+        with self._lock:
+            self._version += 1
+            self._shared_token = self._shared.token()
+            return self._version
+
+    def _ensure_built(self) -> None:
+        version = self.version
+        if self._built_version == version:
+            return
+        with self._lock:
+            version = self._version
+            if self._built_version == version:
+                return
+            buckets: Dict[Tuple[str, int], array] = {}
+            rows = db.session.query(Question.id, Question.qtype, Question.difficulty).order_by(Question.id.asc())
+            for qid, qtype, difficulty in rows:
+                key = (qtype, int(difficulty or 1))
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = array('q')
+                bucket.append(qid)
+            self._buckets = buckets
+            self._built_version = version
+
+    def bucket_sizes(self) -> Dict[Tuple[str, int], int]:
+        """返回每个 (qtype, difficulty) 桶中的题目数量。"""
+        self._ensure_built()
+        return {k: len(v) for k, v in self._buckets.items()}
+
+    def _select_buckets(self, qtypes: Optional[Iterable[str]] = None,
+                        difficulties: Optional[Iterable[int]] = None) -> List[array]:
+        self._ensure_built()
+        qtypes = set(qtypes) if qtypes else None
+        difficulties = set(difficulties) if difficulties else None
+        selected = []
+        for (qtype, difficulty), bucket in sorted(self._buckets.items()):
+            if qtypes is not None and qtype not in qtypes:
+                continue
+            if difficulties is not None and difficulty not in difficulties:
+                continue
+            if bucket:
+                selected.append(bucket)
+        return selected
+
+    def sample_ids(self, n: int,
+                   qtypes: Optional[Iterable[str]] = None,
+                   difficulties: Optional[Iterable[int]] = None,
+                   exclude: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        从符合条件的桶中无放回随机抽取至多 n 个题目 id（顺序随机）。
+        exclude 中的 id 不会被选中。
+        """
+        buckets = self._select_buckets(qtypes, difficulties)
+        exclude = set(exclude) if exclude else set()
+        # 各桶在"拼接后的虚拟数组"中的起始偏移
+        offsets = []
+        total = 0
+        for bucket in buckets:
+            offsets.append(total)
+            total += len(bucket)
+        if n <= 0 or total == 0:
+            return []
+        # 多抽 len(exclude) 个，过滤掉被排除的 id 后仍足够 n 个
+        k = min(total, n + len(exclude))
+        picked = []
+        for pos in random.sample(range(total), k):
+            i = bisect.bisect_right(offsets, pos) - 1
+            qid = buckets[i][pos - offsets[i]]
+            if qid in exclude:
+                continue
+            picked.append(qid)
+            if len(picked) >= n:
+                break
+        return picked
+
+    def hydrate(self, ids: List[int]) -> List[Question]:
+        """按 id 列表批量加载题目（单条 IN 查询），保持传入顺序，跳过已删除的题目。"""
+        if not ids:
+            return []
+        by_id = {q.id: q for q in Question.query.filter(Question.id.in_(ids)).all()}
+        return [by_id[qid] for qid in ids if qid in by_id]
+
+    def sample_questions(self, n: int,
+                         qtypes: Optional[Iterable[str]] = None,
+                         difficulties: Optional[Iterable[int]] = None) -> List[Question]:
+        """抽取 n 道题并只加载被选中的行。"""
+        return self.hydrate(self.sample_ids(n, qtypes, difficulties))
+
+
+# module-level instance
+question_index = QuestionIndex()
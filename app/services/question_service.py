@@ -7,8 +7,10 @@ QuestionService
 """
 
 from typing import List, Dict, Any, Optional
-from ..models import Question
+from ..models import Question, QuestionTestSpec
 from .. import db
+from .question_index import question_index
+from .verdict_cache import verdict_cache
 import csv
 import io
 import random
@@ -52,6 +54,7 @@ class QuestionService:
         )
         db.session.add(q)
         db.session.commit()
+        question_index.bump()
         return q
 
     def get_question(self, qid: int) -> Optional[Question]:
@@ -72,6 +75,8 @@ class QuestionService:
             if hasattr(q, k):
                 setattr(q, k, v)
         db.session.commit()
+        question_index.bump()
+        verdict_cache.invalidate_question(qid)
         return q
 
     def delete_question(self, qid: int) -> bool:
@@ -81,6 +86,8 @@ class QuestionService:
             return False
         db.session.delete(q)
         db.session.commit()
+        question_index.bump()
+        verdict_cache.invalidate_question(qid)
         return True
 
     # -----------------------------
@@ -112,6 +119,7 @@ class QuestionService:
             db.session.add(q)
             count += 1
         db.session.commit()
+        question_index.bump()
         return count
 
     def import_from_csv_bytes(self, data_bytes: bytes, encoding: str = 'utf-8') -> int:
@@ -157,13 +165,8 @@ class QuestionService:
         """随机抽取 n 道题，若指定 qtypes 列表则优先从这些类型中抽取。"""
         if qtypes is None or len(qtypes) == 0:
             qtypes = self.supported_types
-        all_qs = Question.query.filter(Question.qtype.in_(qtypes)).all()
-        if not all_qs:
-            return []
-        if n >= len(all_qs):
-            random.shuffle(all_qs)
-            return all_qs
-        return random.sample(all_qs, n)
+        # 在 id 索引上抽样，只加载被选中的题目
+        return question_index.sample_questions(n, qtypes=qtypes)
 
     # -----------------------------
     # 题目格式转换（用于前端与导出）
@@ -263,8 +266,14 @@ class QuestionService:
             difficulty=q.difficulty,
             judge_template=q.judge_template
         )
+        if q.test_spec is not None:
+            spec = q.test_spec
+            new_q.test_spec = QuestionTestSpec(func_name=spec.func_name, cases=spec.cases,
+                                               compare_mode=spec.compare_mode, case_timeout=spec.case_timeout,
+                                               stop_on_fail=spec.stop_on_fail)
         db.session.add(new_q)
         db.session.commit()
+        question_index.bump()
         return new_q
 
 # create a module-level instance for convenience (optional)
@@ -0,0 +1,246 @@
+# app/services/regrade_service.py
+"""
+RegradeService
+--------------
+批量重评历史考试记录：答案或判题模板修正后，重新计算 ExamRecord.score / details。
+- 按记录 id 递增分批读取（每批一条带 LIMIT 的查询，内存占用与总记录数无关）；
+- 选择/填空题分块交给进程池评分，编程题交给判题进程池（判题结果缓存会去重相同代码）；
+- 每批的结果与检查点在同一个事务中写回，中断后按检查点从 last_id 之后继续；
+- 可按题目 id 和日期范围筛选，只重评受影响的记录、只改动受影响的题目；
+- 分数有变化的用户与日期，其排行榜汇总（user_stats）和每日汇总在同一事务中重新计算，
+  被修改记录的逐题作答（exam_answers）同时重新生成，项目分析累计量在同一事务中清空
+  （重新生成的逐题行位于水位线之后，不清空会在页面刷新时被重复累加），下次访问时全量重算；
+  分位数摘要无法删除旧值，有记录被修改时在全部批次完成后整体重建。
+旧记录的编程题明细中没有保存学生代码（got），这类题目保持原结果不变。
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import or_, update
+
+from .. import db
+from ..models import ExamRecord, RegradeCheckpoint
+from .grading_service import grading_service, item_score, parse_details, AnswerKey
+from .judge_service import _mp_context
+from .leaderboard_service import leaderboard_service
+from .rollup_service import rollup_service
+from .sketch_service import sketch_service
+from .answer_service import answer_service
+from .item_analysis_service import item_analysis_service
+from .exam_snapshot import bump_epoch
+from .cache_service import result_cache
+
+
+def summarize(details: List[Dict[str, Any]]) -> Tuple[float, float]:
+    """由明细重新计算 (score, total)，规则与 GradingService 一致（旧格式明细的得分按 ok 折算）。"""
+    score = sum(item_score(d) for d in details)
+    total = float(sum(1 for d in details if 'type' in d))
+    return score, total
+
+
+def _grade_plain_chunk(chunk: List[Tuple[int, int, int, Any]], keys: Dict[int, AnswerKey]) -> List[Tuple[int, int, Dict[str, Any]]]:
+    """进程池任务：评一组选择/填空题，返回 (记录 id, 明细下标, 新明细)。"""
+    return [(rec_id, slot, grading_service.grade_item(keys[qid], got)) for rec_id, slot, qid, got in chunk]
+
+
+class RegradeService:
+    """批量重评历史考试记录。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running: Optional[str] = None
+
+    @staticmethod
+    def _config() -> Dict[str, Any]:
+        return current_app.config if has_app_context() else {}
+
+    @staticmethod
+    def checkpoint_name(qids: Optional[Iterable[int]], since: Optional[datetime.datetime],
+                        until: Optional[datetime.datetime]) -> Tuple[str, str]:
+        """由筛选条件生成 (任务名, 筛选条件 JSON)，相同条件的任务共用一个检查点。"""
+        filters = json.dumps({
+            'qids': sorted(set(qids)) if qids else None,
+            'since': since.isoformat() if since else None,
+            'until': until.isoformat() if until else None,
+        }, sort_keys=True)
+        return 'regrade-' + hashlib.sha1(filters.encode('utf-8')).hexdigest()[:12], filters
+
+    def _load_checkpoint(self, name: str, filters: str, restart: bool) -> RegradeCheckpoint:
+        cp = db.session.get(RegradeCheckpoint, name)
+        now = datetime.datetime.utcnow()
+        if cp is None:
+            cp = RegradeCheckpoint(name=name, filters=filters)
+            db.session.add(cp)
+        if cp.last_id is None or restart or cp.finished_at is not None:
+            # 新任务、强制重来，或上次已完成（说明答案又改了）：从头开始
+            cp.last_id, cp.processed, cp.changed = 0, 0, 0
+            cp.started_at, cp.finished_at = now, None
+        cp.updated_at = now
+        db.session.commit()
+        return cp
+
+    @staticmethod
+    def _batch_query(last_id: int, batch_size: int, qids: Optional[List[int]],
+                     since: Optional[datetime.datetime], until: Optional[datetime.datetime]):
+        q = db.session.query(ExamRecord.id, ExamRecord.details, ExamRecord.user_id, ExamRecord.created_at)
+        q = q.filter(ExamRecord.id > last_id)
+        if since is not None:
+            q = q.filter(ExamRecord.created_at >= since)
+        if until is not None:
+            q = q.filter(ExamRecord.created_at < until)
+        if qids:
+            # 粗筛：两种明细格式中 qid 后面都紧跟 ", "，精确判断在解析之后
+            q = q.filter(or_(*[ExamRecord.details.like(f'%qid_: {qid},%') for qid in qids]))
+        return q.order_by(ExamRecord.id).limit(batch_size).all()
+
+    def regrade_batch(self, rows: List[Tuple[int, Optional[str], Optional[int], Optional[datetime.datetime]]], only: Optional[set] = None,
+                      executor: Optional[ProcessPoolExecutor] = None, workers: int = 1) -> List[Dict[str, Any]]:
+        """
+        重评一批记录，返回需要写回的 [{'id', 'score', 'total', 'details'}]（结果未变化的记录不返回）。
+        only 为题目 id 集合时只重评这些题目。
+        """
+        parsed: Dict[int, List[Dict[str, Any]]] = {}
+        wanted = set()
+        for rec_id, text, _, _ in rows:
+            details = parse_details(text)
+            if details is None:
+                continue
+            parsed[rec_id] = details
+            for d in details:
+                qid = grading_service.parse_qid(d.get('qid'))
+                if qid is not None and (only is None or qid in only):
+                    wanted.add(qid)
+        keys = grading_service.store.keys_for(wanted)
+        plain: List[Tuple[int, int, int, Any]] = []
+        code: List[Tuple[int, int, AnswerKey, Any]] = []
+        for rec_id, details in parsed.items():
+            for slot, d in enumerate(details):
+                qid = grading_service.parse_qid(d.get('qid'))
+                key = keys.get(qid)
+                if key is None or 'got' not in d:
+                    continue  # 题目已删除或旧记录没有保存作答，保持原样
+                if key.qtype == 'code':
+                    code.append((rec_id, slot, key, d['got']))
+                else:
+                    plain.append((rec_id, slot, qid, d['got']))
+
+        # 编程题先派发出去，等待期间评选择/填空题
+        pending = grading_service.dispatch_code_items([(key, got) for _, _, key, got in code])
+        new_items: List[Tuple[int, int, Dict[str, Any]]] = []
+        if executor is not None and len(plain) > 1:
+            size = -(-len(plain) // max(1, workers))
+            plain_keys = {qid: keys[qid] for _, _, qid, _ in plain}
+            futures = [executor.submit(_grade_plain_chunk, plain[i:i + size], plain_keys)
+                       for i in range(0, len(plain), size)]
+            for fut in futures:
+                new_items.extend(fut.result())
+        else:
+            new_items.extend(_grade_plain_chunk(plain, keys))
+        for (rec_id, slot, _, _), item in zip(code, grading_service.collect_code_items(pending)):
+            new_items.append((rec_id, slot, item))
+
+        touched = set()
+        for rec_id, slot, item in new_items:
+            old = parsed[rec_id][slot]
+            if item_score(old) != item_score(item) or \
+                    (item.get('type') == 'code' and old.get('msg') != item.get('msg')):
+                parsed[rec_id][slot] = item
+                touched.add(rec_id)
+        out = []
+        for rec_id in sorted(touched):
+            details = parsed[rec_id]
+            score, total = summarize(details)
+            out.append({'id': rec_id, 'score': score, 'total': total,
+                        'details': json.dumps(details, ensure_ascii=False)})
+        return out
+
+    def run(self, qids: Optional[Iterable[int]] = None, since: Optional[datetime.datetime] = None,
+            until: Optional[datetime.datetime] = None, batch_size: Optional[int] = None,
+            workers: Optional[int] = None, name: Optional[str] = None, restart: bool = False,
+            progress: Optional[Callable[[RegradeCheckpoint], None]] = None) -> RegradeCheckpoint:
+        """
+        重评符合条件的记录（需在应用上下文中调用），返回最终的检查点。
+        qids：只重评包含这些题目的记录，且只改动这些题目；since/until：按 created_at 筛选（until 不含）。
+        同名任务未完成时从检查点继续，restart=True 时从头开始。
+        """
+        cfg = self._config()
+        batch_size = batch_size or cfg.get('REGRADE_BATCH_SIZE', 500)
+        workers = workers if workers is not None else cfg.get('REGRADE_WORKERS', 0)
+        workers = workers or os.cpu_count() or 1
+        only = set(qids) if qids else None
+        auto_name, filters = self.checkpoint_name(only, since, until)
+        name = name or auto_name
+        with self._lock:
+            if self._running is not None:
+                raise RuntimeError(f"已有重评任务在运行: {self._running}")
+            self._running = name
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) if workers > 1 else None
+        try:
+            cp = self._load_checkpoint(name, filters, restart)
+            qid_list = sorted(only) if only else None
+            while True:
+                rows = self._batch_query(cp.last_id, batch_size, qid_list, since, until)
+                if not rows:
+                    break
+                changes = self.regrade_batch(rows, only, executor, workers)
+                if changes:
+                    db.session.execute(update(ExamRecord), changes)
+                    meta = {rec_id: (uid, created_at) for rec_id, _, uid, created_at in rows}
+                    leaderboard_service.refresh_users(meta[c['id']][0] for c in changes)
+                    rollup_service.refresh_days(meta[c['id']][1].date() for c in changes if meta[c['id']][1])
+                    answer_service.replace({c['id']: json.loads(c['details']) for c in changes})
+                    item_analysis_service.reset()
+                    bump_epoch()  # 分析快照需要重新加载被修改的分数
+                    result_cache.invalidate_on_commit('exams')
+                # 结果与检查点在同一事务中提交
+                cp.last_id = rows[-1][0]
+                cp.processed += len(rows)
+                cp.changed += len(changes)
+                cp.updated_at = datetime.datetime.utcnow()
+                db.session.commit()
+                if progress is not None:
+                    progress(cp)
+            cp.finished_at = datetime.datetime.utcnow()
+            db.session.commit()
+            if cp.changed:
+                sketch_service.rebuild()
+                db.session.commit()
+            return cp
+        except BaseException:
+            db.session.rollback()
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            with self._lock:
+                self._running = None
+
+    def start_background(self, app, **kwargs) -> threading.Thread:
+        """在后台线程中运行 run()（管理后台使用），进度写在检查点表中。"""
+        def target():
+            with app.app_context():
+                try:
+                    self.run(**kwargs)
+                except Exception:
+                    app.logger.exception('批量重评失败')
+        t = threading.Thread(target=target, name='regrade', daemon=True)
+        t.start()
+        return t
+
+    @property
+    def running(self) -> Optional[str]:
+        return self._running
+
+    def checkpoints(self, limit: int = 20) -> List[RegradeCheckpoint]:
+        return RegradeCheckpoint.query.order_by(RegradeCheckpoint.updated_at.desc()).limit(limit).all()
+
+
+# module-level instance
+regrade_service = RegradeService()
@@ -0,0 +1,145 @@
+# app/services/rollup_service.py
+"""
+RollupService
+-------------
+按天汇总考试数据（daily_exam_rollup 表），供成绩趋势图使用：
+- 每写入一条考试记录，record() 在同一事务中对当天做一次 UPSERT（场次、总分、总用时、及格场次）；
+- 重评后用 refresh_days() 按考试记录重新汇总受影响的日期，rebuild() 全量重建；
+- trend() 一次按主键范围读取 N 天的汇总行，再在内存中合并成按周/按月的序列。
+日期按 UTC 计算，与 ExamRecord.created_at 一致。
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import datetime
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .. import db
+from ..models import DailyExamRollup, ExamRecord
+from .backfill_guard import BackfillGuard
+
+# 单次考试得分率达到该比例计为及格（与 AnalyticsService 的默认值一致）
+PASS_RATIO = 0.6
+
+_COLUMNS = ['day', 'exam_count', 'score_sum', 'duration_sum', 'pass_count']
+
+
+def is_pass(score: Optional[float], total: Optional[float], pass_ratio: float = PASS_RATIO) -> bool:
+    return bool(total) and (score or 0.0) / total >= pass_ratio
+
+
+class RollupService:
+    """每日考试汇总服务。"""
+
+    def __init__(self):
+        self._backfill = BackfillGuard(DailyExamRollup.day)
+
+    def ensure_built(self, exclude_id: Optional[int] = None) -> None:
+        """每个进程检查一次：汇总表为空但已有考试记录（升级前的数据库）时自动回填（不含 exclude_id）。"""
+        self._backfill.run(lambda ex: db.session.execute(
+            DailyExamRollup.__table__.insert().from_select(_COLUMNS, self._aggregate(exclude_id=ex))), exclude_id)
+
+    def record(self, created_at: Optional[datetime.datetime], score: Optional[float],
+               total: Optional[float], duration_seconds: Optional[int], exclude_id: Optional[int] = None) -> None:
+        """
+        记入一次考试。只执行语句、不提交，由调用方与考试记录一起 commit。
+        exclude_id 为这次考试已 flush 的记录 id，首次回填时不计入。
+        """
+        self.ensure_built(exclude_id)
+        day = (created_at or datetime.datetime.utcnow()).date()
+        score = float(score or 0.0)
+        duration = int(duration_seconds or 0)
+        passed = 1 if is_pass(score, total) else 0
+        t = DailyExamRollup.__table__
+        stmt = sqlite_insert(t).values(day=day, exam_count=1, score_sum=score,
+                                       duration_sum=duration, pass_count=passed)
+        stmt = stmt.on_conflict_do_update(index_elements=[t.c.day], set_={
+            'exam_count': t.c.exam_count + 1,
+            'score_sum': t.c.score_sum + score,
+            'duration_sum': t.c.duration_sum + duration,
+            'pass_count': t.c.pass_count + passed,
+        })
+        db.session.execute(stmt)
+
+    @staticmethod
+    def _aggregate(days: Optional[List[datetime.date]] = None, exclude_id: Optional[int] = None):
+        day = func.date(ExamRecord.created_at)
+        passed = case((and_(ExamRecord.total > 0,
+                            ExamRecord.score * 1.0 / ExamRecord.total >= PASS_RATIO), 1), else_=0)
+        q = select(
+            day,
+            func.count(ExamRecord.id),
+            func.coalesce(func.sum(ExamRecord.score), 0.0),
+            func.coalesce(func.sum(ExamRecord.duration_seconds), 0),
+            func.sum(passed),
+        ).where(ExamRecord.created_at.isnot(None)).group_by(day)
+        if days is not None:
+            q = q.where(day.in_([d.isoformat() for d in days]))
+        if exclude_id is not None:
+            q = q.where(ExamRecord.id != exclude_id)
+        return q
+
+    def refresh_days(self, days: Iterable[datetime.date]) -> None:
+        """按考试记录重新汇总指定日期（不提交）。"""
+        days = sorted({d for d in days if d is not None})
+        if not days:
+            return
+        t = DailyExamRollup.__table__
+        db.session.execute(t.delete().where(t.c.day.in_(days)))
+        db.session.execute(t.insert().from_select(_COLUMNS, self._aggregate(days)))
+
+    def rebuild(self) -> int:
+        """从 exam_records 全量重建每日汇总并提交，返回天数。"""
+        t = DailyExamRollup.__table__
+        db.session.execute(t.delete())
+        db.session.execute(t.insert().from_select(_COLUMNS, self._aggregate()))
+        db.session.commit()
+        return db.session.query(func.count(DailyExamRollup.day)).scalar()
+
+    @staticmethod
+    def _period_start(day: datetime.date, granularity: str) -> datetime.date:
+        if granularity == 'week':
+            return day - datetime.timedelta(days=day.weekday())  # 周一
+        if granularity == 'month':
+            return day.replace(day=1)
+        return day
+
+    def trend(self, days: int = 14, granularity: str = 'day',
+              today: Optional[datetime.date] = None) -> Dict[str, Any]:
+        """
+        最近 days 天的成绩趋势，granularity 为 day / week / month。
+        返回 {'dates': [每个周期的起始日期], 'avg_scores', 'counts', 'pass_rates'}，没有考试的周期为 0。
+        """
+        if granularity not in ('day', 'week', 'month'):
+            raise ValueError(f"不支持的粒度: {granularity}")
+        if not self._backfill.checked:
+            self.ensure_built()
+            db.session.commit()
+        today = today or datetime.datetime.utcnow().date()
+        first = today - datetime.timedelta(days=days - 1)
+        rows = (db.session.query(DailyExamRollup)
+                .filter(DailyExamRollup.day >= first, DailyExamRollup.day <= today)
+                .order_by(DailyExamRollup.day).all())
+        # 先按周期列出所有起始日期，保证没有考试的周期也出现在序列中
+        periods: Dict[datetime.date, List[float]] = {}
+        d = first
+        while d <= today:
+            periods.setdefault(self._period_start(d, granularity), [0, 0.0, 0])
+            d += datetime.timedelta(days=1)
+        for r in rows:
+            acc = periods[self._period_start(r.day, granularity)]
+            acc[0] += r.exam_count
+            acc[1] += r.score_sum
+            acc[2] += r.pass_count
+        dates, avg_scores, counts, pass_rates = [], [], [], []
+        for start, (n, score_sum, passed) in periods.items():
+            dates.append(start.isoformat())
+            counts.append(n)
+            avg_scores.append(score_sum / n if n else 0.0)
+            pass_rates.append(passed / n if n else 0.0)
+        return {'dates': dates, 'avg_scores': avg_scores, 'counts': counts, 'pass_rates': pass_rates}
+
+
+# module-level instance
+rollup_service = RollupService()
@@ -0,0 +1,79 @@
+# app/services/shared_epoch.py
+"""
+SharedEpoch
+-----------
+多个工作进程之间共享的"变化计数"：保存在数据库文件旁的小文件 <数据库文件>.<名称>-epoch 中。
+- 文件固定为 8 字节（小端无符号整数），bump() 在文件锁内读出计数、加一后写回偏移 0，
+  多个进程同时调用也不会丢失计数，文件大小不随调用次数增长（旧版本追加写出的长文件在下次 bump() 时截断）；
+- token() 返回 (inode, 计数)，只需打开文件读 8 个字节，不访问数据库；
+  其它进程发现 token 与上次看到的不同，就知道数据已被别的进程修改。
+非 SQLite 文件数据库或不在应用上下文中时不共享（token 恒为 None），只在本进程内生效。
+"""
+
+from typing import Optional, Tuple
+import os
+import threading
+
+from flask import current_app, has_app_context
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl；serve.py 在这类平台上不 fork，只需进程内的锁
+    fcntl = None
+
+_SIZE = 8
+
+
+def _read_counter(fd: int) -> int:
+    os.lseek(fd, 0, os.SEEK_SET)
+    data = os.read(fd, _SIZE)
+    return int.from_bytes(data.ljust(_SIZE, b'\0'), 'little')
+
+
+class SharedEpoch:
+    """基于文件的跨进程变化计数。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+
+    def path(self) -> Optional[str]:
+        if not has_app_context():
+            return None
+        uri = current_app.config.get('SQLALCHEMY_DATABASE_URI', '')
+        if not uri.startswith('sqlite:///') or ':memory:' in uri:
+            return None
+        return f"{uri.replace('sqlite:///', '')}.{self.name}-epoch"
+
+    def token(self) -> Optional[Tuple[int, int]]:
+        """当前的变化标识；文件不存在时为 (0, 0)。"""
+        path = self.path()
+        if path is None:
+            return None
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return (0, 0)
+        try:
+            return (os.fstat(fd).st_ino, _read_counter(fd))
+        finally:
+            os.close(fd)
+
+    def bump(self) -> None:
+        """通知其它进程数据已变化。"""
+        path = self.path()
+        if path is None:
+            return
+        with self._lock:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                value = (_read_counter(fd) + 1) & 0xFFFFFFFFFFFFFFFF
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, value.to_bytes(_SIZE, 'little'))
+                if os.fstat(fd).st_size > _SIZE:
+                    os.ftruncate(fd, _SIZE)
+            finally:
+                # 关闭文件同时释放 flock
+                os.close(fd)
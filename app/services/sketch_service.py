@@ -0,0 +1,321 @@
+# app/services/sketch_service.py
+"""
+SketchService
+-------------
+考试得分率与用时的流式统计摘要，查询分位数和直方图时不需要读取全部考试记录：
+- 每个摘要 = t-digest（合并式，近似分位数）+ 固定分桶直方图，两者都可合并；
+- 按范围保存在 score_sketches 表：global（全部）、user（用户）、question（题目）、day（UTC 日期）；
+- 每次记录考试时在同一事务中更新相关范围的摘要，序列化为紧凑的二进制；
+- 查询时把多个范围的摘要合并（例如最近 30 天 = 30 个 day 摘要），内存占用与记录数无关。
+指标：score_pct（得分率 0-100；题目范围为该题得分率）与 duration（考试用时，秒）。
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from array import array
+import bisect
+import datetime
+import math
+import struct
+
+from sqlalchemy import and_, or_
+
+from .. import db
+from ..models import ExamRecord, ScoreSketch
+from .backfill_guard import BackfillGuard
+from .grading_service import parse_details
+
+# 固定分桶的上边界（最后一桶包含上边界及以上）
+SCORE_PCT_BOUNDS = (10, 20, 30, 40, 50, 60, 70, 80, 90, 100)
+DURATION_BOUNDS = (30, 60, 120, 300, 600, 900, 1200, 1800, 2700, 3600, float('inf'))
+METRIC_BOUNDS = {'score_pct': SCORE_PCT_BOUNDS, 'duration': DURATION_BOUNDS}
+
+_HEADER = struct.Struct('<BHIddd')  # 版本, 分桶数, 质心数, count, min, max
+_VERSION = 1
+
+
+class TDigest:
+    """合并式 t-digest：质心按 k1 尺度函数合并，质心数约为 compression 量级。"""
+
+    def __init__(self, compression: float = 100.0):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buf: List[Tuple[float, float]] = []
+
+    def add(self, x: float, w: float = 1.0) -> None:
+        x = float(x)
+        self._buf.append((x, w))
+        self.count += w
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if len(self._buf) > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: 'TDigest') -> None:
+        other._compress()
+        self._buf.extend(zip(other.means, other.weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2.0 * math.pi) * math.asin(2.0 * min(1.0, max(0.0, q)) - 1.0)
+
+    def _compress(self) -> None:
+        if not self._buf:
+            return
+        items = sorted(list(zip(self.means, self.weights)) + self._buf)
+        self._buf = []
+        total = sum(w for _, w in items)
+        means, weights = [], []
+        cur_m, cur_w = items[0]
+        done = 0.0
+        k_lo = self._k(0.0)
+        for m, w in items[1:]:
+            if self._k((done + cur_w + w) / total) - k_lo <= 1.0:
+                cur_w += w
+                cur_m += (m - cur_m) * w / cur_w
+            else:
+                means.append(cur_m)
+                weights.append(cur_w)
+                done += cur_w
+                k_lo = self._k(done / total)
+                cur_m, cur_w = m, w
+        means.append(cur_m)
+        weights.append(cur_w)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """返回第 q（0-1）分位数的近似值；没有数据时返回 None。"""
+        self._compress()
+        n = len(self.means)
+        if n == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        if n == 1:
+            return self.means[0]
+        target = q * self.count
+        # 质心 i 的"中心"位于累计权重 cum_before + w_i / 2 处，在相邻中心之间线性插值
+        prev_x, prev_c = self.min, 0.0
+        cum = 0.0
+        for m, w in zip(self.means, self.weights):
+            center = cum + w / 2.0
+            if target < center:
+                if center == prev_c:
+                    return m
+                return prev_x + (m - prev_x) * (target - prev_c) / (center - prev_c)
+            prev_x, prev_c = m, center
+            cum += w
+        if self.count == prev_c:
+            return self.max
+        return prev_x + (self.max - prev_x) * (target - prev_c) / (self.count - prev_c)
+
+
+class Sketch:
+    """一个指标的摘要：t-digest + 固定分桶直方图。"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.digest = TDigest()
+        self.hist = [0] * len(self.bounds)
+
+    @property
+    def count(self) -> int:
+        return int(self.digest.count)
+
+    def add(self, x: float) -> None:
+        self.digest.add(x)
+        idx = min(len(self.bounds) - 1, bisect.bisect_right(self.bounds, x))
+        # 上边界归入当前桶（例如 100 分归入最后一桶、恰好 10 分归入 10-20 桶）
+        self.hist[idx] += 1
+
+    def merge(self, other: 'Sketch') -> None:
+        self.digest.merge(other.digest)
+        for i, c in enumerate(other.hist[:len(self.hist)]):
+            self.hist[i] += c
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.digest.quantile(q)
+
+    def to_bytes(self) -> bytes:
+        d = self.digest
+        d._compress()
+        header = _HEADER.pack(_VERSION, len(self.hist), len(d.means), d.count,
+                              d.min if d.count else 0.0, d.max if d.count else 0.0)
+        return (header + array('Q', self.hist).tobytes()
+                + array('f', d.means).tobytes() + array('d', d.weights).tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, bounds: Sequence[float]) -> 'Sketch':
+        sk = cls(bounds)
+        version, nh, nc, count, lo, hi = _HEADER.unpack_from(data, 0)
+        if version != _VERSION:
+            raise ValueError(f"不支持的摘要版本: {version}")
+        off = _HEADER.size
+        hist = array('Q')
+        hist.frombytes(data[off:off + 8 * nh])
+        off += 8 * nh
+        means = array('f')
+        means.frombytes(data[off:off + 4 * nc])
+        off += 4 * nc
+        weights = array('d')
+        weights.frombytes(data[off:off + 8 * nc])
+        sk.hist = list(hist)[:len(sk.hist)] + [0] * max(0, len(sk.hist) - nh)
+        sk.digest.means, sk.digest.weights = list(means), list(weights)
+        sk.digest.count = count
+        if count:
+            sk.digest.min, sk.digest.max = lo, hi
+        return sk
+
+
+def _score_pct(score: Optional[float], total: Optional[float]) -> float:
+    return 100.0 * float(score or 0.0) / total if total else 0.0
+
+
+class SketchService:
+    """摘要的更新、持久化与查询。"""
+
+    def __init__(self):
+        self._backfill = BackfillGuard(ScoreSketch.scope)
+
+    @staticmethod
+    def _observations(user_id: Optional[int], created_at: Optional[datetime.datetime],
+                      score: Optional[float], total: Optional[float], duration_seconds: Optional[int],
+                      details: Optional[Iterable[Dict[str, Any]]]) -> List[Tuple[str, str, str, float]]:
+        """一条考试记录对应的 (scope, scope_key, metric, value) 列表。"""
+        pct = _score_pct(score, total)
+        duration = float(duration_seconds or 0)
+        scopes = [('global', '')]
+        if user_id is not None:
+            scopes.append(('user', str(user_id)))
+        if created_at is not None:
+            scopes.append(('day', created_at.date().isoformat()))
+        obs = []
+        for scope, key in scopes:
+            obs.append((scope, key, 'score_pct', pct))
+            obs.append((scope, key, 'duration', duration))
+        for d in details or ():
+            qid = d.get('qid')
+            if qid is None or 'type' not in d:
+                continue
+            obs.append(('question', str(qid), 'score_pct', 100.0 * float(d.get('score') or 0.0)))
+        return obs
+
+    @staticmethod
+    def _load_rows(keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], ScoreSketch]:
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        rows = ScoreSketch.query.filter(or_(*[
+            and_(ScoreSketch.scope == s, ScoreSketch.scope_key == k, ScoreSketch.metric == m)
+            for s, k, m in keys])).all()
+        return {(r.scope, r.scope_key, r.metric): r for r in rows}
+
+    def _apply(self, obs: List[Tuple[str, str, str, float]]) -> None:
+        groups: Dict[Tuple[str, str, str], List[float]] = {}
+        for scope, key, metric, value in obs:
+            groups.setdefault((scope, key, metric), []).append(value)
+        rows = self._load_rows(groups)
+        now = datetime.datetime.utcnow()
+        for (scope, key, metric), values in groups.items():
+            bounds = METRIC_BOUNDS[metric]
+            row = rows.get((scope, key, metric))
+            sk = Sketch.from_bytes(row.data, bounds) if row is not None else Sketch(bounds)
+            for v in values:
+                sk.add(v)
+            if row is None:
+                row = ScoreSketch(scope=scope, scope_key=key, metric=metric)
+                db.session.add(row)
+            row.count, row.data, row.updated_at = sk.count, sk.to_bytes(), now
+
+    def record(self, rec: ExamRecord, details: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        """
+        把一条考试记录计入各范围的摘要。只修改会话、不提交，由调用方与考试记录一起 commit。
+        先 flush 考试记录：SQLite 写锁在此时取得，之后的"读-改-写"不会与其它提交交错。
+        """
+        # 每个进程检查一次：摘要表为空但已有考试记录（升级前的数据库）时先回填历史数据
+        self._backfill.run(lambda ex: self._write(self._scan(exclude_id=ex)), rec.id)
+        db.session.flush()
+        self._apply(self._observations(rec.user_id, rec.created_at, rec.score, rec.total,
+                                       rec.duration_seconds, details))
+
+    def _scan(self, batch_size: int = 2000, exclude_id: Optional[int] = None) -> Dict[Tuple[str, str, str], Sketch]:
+        """按 id 分批扫描 exam_records，在内存中构建全部摘要。"""
+        sketches: Dict[Tuple[str, str, str], Sketch] = {}
+        last_id = 0
+        while True:
+            q = (db.session.query(ExamRecord.id, ExamRecord.user_id, ExamRecord.created_at, ExamRecord.score,
+                                  ExamRecord.total, ExamRecord.duration_seconds, ExamRecord.details)
+                 .filter(ExamRecord.id > last_id))
+            if exclude_id is not None:
+                q = q.filter(ExamRecord.id != exclude_id)
+            rows = q.order_by(ExamRecord.id).limit(batch_size).all()
+            if not rows:
+                break
+            for _, uid, created_at, score, total, duration, text in rows:
+                for scope, key, metric, value in self._observations(uid, created_at, score, total, duration,
+                                                                    parse_details(text)):
+                    sk = sketches.get((scope, key, metric))
+                    if sk is None:
+                        sk = sketches[(scope, key, metric)] = Sketch(METRIC_BOUNDS[metric])
+                    sk.add(value)
+            last_id = rows[-1][0]
+        return sketches
+
+    @staticmethod
+    def _write(sketches: Dict[Tuple[str, str, str], Sketch]) -> None:
+        ScoreSketch.query.delete()
+        now = datetime.datetime.utcnow()
+        db.session.add_all([ScoreSketch(scope=s, scope_key=k, metric=m, count=sk.count,
+                                        data=sk.to_bytes(), updated_at=now)
+                            for (s, k, m), sk in sketches.items()])
+
+    def rebuild(self, batch_size: int = 2000) -> int:
+        """按 id 分批扫描 exam_records 重建全部摘要并提交，返回摘要条数。"""
+        sketches = self._scan(batch_size)
+        self._write(sketches)
+        db.session.commit()
+        return len(sketches)
+
+    # -----------------------------
+    # 查询
+    # -----------------------------
+    def load(self, scope: str, keys: Optional[Iterable[Any]] = None, metric: str = 'score_pct') -> Sketch:
+        """合并 scope 下若干 key（默认全部；global 只有一个）的摘要。"""
+        q = ScoreSketch.query.filter(ScoreSketch.scope == scope, ScoreSketch.metric == metric)
+        if scope == 'global':
+            q = q.filter(ScoreSketch.scope_key == '')
+        elif keys is not None:
+            q = q.filter(ScoreSketch.scope_key.in_([str(k) for k in keys]))
+        bounds = METRIC_BOUNDS[metric]
+        merged = Sketch(bounds)
+        # 逐行合并，内存中始终只保留一个合并结果
+        for row in q.yield_per(100):
+            merged.merge(Sketch.from_bytes(row.data, bounds))
+        return merged
+
+    def recent_days(self, days: int, today: Optional[datetime.date] = None) -> List[str]:
+        today = today or datetime.datetime.utcnow().date()
+        return [(today - datetime.timedelta(days=i)).isoformat() for i in range(days)]
+
+    def percentiles(self, ps: Sequence[float] = (50, 90, 99), scope: str = 'global',
+                    keys: Optional[Iterable[Any]] = None, metric: str = 'score_pct') -> Dict[str, Any]:
+        """返回 {'count', 'percentiles': {p: 值}, 'histogram': [...], 'bounds': [...]}。"""
+        sk = self.load(scope, keys, metric)
+        return {
+            'count': sk.count,
+            'percentiles': {p: sk.quantile(p / 100.0) for p in ps},
+            'histogram': list(sk.hist),
+            'bounds': list(sk.bounds),
+        }
+
+
+# module-level instance
+sketch_service = SketchService()
@@ -0,0 +1,178 @@
+# app/services/sqlite_service.py
+"""
+SqliteService
+-------------
+SQLite 的连接调优与后台维护：
+- init_app() 在引擎上注册 connect 事件，每个新连接按配置 SQLITE_PRAGMAS 执行 PRAGMA
+  （journal_mode=WAL 让读不阻塞写、synchronous=NORMAL、mmap_size、cache_size、temp_store、busy_timeout 等）；
+- start() 启动后台维护线程（每个进程一个，fork 之后在子进程中重新启动），
+  每隔 SQLITE_MAINTENANCE_INTERVAL 秒执行一次 wal_checkpoint(PASSIVE) 与 PRAGMA optimize，防止 WAL 文件无限增长；
+- backup_to() / restore_from() 用 SQLite 在线备份接口复制数据库：WAL 模式下数据库文件本身可能不含最近提交的数据，
+  直接复制或覆盖文件都不安全。
+"""
+
+from typing import Any, Dict, Optional
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from .. import db
+
+
+def apply_pragmas(dbapi_conn, pragmas: Dict[str, Any]) -> None:
+    """在一个 DB-API 连接上按顺序执行 PRAGMA。"""
+    cur = dbapi_conn.cursor()
+    try:
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name}={value}")
+    finally:
+        cur.close()
+
+
+class SqliteService:
+    """SQLite 调优与维护服务。"""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._app = None
+        self._stop = threading.Event()
+        self.last_maintenance: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def is_sqlite(app) -> bool:
+        return app.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('sqlite')
+
+    def init_app(self, app) -> None:
+        """给当前应用的引擎注册 PRAGMA 设置（需在应用上下文中、首次建立连接之前调用）。"""
+        if not self.is_sqlite(app):
+            return
+        pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+        engine = db.engine
+        if not pragmas or getattr(engine, '_exam_pragmas', None) is not None:
+            return
+        engine._exam_pragmas = pragmas
+
+        @event.listens_for(engine, 'connect')
+        def _on_connect(dbapi_conn, _record):
+            apply_pragmas(dbapi_conn, pragmas)
+
+        # 已经建立的连接（如 create_all 用过的）不会触发 connect 事件，丢弃后重新连接
+        engine.dispose()
+
+    def pragma(self, name: str) -> Any:
+        """读取当前连接上某个 PRAGMA 的值（用于检查配置是否生效）。"""
+        return db.session.connection().exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    def checkpoint(self, mode: str = 'PASSIVE') -> Dict[str, Any]:
+        """执行一次 WAL 检查点，返回 {'busy', 'log_frames', 'checkpointed'}（非 WAL 模式下均为 -1）。"""
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"不支持的检查点模式: {mode}")
+        with db.engine.connect() as conn:
+            busy, log_frames, checkpointed = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+        return {'busy': busy, 'log_frames': log_frames, 'checkpointed': checkpointed}
+
+    def optimize(self) -> None:
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+
+    def run_maintenance(self) -> Dict[str, Any]:
+        """检查点 + optimize，结果记在 last_maintenance 中。"""
+        started = time.monotonic()
+        result = self.checkpoint('PASSIVE')
+        self.optimize()
+        result['ms'] = round((time.monotonic() - started) * 1000, 2)
+        result['at'] = datetime.datetime.utcnow().isoformat(timespec='seconds')
+        self.last_maintenance = result
+        return result
+
+    def start(self, app) -> None:
+        """启动后台维护线程（间隔配置为 0 或非 SQLite 数据库时不启动）。"""
+        interval = app.config.get('SQLITE_MAINTENANCE_INTERVAL', 0)
+        if not interval or not self.is_sqlite(app):
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._app = app
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='sqlite-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                with self._app.app_context():
+                    self.run_maintenance()
+            except Exception:
+                # 维护失败（如数据库繁忙）不影响业务，下个周期重试
+                self._app.logger.warning('SQLite 维护任务失败', exc_info=True)
+
+    # -----------------------------
+    # 在线备份 / 恢复
+    # -----------------------------
+    @staticmethod
+    def _db_path() -> str:
+        if has_app_context():
+            uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+        else:
+            from ..config import Config
+            uri = Config.SQLALCHEMY_DATABASE_URI
+        return uri.replace('sqlite:///', '')
+
+    def backup_to(self, target_path: str, db_path: Optional[str] = None) -> None:
+        """把数据库（含 WAL 中已提交的数据）的一致快照写到 target_path。"""
+        src = sqlite3.connect(db_path or self._db_path(), timeout=30)
+        dst = sqlite3.connect(target_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+
+    def restore_from(self, source_path: str, db_path: Optional[str] = None) -> None:
+        """用 source_path 的内容替换当前数据库（通过 SQLite 写入，其它连接看到的是一次普通的提交）。"""
+        if has_app_context():
+            # 先结束本线程会话中的读事务，避免与下面的写入互相等待
+            db.session.remove()
+        db_path = db_path or self._db_path()
+        src = sqlite3.connect(source_path)
+        dst = sqlite3.connect(db_path, timeout=30)
+        try:
+            src.backup(dst)
+            # 各进程的考试记录快照按数据库中的纪元号判断是否重新加载，恢复出的纪元可能与已加载的相同
+            from .exam_snapshot import reset_epoch
+            reset_epoch(dst)
+        finally:
+            dst.close()
+            src.close()
+        # 备份可能来自旧版本的表结构，删除初始化标记，下次启动重新检查建表与迁移
+        try:
+            os.remove(db_path + '.init')
+        except OSError:
+            pass
+        if has_app_context():
+            # 连接池中的连接可能缓存了旧的 schema，丢弃后重新连接
+            db.engine.dispose()
+        # 恢复后的用户表可能降级或删除了账号：让所有会话重新校验角色，不再信任 session 中缓存的权限
+        from .principal_service import principal_service
+        principal_service.bump_epoch()
+        # 本进程的快照与看板缓存立即作废（其它进程的快照由纪元号发现，结果缓存最迟在 TTL 后更新）；
+        # 整个数据库都被替换，缓存条目直接丢弃，不按 stale-while-revalidate 再返回一次旧值
+        from .cache_service import result_cache
+        from .exam_snapshot import exam_snapshot
+        exam_snapshot.invalidate()
+        result_cache.invalidate('exams')
+        result_cache.clear()
+
+
+# module-level instance
+sqlite_service = SqliteService()
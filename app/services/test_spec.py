@@ -0,0 +1,72 @@
+# app/services/test_spec.py
+"""
+编程题结构化测试用例
+--------------------
+QuestionTestSpec 以 JSON 保存用例：[[参数列表, 期望值], ...]，也接受 [{"args": [...], "expected": ...}, ...]。
+本模块负责校验管理员录入的用例文本，并把数据库记录转换成判题进程使用的 spec 字典。
+"""
+
+from typing import Any, Dict, List, Optional
+import json
+
+from .judge_worker import source_hash
+
+COMPARE_MODES = ('exact', 'float', 'unordered', 'strip')
+
+
+def parse_cases(text: str) -> List[List[Any]]:
+    """解析并校验用例 JSON，返回 [[args, expected], ...]；格式不对时抛出 ValueError。"""
+    try:
+        raw = json.loads(text or '')
+    except ValueError as e:
+        raise ValueError(f"用例不是合法的 JSON: {e}")
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("用例必须是非空列表")
+    cases = []
+    for i, case in enumerate(raw, 1):
+        if isinstance(case, dict):
+            if 'args' not in case or 'expected' not in case:
+                raise ValueError(f"第 {i} 个用例缺少 args 或 expected")
+            args, expected = case['args'], case['expected']
+        elif isinstance(case, list) and len(case) == 2:
+            args, expected = case
+        else:
+            raise ValueError(f"第 {i} 个用例应为 [参数列表, 期望值]")
+        if not isinstance(args, list):
+            args = [args]
+        cases.append([args, expected])
+    return cases
+
+
+def build_spec(func_name: str, cases_text: str, compare_mode: Optional[str] = 'exact',
+               case_timeout: Optional[float] = 1.0, stop_on_fail: Optional[bool] = True) -> Dict[str, Any]:
+    """由数据库字段构造判题进程使用的 spec 字典。"""
+    mode = compare_mode if compare_mode in COMPARE_MODES else 'exact'
+    return {
+        'func_name': func_name,
+        'cases': parse_cases(cases_text),
+        'compare_mode': mode,
+        'case_timeout': float(case_timeout or 0) or None,
+        'stop_on_fail': True if stop_on_fail is None else bool(stop_on_fail),
+    }
+
+
+def spec_from_model(row) -> Optional[Dict[str, Any]]:
+    """QuestionTestSpec -> spec 字典；没有用例或用例已损坏时返回 None（退回判题模板）。"""
+    if row is None or not row.func_name:
+        return None
+    try:
+        return build_spec(row.func_name, row.cases, row.compare_mode, row.case_timeout, row.stop_on_fail)
+    except ValueError:
+        return None
+
+
+def spec_hash(spec: Dict[str, Any]) -> str:
+    """spec 的内容哈希，作用同判题模板哈希（判题结果缓存的键的一部分）。"""
+    return source_hash(json.dumps(spec, sort_keys=True, ensure_ascii=False))
+
+
+def spec_wall_seconds(spec: Dict[str, Any], default: float) -> float:
+    """整组用例的墙钟上限：不少于配置值，也不少于各用例超时之和再留 1 秒余量。"""
+    per_case = spec.get('case_timeout') or 0
+    return max(float(default), per_case * len(spec['cases']) + 1.0)
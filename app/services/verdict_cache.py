@@ -0,0 +1,111 @@
+# app/services/verdict_cache.py
+"""
+VerdictCache
+------------
+编程题判题结果缓存：同一道题、同一判题模板、规范化后相同的代码只执行一次。
+- 键：(question_id, 判题模板哈希, 规范化代码哈希)；
+- 内存中为有界 LRU，可选再持久化到 SQLite 的 judge_verdicts 表（进程重启后仍可命中）；
+- 管理员修改题目时调用 invalidate_question() 清掉该题的所有缓存结果。
+"""
+
+from typing import Dict, Optional, Set, Tuple
+from collections import OrderedDict
+import hashlib
+import threading
+
+from .. import db
+from ..models import JudgeVerdict
+
+
+def normalize_submission(code: str) -> str:
+    """规范化代码：统一换行符、去掉行尾空白和首尾空行（缩进保持不变）。"""
+    lines = (code or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def verdict_key(qid: Optional[int], judge_hash: str, code: str) -> str:
+    code_hash = hashlib.sha256(normalize_submission(code).encode('utf-8')).hexdigest()
+    raw = f"{qid or 0}:{judge_hash}:{code_hash}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class VerdictCache:
+    """有界 LRU 判题结果缓存，可选持久化。"""
+
+    def __init__(self, capacity: int = 10000, persist: bool = False):
+        self.capacity = max(1, int(capacity))
+        self.persist = persist
+        self._items: 'OrderedDict[str, Tuple[Optional[int], bool, str]]' = OrderedDict()
+        self._by_question: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, capacity: Optional[int] = None, persist: Optional[bool] = None) -> None:
+        if capacity is not None:
+            self.capacity = max(1, int(capacity))
+        if persist is not None:
+            self.persist = bool(persist)
+
+    def get(self, key: str) -> Optional[Tuple[bool, str]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1], item[2]
+        if self.persist:
+            row = db.session.get(JudgeVerdict, key)
+            if row is not None:
+                self._remember(key, row.question_id, row.ok, row.msg or '')
+                with self._lock:
+                    self.hits += 1
+                return row.ok, row.msg or ''
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, qid: Optional[int], ok: bool, msg: str) -> None:
+        self._remember(key, qid, ok, msg)
+        if self.persist:
+            # 走独立连接写入，不影响当前请求的 ORM 会话
+            stmt = JudgeVerdict.__table__.insert().prefix_with('OR REPLACE')
+            with db.engine.begin() as conn:
+                conn.execute(stmt, {'key': key, 'question_id': qid, 'ok': ok, 'msg': msg})
+
+    def _remember(self, key: str, qid: Optional[int], ok: bool, msg: str) -> None:
+        with self._lock:
+            self._items[key] = (qid, ok, msg)
+            self._items.move_to_end(key)
+            if qid is not None:
+                self._by_question.setdefault(qid, set()).add(key)
+            while len(self._items) > self.capacity:
+                old_key, (old_qid, _, _) = self._items.popitem(last=False)
+                keys = self._by_question.get(old_qid)
+                if keys is not None:
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._by_question[old_qid]
+
+    def invalidate_question(self, qid: int) -> int:
+        """清除某道题的全部缓存结果（内存与持久化），返回清除的内存条目数。"""
+        with self._lock:
+            keys = self._by_question.pop(qid, set())
+            for key in keys:
+                self._items.pop(key, None)
+        if self.persist:
+            with db.engine.begin() as conn:
+                conn.execute(JudgeVerdict.__table__.delete().where(JudgeVerdict.question_id == qid))
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._by_question.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._items), 'capacity': self.capacity, 'hits': self.hits, 'misses': self.misses}
+
+
+# module-level instance
+verdict_cache = VerdictCache()
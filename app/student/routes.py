@@ -1,8 +1,12 @@
 # app/student/routes.py
-from flask import Blueprint, render_template, session, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, session, redirect, url_for, flash, request, current_app, jsonify
 from ..models import Question, ExamRecord, User
 from .. import db
-from ..utils import grade_choice, grade_fill, safe_exec
+from ..services.exam_service import exam_service
+from ..services.grading_service import grading_service
+from ..services.judge_queue import judge_queue, JudgeQueueFull
+from ..services.principal_service import principal_service
+from ..services.test_spec import spec_from_model
 from flask_wtf import FlaskForm
 from wtforms import TextAreaField, SubmitField
 from wtforms.validators import DataRequired, Length
@@ -18,7 +22,8 @@ def login_required(f):
     from functools import wraps
     @wraps(f)
     def wrapper(*args, **kwargs):
-        if 'user_id' not in session:
+        # 会话被注销（账号删除、改密等）后要求重新登录；常规请求不查询数据库
+        if principal_service.current() is None:
             flash('请先登录', 'warning')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -39,63 +44,55 @@ def practice():
     qs = Question.query.limit(5).all()
     return render_template('student/practice.html', qs=qs)
 
+def _grade_and_record(paper, uid):
+    """按试卷评分并保存考试记录，返回记录。"""
+    # 评分引擎按题型读取对应表单字段，答案键批量加载
+    ids = [item.question_id for item in paper.items]
+    keys = grading_service.store.keys_for(ids)
+    answers = {}
+    for qid in ids:
+        key = keys.get(qid)
+        field = f'code_{qid}' if key is not None and key.qtype == 'code' else f'answer_{qid}'
+        answers[qid] = request.form.get(field, '')
+    res = grading_service.grade(answers)
+    score, total, details = res['score'], res['total'], res['details']
+    try:
+        start_iso = session.get('exam_start')
+        start_dt = datetime.datetime.fromisoformat(start_iso) if start_iso else datetime.datetime.utcnow()
+    except Exception:
+        start_dt = datetime.datetime.utcnow()
+    duration = (datetime.datetime.utcnow() - start_dt).seconds
+    # 考试记录、逐题作答与排行榜、每日汇总在同一事务中提交
+    rec = exam_service.add_record(uid, score, total, duration, details)
+    paper.submitted_at = rec.created_at
+    db.session.commit()
+    return rec
+
 @student_bp.route('/exam', methods=['GET', 'POST'])
 @login_required
 def exam():
     if request.method == 'GET':
         session['exam_start'] = datetime.datetime.utcnow().isoformat()
-        # 随机选择5道题
-        all_questions = Question.query.all()
-        if len(all_questions) > 5:
-            import random
-            qs = random.sample(all_questions, 5)
-        else:
-            qs = all_questions
+        # 按组卷蓝图从试卷池取卷并保存，提交时按这张试卷评分
+        paper = exam_service.create_exam_paper(session.get('user_id'))
+        session['exam_paper_id'] = paper.id
+        qs = exam_service.load_paper_questions(paper)
         return render_template('student/exam.html', qs=qs)
     
     # POST 提交试卷
     uid = session.get('user_id')
-    # 获取提交的5道题
-    all_questions = Question.query.all()
-    if len(all_questions) > 5:
-        import random
-        qs = random.sample(all_questions, 5)
-    else:
-        qs = all_questions
-    
-    total = 0.0
-    score = 0.0
-    details = []
-    for q in qs:
-        total += 1.0
-        if q.qtype == 'choice':
-            ans = request.form.get(f'answer_{q.id}', '')
-            sc = grade_choice(q.answer or '', ans)
-            score += sc
-            details.append({'qid': q.id, 'type': 'choice', 'score': sc, 'got': ans})
-        elif q.qtype == 'fill':
-            ans = request.form.get(f'answer_{q.id}', '')
-            sc = grade_fill(q.answer or '', ans)
-            score += sc
-            details.append({'qid': q.id, 'type': 'fill', 'score': sc, 'got': ans})
-        elif q.qtype == 'code':
-            code = request.form.get(f'code_{q.id}', '')
-            ok, msg = safe_exec(code or '', q.judge_template or '')
-            sc = 1.0 if ok else 0.0
-            score += sc
-            details.append({'qid': q.id, 'type': 'code', 'score': sc, 'msg': msg})
-        else:
-            details.append({'qid': q.id, 'type': 'unknown', 'score': 0.0})
+    # 原子地抢占试卷：同一张试卷并发提交两次时只有一次会被评分、记录
+    paper = exam_service.claim_paper(session.get('exam_paper_id'), uid)
+    if paper is None:
+        flash('试卷不存在或已提交，请重新开始考试', 'warning')
+        return redirect(url_for('student.dashboard'))
     try:
-        start_iso = session.get('exam_start')
-        start_dt = datetime.datetime.fromisoformat(start_iso) if start_iso else datetime.datetime.utcnow()
+        rec = _grade_and_record(paper, uid)
     except Exception:
-        start_dt = datetime.datetime.utcnow()
-    duration = (datetime.datetime.utcnow() - start_dt).seconds
-    rec = ExamRecord(user_id=uid, score=score, total=total, duration_seconds=duration, details=str(details))
-    db.session.add(rec)
-    db.session.commit()
-    flash(f'考试提交完成，得分 {score}/{total}', 'success')
+        exam_service.release_paper(paper.id)
+        raise
+    session.pop('exam_paper_id', None)
+    flash(f'考试提交完成，得分 {rec.score}/{rec.total}', 'success')
     return redirect(url_for('student.dashboard'))
 
 @student_bp.route('/code_run/<int:qid>', methods=['GET', 'POST'])
@@ -103,9 +100,24 @@ def exam():
 def code_run(qid):
     q = Question.query.get_or_404(qid)
     form = CodeSubmitForm()
-    result = None
+    job_id = None
     if form.validate_on_submit():
-        code = form.code.data
-        ok, msg = safe_exec(code, q.judge_template or '')
-        result = {'ok': ok, 'msg': msg}
-    return render_template('student/code_run.html', q=q, form=form, result=result)
+        # 放入异步判题队列，页面立即返回 job id，由前端轮询结果
+        judge_queue.start(current_app._get_current_object())
+        try:
+            job = judge_queue.submit(session.get('user_id'), q.id, form.code.data, q.judge_template or '',
+                                     spec_from_model(q.test_spec))
+            job_id = job.id
+        except JudgeQueueFull as e:
+            flash(str(e), 'warning')
+    return render_template('student/code_run.html', q=q, form=form, job_id=job_id)
+
+@student_bp.route('/code_run/status/<job_id>')
+@login_required
+def code_run_status(job_id):
+    # 多进程部署时任务可能由其它工作进程提交，需先按配置启用共享状态目录
+    judge_queue.start(current_app._get_current_object())
+    st = judge_queue.status(job_id, user_id=session.get('user_id'))
+    if st is None:
+        return jsonify({'status': 'missing'}), 404
+    return jsonify(st)
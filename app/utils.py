@@ -2,32 +2,19 @@
 """
 判题工具与其它辅助函数。
 为满足“行数多但简单”的要求，本文件内写一些冗余的简单函数（便于扩展）。
-注意：本判题使用 exec，存在风险。因为这是单机作业并且你要求快速开发，这里使用最简单实现。
+注意：判题代码在独立的工作进程中执行（见 services/judge_service.py），Web 线程不再直接 exec 学生代码。
 """
 
-import traceback
-
 def safe_exec(user_code: str, judge_code: str, allowed_builtins=None):
     """
-    将学生代码和判题代码拼接并执行。
+    将学生代码和判题代码交给判题进程池执行。
     返回 (success: bool, message: str)
-    这个实现限制了 __builtins__ 为一个非常小的映射（非常弱的安全措施）。
+    allowed_builtins 为允许使用的内置函数（名称列表或以名称为键的字典），默认是一个很小的白名单。
+    工作进程带 CPU/内存/输出限制，并由父进程做墙钟超时。
     """
-    if allowed_builtins is None:
-        allowed_builtins = {
-            'range': range, 'len': len, 'int': int, 'float': float, 'str': str, 'print': print, 'enumerate': enumerate
-        }
-    local_vars = {}
-    global_vars = {'__builtins__': allowed_builtins}
-    combined = user_code + "\n\n" + judge_code
-    try:
-        exec(combined, global_vars, local_vars)
-        return True, "判题通过"
-    except AssertionError as ae:
-        return False, f"断言失败: {ae}"
-    except Exception as e:
-        tb = traceback.format_exc()
-        return False, f"运行出错: {e}\\n{tb}"
+    from .services.judge_service import judge_service
+    names = list(allowed_builtins) if allowed_builtins is not None else None
+    return judge_service.run(user_code, judge_code, builtins=names)
 
 # 下面写一些看似有用途但很简单的辅助函数以增加行数：
 def normalize_answer(ans: str) -> str:
@@ -0,0 +1,83 @@
+# bench_startup.py
+"""
+启动耗时基准：在独立子进程中分别测量
+- import：导入 app 包（flask、sqlalchemy 与模型定义）；
+- cold：首次 create_app()（删除初始化标记，执行建表 / 迁移 / 内置账号检查）；
+- warm：再次 create_app()（初始化标记有效，跳过上述检查）。
+每项重复 --repeat 次取中位数；warm 超过 --budget-ms 时以非零状态退出，可放在部署脚本或 CI 中。
+默认使用 testing 配置（独立的 exam_app_test.db），不会改动开发数据库。
+
+用法示例：
+    python bench_startup.py
+    python bench_startup.py --repeat 10 --budget-ms 800
+    python bench_startup.py --env development
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 子进程中执行的测量代码：输出 {'import_ms', 'create_ms'}
+_PROBE = r"""
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+if {cold!r}:
+    from app.config import get_config
+    uri = get_config({env!r}).SQLALCHEMY_DATABASE_URI
+    try:
+        os.remove(uri.replace('sqlite:///', '') + '.init')
+    except OSError:
+        pass
+t2 = time.perf_counter()
+app.create_app({env!r})
+t3 = time.perf_counter()
+print(json.dumps({{'import_ms': (t1 - t0) * 1000, 'create_ms': (t3 - t2) * 1000}}))
+"""
+
+
+def probe(env: str, cold: bool) -> dict:
+    code = _PROBE.format(root=ROOT, env=env, cold=cold)
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='测量应用导入与 create_app() 的耗时')
+    parser.add_argument('--env', default='testing', help='配置环境（默认 testing）')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数（默认 5）')
+    parser.add_argument('--budget-ms', type=float, default=1000.0,
+                        help='warm 启动（导入 + create_app）的耗时上限，毫秒（默认 1000）')
+    args = parser.parse_args()
+
+    probe(args.env, cold=False)  # 预热文件系统缓存并确保数据库已存在
+    cold = [probe(args.env, cold=True) for _ in range(args.repeat)]
+    warm = [probe(args.env, cold=False) for _ in range(args.repeat)]
+
+    import_ms = statistics.median(r['import_ms'] for r in cold + warm)
+    cold_ms = statistics.median(r['create_ms'] for r in cold)
+    warm_ms = statistics.median(r['create_ms'] for r in warm)
+    warm_total = statistics.median(r['import_ms'] + r['create_ms'] for r in warm)
+
+    print(f"环境: {args.env}，每项 {args.repeat} 次取中位数")
+    print(f"  导入 app 包          {import_ms:8.1f} ms")
+    print(f"  create_app（首次）   {cold_ms:8.1f} ms")
+    print(f"  create_app（已初始化）{warm_ms:8.1f} ms")
+    print(f"  warm 启动合计        {warm_total:8.1f} ms（上限 {args.budget_ms:.0f} ms）")
+    if warm_total > args.budget_ms:
+        print("✗ 超出启动耗时上限")
+        return 1
+    print("✓ 启动耗时在上限内")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
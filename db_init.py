@@ -9,7 +9,8 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
-from app.models import User, Question, ExamRecord, insert_sample_questions
+from app.models import User, Question, ExamRecord
+from app.seed import insert_sample_questions
 
 def init_database():
     """初始化数据库"""
@@ -24,7 +24,7 @@ def import_questions():
             return
         
         # 导入题目
-        from app.models import insert_sample_questions
+        from app.seed import insert_sample_questions
         added_count = insert_sample_questions()
         
         count_after = Question.query.count()
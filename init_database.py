@@ -9,7 +9,8 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
-from app.models import User, Question, insert_sample_questions
+from app.models import User, Question
+from app.seed import insert_sample_questions
 
 def init_database(force=False):
     """初始化数据库"""
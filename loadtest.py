@@ -0,0 +1,343 @@
+# loadtest.py
+"""
+压力测试脚本：模拟 N 个学生并发走完真实的页面流程，用于考试前评估部署容量。
+
+每个虚拟学生：登录 -> 打开 /student/exam -> 提交试卷 -> 打开 code_run 并提交代码 -> 轮询判题结果，
+重复若干轮。默认在进程内通过 Flask test client 访问：先把开发数据库复制到临时目录，
+在副本上创建 loadtest_* 学生账号并压测，结束后删除副本，不会把压测产生的账号、试卷和考试记录
+写进真实数据库（排行榜、每日汇总、分位数摘要与项目分析不受影响）；确实要压测开发数据库本身时加 --use-dev-db。
+也可以用 --url 压测已启动的服务器。
+
+结束后输出每个接口的请求数、错误数、吞吐量与 p50/p95/p99 延迟，
+进程内模式还会统计 SQLite "database is locked" 错误数和疑似锁等待的慢语句数。
+
+用法示例：
+    python loadtest.py --students 50 --rounds 3
+    python loadtest.py --students 50 --use-dev-db         # 直接写入开发数据库
+    python loadtest.py --url http://127.0.0.1:5000 --students 20 --admin x --admin-password 1
+"""
+
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+FIELD_RE = re.compile(r'name="(answer|code)_(\d+)"')
+STATUS_URL_RE = re.compile(r'data-status-url="([^"]+)"')
+
+SAMPLE_CODE = "def f(x):\n    return x\n"
+
+
+class FlaskTestClient:
+    """进程内客户端：直接调用 WSGI 应用，不经过网络。"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        r = self.client.get(path)
+        return r.status_code, r.get_data(as_text=True)
+
+    def post(self, path, data):
+        r = self.client.post(path, data=data)
+        return r.status_code, r.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpClient:
+    """通过 HTTP 访问已启动的服务器，每个虚拟学生一个 cookie 会话。"""
+
+    def __init__(self, base_url: str, timeout: float = 60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _open(self, req):
+        try:
+            with self.opener.open(req, timeout=self.timeout) as r:
+                return r.status, r.read().decode('utf-8', errors='replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', errors='replace')
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data).encode('utf-8')
+        return self._open(urllib.request.Request(self.base_url + path, data=body))
+
+
+class Metrics:
+    """按接口汇总延迟与错误数（线程安全）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, ms: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(ms)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    @staticmethod
+    def percentile(sorted_values, p: float) -> float:
+        if not sorted_values:
+            return 0.0
+        # 最近秩法
+        idx = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+        return sorted_values[idx]
+
+    def summary(self, elapsed: float):
+        rows = []
+        for endpoint, values in self.latencies.items():
+            values = sorted(values)
+            rows.append({
+                'endpoint': endpoint,
+                'count': len(values),
+                'errors': self.errors.get(endpoint, 0),
+                'rps': len(values) / elapsed if elapsed else 0.0,
+                'p50': self.percentile(values, 50),
+                'p95': self.percentile(values, 95),
+                'p99': self.percentile(values, 99),
+                'max': values[-1],
+            })
+        return rows
+
+
+class LockMonitor:
+    """进程内模式下统计 SQLite 锁冲突：locked 错误数，以及耗时超过阈值的写语句数（多为等待锁）。"""
+
+    def __init__(self, engine, slow_ms: float = 100.0):
+        from sqlalchemy import event
+        self.locked_errors = 0
+        self.slow_writes = 0
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        event.listen(engine, 'handle_error', self._on_error)
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _on_error(self, ctx):
+        if 'database is locked' in str(ctx.original_exception):
+            with self._lock:
+                self.locked_errors += 1
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('loadtest_start', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['loadtest_start'].pop()
+        if (time.perf_counter() - start) * 1000.0 > self.slow_ms and \
+                not statement.lstrip().upper().startswith('SELECT'):
+            with self._lock:
+                self.slow_writes += 1
+
+
+class VirtualStudent(threading.Thread):
+    """一个虚拟学生：按真实页面流程循环考试与运行代码。"""
+
+    def __init__(self, client, username: str, password: str, rounds: int, metrics: Metrics,
+                 code_runs: int = 1, judge_timeout: float = 60.0):
+        super().__init__(daemon=True)
+        self.client = client
+        self.username = username
+        self.password = password
+        self.rounds = rounds
+        self.metrics = metrics
+        self.code_runs = code_runs
+        self.judge_timeout = judge_timeout
+
+    def _call(self, endpoint: str, method: str, path: str, data=None, expect=(200, 302)):
+        start = time.perf_counter()
+        try:
+            status, text = self.client.get(path) if method == 'GET' else self.client.post(path, data)
+        except Exception:
+            status, text = 0, ''
+        self.metrics.record(endpoint, (time.perf_counter() - start) * 1000.0, status in expect)
+        return status, text
+
+    def login(self) -> bool:
+        _, text = self._call('GET /login', 'GET', '/login')
+        m = CSRF_RE.search(text)
+        status, _ = self._call('POST /login', 'POST', '/login', {
+            'csrf_token': m.group(1) if m else '', 'username': self.username, 'password': self.password})
+        return status == 302
+
+    def take_exam(self):
+        """打开试卷并随机作答提交，返回试卷中的编程题 id 列表。"""
+        _, text = self._call('GET /student/exam', 'GET', '/student/exam')
+        data, code_qids = {}, []
+        for kind, qid in dict.fromkeys(FIELD_RE.findall(text)):
+            if kind == 'code':
+                data[f'code_{qid}'] = SAMPLE_CODE
+                code_qids.append(int(qid))
+            else:
+                data[f'answer_{qid}'] = random.choice('ABCD')
+        self._call('POST /student/exam', 'POST', '/student/exam', data)
+        return code_qids
+
+    def run_code(self, qid: int) -> None:
+        _, text = self._call('GET /student/code_run', 'GET', f'/student/code_run/{qid}')
+        m = CSRF_RE.search(text)
+        start = time.perf_counter()
+        _, text = self._call('POST /student/code_run', 'POST', f'/student/code_run/{qid}',
+                             {'csrf_token': m.group(1) if m else '', 'code': SAMPLE_CODE})
+        m = STATUS_URL_RE.search(text)
+        if not m:
+            self.metrics.record('判题完成(端到端)', (time.perf_counter() - start) * 1000.0, False)
+            return
+        status_url = m.group(1).replace('&amp;', '&')
+        done = False
+        while time.perf_counter() - start < self.judge_timeout:
+            status, body = self._call('GET /student/code_run/status', 'GET', status_url)
+            try:
+                done = status == 200 and json.loads(body).get('status') == 'done'
+            except ValueError:
+                done = False
+            if done or status != 200:
+                break
+            time.sleep(0.2)
+        self.metrics.record('判题完成(端到端)', (time.perf_counter() - start) * 1000.0, done)
+
+    def run(self) -> None:
+        if not self.login():
+            return
+        for _ in range(self.rounds):
+            code_qids = self.take_exam()
+            for qid in code_qids[:self.code_runs]:
+                self.run_code(qid)
+
+
+def make_local_app(use_dev_db: bool):
+    """进程内模式的应用，返回 (app, 临时目录)；默认在开发数据库的临时副本上运行。"""
+    from app import create_app
+    from app.config import get_config
+    if use_dev_db:
+        return create_app(), None
+    base = get_config()
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    copy = os.path.join(workdir, 'exam_app.db')
+    src = base.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+    if os.path.exists(src):
+        from app.services.sqlite_service import sqlite_service
+        sqlite_service.backup_to(copy, db_path=src)
+    config = type('LoadTestConfig', (base,), {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + copy})
+    return create_app(config), workdir
+
+
+def ensure_local_users(app, names, password: str) -> None:
+    from app import db
+    from app.models import User
+    with app.app_context():
+        existing = {u.username for u in User.query.filter(User.username.in_(names)).all()}
+        for name in names:
+            if name not in existing:
+                u = User(username=name, is_admin=False)
+                u.set_password(password)
+                db.session.add(u)
+        db.session.commit()
+
+
+def ensure_remote_users(base_url: str, admin: str, admin_password: str, names, password: str) -> None:
+    client = HttpClient(base_url)
+    m = CSRF_RE.search(client.get('/login')[1])
+    client.post('/login', {'csrf_token': m.group(1) if m else '', 'username': admin, 'password': admin_password})
+    for name in names:
+        m = CSRF_RE.search(client.get('/admin/create_student')[1])
+        client.post('/admin/create_student', {'csrf_token': m.group(1) if m else '',
+                                              'username': name, 'password': password})
+
+
+def print_report(rows, elapsed: float, students: int, monitor=None) -> None:
+    total = sum(r['count'] for r in rows)
+    print(f"\n{students} 个虚拟学生，耗时 {elapsed:.1f}s，共 {total} 个请求，吞吐量 {total / elapsed:.1f} req/s")
+    header = f"{'接口':<30}{'次数':>8}{'错误':>6}{'req/s':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'maxms':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in sorted(rows, key=lambda r: r['endpoint']):
+        print(f"{r['endpoint']:<30}{r['count']:>8}{r['errors']:>6}{r['rps']:>9.1f}"
+              f"{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['max']:>9.1f}")
+    if monitor is not None:
+        print(f"\nSQLite 'database is locked' 错误: {monitor.locked_errors}，"
+              f"超过 {monitor.slow_ms:.0f}ms 的写语句（疑似锁等待）: {monitor.slow_writes}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='在线考试系统压力测试')
+    parser.add_argument('--students', type=int, default=20, help='并发虚拟学生数')
+    parser.add_argument('--rounds', type=int, default=1, help='每个学生考试的轮数')
+    parser.add_argument('--code-runs', type=int, default=1, help='每轮考试后运行代码的题数')
+    parser.add_argument('--url', default=None, help='压测已启动的服务器（默认进程内 test client）')
+    parser.add_argument('--prefix', default='loadtest_', help='虚拟学生用户名前缀')
+    parser.add_argument('--password', default='loadtest', help='虚拟学生密码')
+    parser.add_argument('--admin', default=None, help='--url 模式下用于创建学生账号的管理员用户名')
+    parser.add_argument('--admin-password', default=None, help='管理员密码')
+    parser.add_argument('--judge-timeout', type=float, default=60.0, help='等待判题结果的最长秒数')
+    parser.add_argument('--slow-ms', type=float, default=100.0, help='写语句超过该毫秒数计为疑似锁等待')
+    parser.add_argument('--use-dev-db', action='store_true',
+                        help='进程内模式直接写入开发数据库（默认使用临时副本，结束后删除）')
+    parser.add_argument('--json', dest='json_path', default=None, help='把结果另存为 JSON 文件')
+    args = parser.parse_args(argv)
+
+    names = [f'{args.prefix}{i}' for i in range(args.students)]
+    monitor = None
+    workdir = None
+    if args.url:
+        if args.admin:
+            ensure_remote_users(args.url, args.admin, args.admin_password or '', names, args.password)
+        make_client = lambda: HttpClient(args.url, timeout=args.judge_timeout)
+    else:
+        from app import db
+        app, workdir = make_local_app(args.use_dev_db)
+        ensure_local_users(app, names, args.password)
+        with app.app_context():
+            monitor = LockMonitor(db.engine, args.slow_ms)
+        make_client = lambda: FlaskTestClient(app)
+
+    metrics = Metrics()
+    students = [VirtualStudent(make_client(), name, args.password, args.rounds, metrics,
+                               args.code_runs, args.judge_timeout) for name in names]
+    start = time.perf_counter()
+    try:
+        for s in students:
+            s.start()
+        for s in students:
+            s.join()
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    rows = metrics.summary(elapsed)
+    print_report(rows, elapsed, args.students, monitor)
+    if args.json_path:
+        result = {'students': args.students, 'elapsed': elapsed, 'endpoints': rows}
+        if monitor is not None:
+            result['sqlite'] = {'locked_errors': monitor.locked_errors, 'slow_writes': monitor.slow_writes}
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# maintenance.py
+"""
+运维命令行工具。
+
+用法示例：
+    python maintenance.py regrade                         # 重评全部考试记录
+    python maintenance.py regrade --qid 12 --qid 15       # 只重评包含第 12、15 题的记录
+    python maintenance.py regrade --since 2024-03-01 --until 2024-03-31 --workers 4
+    python maintenance.py regrade --restart               # 忽略检查点，从头开始
+    python maintenance.py rebuild-stats                   # 从考试记录重建排行榜、每日汇总与分位数摘要
+    python maintenance.py backfill-answers                # 把历史考试明细拆分回填到 exam_answers（升级后执行一次）
+    python maintenance.py migrate                         # 执行未执行的数据库迁移
+    python maintenance.py migrate --status                # 只查看迁移状态
+    python maintenance.py revoke-sessions                 # 手工修改账号权限后，让所有会话重新校验角色
+    python maintenance.py revoke-sessions --user alice    # 注销某个用户的全部会话
+"""
+
+import argparse
+import datetime
+import os
+import sys
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+
+
+def _parse_date(value: str) -> datetime.date:
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为 YYYY-MM-DD: {value}")
+
+
+def cmd_regrade(args) -> None:
+    """批量重评历史考试记录，可中断后重新执行同一命令继续。"""
+    from app.services.regrade_service import regrade_service
+
+    since = datetime.datetime.combine(args.since, datetime.time()) if args.since else None
+    # --until 为包含当天的结束日期
+    until = datetime.datetime.combine(args.until + datetime.timedelta(days=1), datetime.time()) if args.until else None
+
+    def progress(cp):
+        print(f"[{cp.name}] 已处理 {cp.processed} 条，修改 {cp.changed} 条，last_id={cp.last_id}", flush=True)
+
+    app = create_app()
+    with app.app_context():
+        cp = regrade_service.run(qids=args.qid or None, since=since, until=until,
+                                 batch_size=args.batch_size, workers=args.workers,
+                                 name=args.name, restart=args.restart, progress=progress)
+        print(f"重评完成：共处理 {cp.processed} 条记录，修改 {cp.changed} 条")
+
+
+def cmd_rebuild_stats(args) -> None:
+    """从 exam_records 全量重建排行榜、每日汇总与分位数摘要（首次部署或数据修复后执行）。"""
+    from app.services.leaderboard_service import leaderboard_service
+    from app.services.rollup_service import rollup_service
+    from app.services.sketch_service import sketch_service
+
+    app = create_app()
+    with app.app_context():
+        n = leaderboard_service.rebuild()
+        print(f"排行榜重建完成：共 {n} 个用户")
+        n = rollup_service.rebuild()
+        print(f"每日汇总重建完成：共 {n} 天")
+        n = sketch_service.rebuild()
+        print(f"分位数摘要重建完成：共 {n} 个")
+
+
+def cmd_backfill_answers(args) -> None:
+    """解析历史考试记录的 details（JSON 与 str(list) 两种格式）回填逐题作答表，可中断后继续。"""
+    from app.services.answer_service import answer_service
+
+    def progress(cp):
+        print(f"已处理 {cp.processed} 条记录，写入 {cp.changed} 行，last_id={cp.last_id}", flush=True)
+
+    app = create_app()
+    with app.app_context():
+        cp = answer_service.backfill(batch_size=args.batch_size, restart=args.restart, progress=progress)
+        print(f"回填完成：共处理 {cp.processed} 条记录，写入 {cp.changed} 行逐题作答")
+
+
+def cmd_migrate(args) -> None:
+    """
+    执行（或查看）数据库迁移。应用启动时默认会自动迁移（配置 AUTO_MIGRATE），
+    关闭自动迁移的部署用这个命令单独执行；本命令自身以 auto_migrate=False 创建应用，--status 只查看不执行。
+    """
+    from app import migrations
+
+    app = create_app(auto_migrate=False)
+    with app.app_context():
+        if args.status:
+            print(f"当前版本 {migrations.current_version()}，最新版本 {migrations.head_version()}")
+            for m in migrations.pending():
+                print(f"  待执行 {m.version}: {m.name}")
+            return
+        done = migrations.upgrade(target=args.target, log=print)
+        print(f"迁移完成：本次执行 {len(done)} 个，当前版本 {migrations.current_version()}")
+
+
+def cmd_revoke_sessions(args) -> None:
+    """推进权限纪元：所有会话在下一次请求时重新校验；指定 --user 时该用户的会话全部失效。"""
+    from app import db
+    from app.models import User
+    from app.services.principal_service import principal_service
+
+    app = create_app()
+    with app.app_context():
+        if args.user is None:
+            principal_service.bump_epoch()
+            print("已推进权限纪元，所有会话将在下一次请求时重新校验")
+            return
+        u = User.query.filter_by(username=args.user).first()
+        if u is None:
+            print(f"用户不存在: {args.user}")
+            sys.exit(1)
+        principal_service.revoke(u.id)
+        db.session.commit()
+        print(f"已注销用户 {args.user} 的全部会话")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='在线考试系统运维工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('regrade', help='批量重评历史考试记录')
+    p.add_argument('--qid', type=int, action='append', help='只重评包含该题目的记录（可重复指定）')
+    p.add_argument('--since', type=_parse_date, help='起始日期（含），YYYY-MM-DD')
+    p.add_argument('--until', type=_parse_date, help='结束日期（含），YYYY-MM-DD')
+    p.add_argument('--batch-size', type=int, default=None, help='每批记录数，默认取配置 REGRADE_BATCH_SIZE')
+    p.add_argument('--workers', type=int, default=None, help='评分进程数，默认取配置 REGRADE_WORKERS')
+    p.add_argument('--name', default=None, help='检查点名称，默认由筛选条件生成')
+    p.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+    p.set_defaults(func=cmd_regrade)
+
+    p = sub.add_parser('rebuild-stats', help='从考试记录重建排行榜、每日汇总与分位数摘要')
+    p.set_defaults(func=cmd_rebuild_stats)
+
+    p = sub.add_parser('backfill-answers', help='把历史考试明细回填到逐题作答表 exam_answers')
+    p.add_argument('--batch-size', type=int, default=1000, help='每批记录数')
+    p.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+    p.set_defaults(func=cmd_backfill_answers)
+
+    p = sub.add_parser('migrate', help='执行数据库迁移')
+    p.add_argument('--status', action='store_true', help='只显示当前版本与待执行的迁移')
+    p.add_argument('--target', type=int, default=None, help='只迁移到该版本')
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser('revoke-sessions', help='让已登录的会话重新校验权限或注销某个用户的会话')
+    p.add_argument('--user', default=None, help='只注销该用户名的会话')
+    p.set_defaults(func=cmd_revoke_sessions)
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+# serve.py
+"""
+多进程生产服务器（纯标准库，预派生模型）。
+
+主进程创建应用、预加载答案键 / 题库索引 / 看板统计缓存并监听端口，然后 fork 出若干工作进程：
+- 工作进程继承主进程已加载的数据（写时复制，共享内存页），每个进程用固定数量的线程处理请求；
+- 每个工作进程处理 --max-requests（加随机抖动）个请求后优雅退出，由主进程补上新进程，防止内存缓慢增长；
+- 发送 SIGHUP 时主进程重新预加载数据并滚动替换工作进程（先启动新进程，再让旧进程处理完手头请求后退出），
+  不中断服务；代码改动需要完整重启；
+- SIGTERM / SIGINT：所有工作进程处理完手头请求后退出（最多等待 --graceful-timeout 秒）。
+fork 之后工作进程丢弃继承的数据库连接，并各自启动 SQLite 维护线程；判题进程池、判题队列等在首次使用时按进程启动，
+判题任务状态通过共享目录对所有工作进程可见（JUDGE_JOBS_SHARED），题库修改通过共享计数文件通知其它进程。
+不支持 fork 的平台或指定 --workers 1 --single 时在当前进程中以多线程方式运行。
+
+用法示例：
+    python serve.py                                  # 按配置 SERVE_* 启动，默认每个 CPU 核一个工作进程
+    python serve.py --host 0.0.0.0 --port 8000 --workers 8 --threads 16
+    python serve.py --env development --max-requests 5000  # 默认使用 production 配置
+    kill -HUP <主进程 pid>                           # 重新加载数据并滚动重启工作进程
+"""
+
+import argparse
+import gc
+import os
+import random
+import selectors
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+
+
+class QuietHandler(WSGIRequestHandler):
+    """默认不逐条输出访问日志（--access-log 时输出到标准错误）。"""
+    access_log = False
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+
+class PreforkWSGIServer(WSGIServer):
+    """监听套接字在主进程中创建，各工作进程共享并各自 accept。"""
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def get_request(self):
+        request, addr = super().get_request()
+        # 监听套接字是非阻塞的，已接受的连接按阻塞方式读写
+        request.setblocking(True)
+        return request, addr
+
+    def _handle(self, request, addr, slots: threading.Semaphore) -> None:
+        try:
+            self.finish_request(request, addr)
+        except Exception:
+            self.handle_error(request, addr)
+        finally:
+            self.shutdown_request(request)
+            slots.release()
+
+    def serve_worker(self, threads: int, max_requests: int, stop: threading.Event) -> int:
+        """
+        用 threads 个线程处理请求，直到 stop 被设置或处理满 max_requests 个（0 表示不限），
+        等待手头的请求处理完后返回已处理的请求数。
+        """
+        slots = threading.Semaphore(threads)
+        pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        handled = 0
+        with selectors.DefaultSelector() as sel:
+            sel.register(self.socket, selectors.EVENT_READ)
+            while not stop.is_set() and (not max_requests or handled < max_requests):
+                # 所有线程都忙时不再 accept，连接留在内核队列中由其它进程接收
+                if not slots.acquire(timeout=0.5):
+                    continue
+                try:
+                    if not sel.select(0.5):
+                        slots.release()
+                        continue
+                    request, addr = self.get_request()
+                except OSError:
+                    # 连接被其它工作进程抢先接收
+                    slots.release()
+                    continue
+                handled += 1
+                pool.submit(self._handle, request, addr, slots)
+        pool.shutdown(wait=True)
+        return handled
+
+
+def preload(app) -> Dict[str, Any]:
+    """在 fork 之前加载各进程共享的只读数据，返回各项数量。"""
+    from app.services.analytics_service import AnalyticsService
+    from app.services.grading_service import grading_service
+    from app.services.question_index import question_index
+    from app.services.sqlite_service import sqlite_service
+
+    started = time.monotonic()
+    with app.app_context():
+        stats: Dict[str, Any] = {'answer_keys': grading_service.store.preload()}
+        stats['indexed_questions'] = sum(question_index.bucket_sizes().values())
+        # 看板用到的统计结果（写入结果缓存；有列式快照时顺带加载快照）
+        analytics = AnalyticsService()
+        analytics.summary_metrics()
+        analytics.score_percentiles()
+        analytics.score_percentiles(recent_days=30)
+        analytics.duration_percentiles()
+        db.session.remove()
+        # 不把数据库连接带进子进程
+        db.engine.dispose()
+    # 主进程不处理请求，维护线程由各工作进程启动
+    sqlite_service.stop()
+    stats['ms'] = round((time.monotonic() - started) * 1000, 1)
+    # 预加载的对象不再参与垃圾回收扫描，避免回收时改写引用计数所在的内存页，破坏写时复制
+    gc.collect()
+    gc.freeze()
+    return stats
+
+
+class Arbiter:
+    """主进程：派生、监控与替换工作进程。"""
+
+    def __init__(self, app, server: PreforkWSGIServer, workers: int, threads: int,
+                 max_requests: int, jitter: int, graceful_timeout: float):
+        self.app = app
+        self.server = server
+        self.num_workers = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.jitter = jitter
+        self.graceful_timeout = graceful_timeout
+        self.generation = 0
+        self.workers: Dict[int, int] = {}  # pid -> generation
+        self._signal: Optional[str] = None
+
+    # -----------------------------
+    # 工作进程
+    # -----------------------------
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = self.generation
+            return pid
+        code = 0
+        try:
+            self._worker_main()
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _worker_main(self) -> None:
+        from app.services.judge_queue import judge_queue
+        from app.services.judge_service import judge_service
+        from app.services.sqlite_service import sqlite_service
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        # 终端的 Ctrl-C 会发给整个进程组，由主进程统一处理
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        with self.app.app_context():
+            # 丢弃（而不是关闭）可能从主进程继承的连接
+            db.engine.dispose(close=False)
+        sqlite_service.start(self.app)
+        limit = self.max_requests + random.randint(0, self.jitter) if self.max_requests else 0
+        self.server.serve_worker(self.threads, limit, stop)
+        # 已排队的判题任务完成并写出结果后再退出
+        judge_queue.drain(self.graceful_timeout)
+        # 判题进程继承了兄弟进程的管道端，不会因本进程退出而自动结束，需显式关闭
+        judge_service.pool.shutdown()
+
+    def reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            self.workers.pop(pid, None)
+            if status and self._signal != 'stop':
+                print(f"工作进程 {pid} 异常退出（状态 {status}）", file=sys.stderr)
+
+    def kill_workers(self, sig: int, generation: Optional[int] = None) -> None:
+        for pid, gen in list(self.workers.items()):
+            if generation is None or gen == generation:
+                try:
+                    os.kill(pid, sig)
+                except ProcessLookupError:
+                    self.workers.pop(pid, None)
+
+    # -----------------------------
+    # 主循环
+    # -----------------------------
+    def _on_signal(self, signum, _frame) -> None:
+        self._signal = 'reload' if signum == signal.SIGHUP else 'stop'
+
+    def reload(self) -> None:
+        """重新预加载数据，启动新一代工作进程后让旧进程优雅退出。"""
+        gc.unfreeze()
+        stats = preload(self.app)
+        print(f"重新加载完成: {stats}")
+        old = self.generation
+        self.generation += 1
+        for _ in range(self.num_workers):
+            self.spawn()
+        self.kill_workers(signal.SIGTERM, generation=old)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGHUP, self._on_signal)
+        last_spawn = 0.0
+        while True:
+            self.reap()
+            if self._signal == 'stop':
+                break
+            if self._signal == 'reload':
+                self._signal = None
+                self.reload()
+            missing = self.num_workers - sum(1 for g in self.workers.values() if g == self.generation)
+            if missing > 0:
+                # 工作进程启动即退出时限制重启频率
+                if time.monotonic() - last_spawn < 1.0:
+                    time.sleep(1.0)
+                last_spawn = time.monotonic()
+                for _ in range(missing):
+                    self.spawn()
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        self.kill_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.kill_workers(signal.SIGKILL)
+        self.reap()
+        self.server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='多进程 WSGI 服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--env', default=os.environ.get('EXAM_APP_ENV') or 'production',
+                        help='配置环境（默认取 EXAM_APP_ENV，未设置时为 production）')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数（默认配置 SERVE_WORKERS，0 为 CPU 核数）')
+    parser.add_argument('--threads', type=int, default=None, help='每个进程的处理线程数')
+    parser.add_argument('--max-requests', type=int, default=None, help='每个进程处理多少请求后重启（0 表示不重启）')
+    parser.add_argument('--max-requests-jitter', type=int, default=None)
+    parser.add_argument('--graceful-timeout', type=float, default=None, help='优雅退出的最长等待秒数')
+    parser.add_argument('--single', action='store_true', help='不 fork，在当前进程中以多线程方式运行')
+    parser.add_argument('--access-log', action='store_true', help='输出访问日志')
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    cfg = app.config
+    workers = args.workers if args.workers is not None else cfg.get('SERVE_WORKERS', 0)
+    workers = workers or os.cpu_count() or 1
+    threads = args.threads or cfg.get('SERVE_THREADS', 8)
+    max_requests = args.max_requests if args.max_requests is not None else cfg.get('SERVE_MAX_REQUESTS', 0)
+    jitter = (args.max_requests_jitter if args.max_requests_jitter is not None
+              else cfg.get('SERVE_MAX_REQUESTS_JITTER', 0))
+    graceful = args.graceful_timeout if args.graceful_timeout is not None else cfg.get('SERVE_GRACEFUL_TIMEOUT', 30)
+    QuietHandler.access_log = args.access_log
+
+    server = PreforkWSGIServer((args.host, args.port), QuietHandler)
+    server.set_app(app)
+    server.socket.setblocking(False)
+
+    if args.single or not hasattr(os, 'fork'):
+        print(f"单进程模式: http://{args.host}:{args.port}  线程 {threads}")
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        try:
+            server.serve_worker(threads, 0, stop)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    # 状态轮询可能落到另一个工作进程上
+    app.config['JUDGE_JOBS_SHARED'] = True
+    stats = preload(app)
+    print(f"预加载完成: {stats}")
+    print(f"主进程 {os.getpid()}: http://{args.host}:{args.port}  工作进程 {workers} × 线程 {threads}，"
+          f"每进程 {max_requests or '不限'} 个请求后重启")
+    Arbiter(app, server, workers, threads, max_requests, jitter, graceful).run()
+
+
+if __name__ == '__main__':
+    main()
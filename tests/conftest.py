@@ -0,0 +1,32 @@
+# tests/conftest.py
+"""测试共用的 fixture：每个用例使用临时目录中的新数据库。"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, create_app, db
+from app.models import User
+from app.services.leaderboard_service import leaderboard_service
+from app.services.rollup_service import rollup_service
+from app.services.sketch_service import sketch_service
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        'sqlite:///' + str(tmp_path / 'exam.db'))
+    app = create_app('testing')
+    # 回填检查每个进程只做一次，每个用例使用新的数据库，需要重新检查
+    for service in (leaderboard_service, rollup_service, sketch_service):
+        service._backfill.checked = False
+    with app.app_context():
+        u = User(username='s1')
+        u.set_password('1')
+        db.session.add(u)
+        db.session.commit()
+        yield app
+        db.session.remove()
@@ -0,0 +1,16 @@
+# tests/test_answers.py
+"""旧格式考试明细拆分为逐题作答行。"""
+
+from app.services.answer_service import answer_rows
+
+
+def test_exam_service_format_scores_from_ok():
+    rows = answer_rows(1, [{'qid': 3, 'ok': True, 'type': 'choice'},
+                           {'qid': 4, 'ok': False, 'type': 'fill', 'got': 'y'}])
+    assert [(r['correct'], r['score']) for r in rows] == [(True, 1.0), (False, 0.0)]
+
+
+def test_str_list_format_correct_from_score():
+    rows = answer_rows(1, [{'qid': 3, 'type': 'choice', 'score': 1.0, 'got': 'A'},
+                           {'qid': 4, 'type': 'fill', 'score': 0.0, 'got': 'y'}])
+    assert [(r['correct'], r['score'], r['response']) for r in rows] == [(True, 1.0, 'A'), (False, 0.0, 'y')]
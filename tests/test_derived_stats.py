@@ -0,0 +1,50 @@
+# tests/test_derived_stats.py
+"""派生统计表首次回填不能重复计入正在写入的考试记录。"""
+
+import datetime
+
+import pytest
+
+from app import db
+from app.models import DailyExamRollup, ExamRecord, User, UserStats
+from app.services.exam_service import exam_service
+
+
+def _student_id():
+    return User.query.filter_by(username='s1').one().id
+
+
+def _rollup_today():
+    return db.session.get(DailyExamRollup, datetime.datetime.utcnow().date())
+
+
+def _submit(uid, score):
+    exam_service.add_record(uid, score, 10.0, 60, [])
+    db.session.commit()
+
+
+def test_first_two_submits_on_empty_stats(app):
+    uid = _student_id()
+    _submit(uid, 3.0)
+    _submit(uid, 5.0)
+    stats = db.session.get(UserStats, uid)
+    assert stats.attempts == 2
+    assert stats.score_sum == pytest.approx(8.0)
+    rollup = _rollup_today()
+    assert rollup.exam_count == 2
+    assert rollup.score_sum == pytest.approx(8.0)
+
+
+def test_backfill_counts_existing_records_once(app):
+    uid = _student_id()
+    # 升级前的数据库：已有考试记录，派生表为空
+    db.session.add(ExamRecord(user_id=uid, score=4.0, total=10.0, duration_seconds=30,
+                              created_at=datetime.datetime.utcnow(), details='[]'))
+    db.session.commit()
+    _submit(uid, 6.0)
+    stats = db.session.get(UserStats, uid)
+    assert stats.attempts == 2
+    assert stats.score_sum == pytest.approx(10.0)
+    rollup = _rollup_today()
+    assert rollup.exam_count == 2
+    assert rollup.score_sum == pytest.approx(10.0)
@@ -0,0 +1,35 @@
+# tests/test_grading.py
+"""批量评分：判题池排队的时间不计入后面提交的评分时限。"""
+
+import time
+
+from app.services.grading_service import AnswerKey, GradingService
+
+
+class _Store:
+    def __init__(self, keys):
+        self.keys = {k.qid: k for k in keys}
+
+    def keys_for(self, qids):
+        return {q: self.keys[q] for q in qids if q in self.keys}
+
+
+def _slow_judge(key, code):
+    time.sleep(0.2)
+    return True, '判题通过'
+
+
+def test_batch_deadline_is_per_submission():
+    store = _Store([AnswerKey(1, 'code', None, ''), AnswerKey(2, 'choice', 'A', None)])
+    grader = GradingService(store=store, judge=_slow_judge, max_parallel_judges=1)
+    # 判题池一次只判一道：整批需要约 0.8 秒，每份提交自己只需要 0.2 秒
+    results = grader.grade_batch([{1: 'code', 2: 'A'} for _ in range(4)], deadline_seconds=0.5)
+    assert [r['score'] for r in results] == [2.0] * 4
+
+
+def test_slow_submission_still_times_out():
+    store = _Store([AnswerKey(1, 'code', None, '')])
+    grader = GradingService(store=store, judge=_slow_judge, max_parallel_judges=1)
+    results = grader.grade_batch([{1: 'code'}], deadline_seconds=0.05)
+    assert results[0]['score'] == 0.0
+    assert '超时' in results[0]['details'][0]['msg']
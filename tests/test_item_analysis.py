@@ -0,0 +1,65 @@
+# tests/test_item_analysis.py
+"""项目分析累计量：NumPy 与逐行两种累加结果一致；重评中断后不重复计数。"""
+
+import math
+import random
+
+import pytest
+
+from app import db
+from app.models import ExamAnswer, User
+from app.services import item_analysis_service as ias
+from app.services.exam_service import exam_service
+from app.services.question_service import QuestionService
+from app.services.regrade_service import regrade_service
+
+
+def _random_columns(rows=5000):
+    rnd = random.Random(7)
+    cols = ias.Columns()
+    for _ in range(rows):
+        cols.qid.append(rnd.randint(1, 50))
+        cols.x.append(rnd.randint(0, 1))
+        cols.y.append(rnd.random())
+        cols.opt.append(rnd.choice([-1, 0, 1, 2, 3, 4]))
+        cols.ms.append(math.nan if rnd.random() < 0.5 else rnd.random() * 100)
+    return cols
+
+
+def test_numpy_and_loop_aggregate_agree(monkeypatch):
+    np = pytest.importorskip('numpy')
+    cols = _random_columns()
+    monkeypatch.setattr(ias, 'np', np)
+    vectorized = ias.aggregate(cols)
+    monkeypatch.setattr(ias, 'np', None)
+    looped = ias.aggregate(cols)
+    assert vectorized.keys() == looped.keys()
+    for qid, sums in looped.items():
+        assert vectorized[qid] == pytest.approx(sums)
+        # 写库前必须是 Python 数值，sqlite3 不能绑定 NumPy 标量
+        assert all(type(v) in (int, float) for v in vectorized[qid])
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def test_interrupted_regrade_does_not_double_count(app):
+    qid = QuestionService().create_question('fill', 'q', answer='x').id
+    uid = User.query.filter_by(username='s1').one().id
+    for got in ('x', 'y', 'y'):
+        exam_service.add_record(uid, 0.0, 1.0, 30, [{'qid': qid, 'type': 'fill', 'ok': got == 'x',
+                                                     'score': 1.0 if got == 'x' else 0.0, 'got': got}])
+        db.session.commit()
+    assert ias.item_analysis_service.stats_for([qid])[qid]['n'] == 3
+
+    def stop_after_first_batch(cp):
+        raise _Interrupted()
+
+    QuestionService().update_question(qid, answer='y')
+    with pytest.raises(_Interrupted):
+        regrade_service.run(workers=1, batch_size=1, restart=True, progress=stop_after_first_batch)
+    stats = ias.item_analysis_service.stats_for([qid])[qid]
+    assert stats['n'] == ExamAnswer.query.count() == 3
+    correct = ExamAnswer.query.filter(ExamAnswer.correct.is_(True)).count()
+    assert stats['p_value'] == pytest.approx(correct / 3)
@@ -0,0 +1,65 @@
+# tests/test_regrade.py
+"""答案键未变时重评不能改变旧格式记录的得分。"""
+
+import datetime
+import json
+
+import pytest
+
+from app import db
+from app.models import ExamRecord, User
+from app.services.question_service import QuestionService
+from app.services.regrade_service import regrade_service
+
+
+@pytest.fixture
+def questions(app):
+    qs = QuestionService()
+    return [qs.create_question('choice', 'q1', 'a', 'b', 'c', 'd', answer='A').id,
+            qs.create_question('fill', 'q2', answer='x').id]
+
+
+def _add_record(details_text, score):
+    uid = User.query.filter_by(username='s1').one().id
+    rec = ExamRecord(user_id=uid, score=score, total=2.0, duration_seconds=30,
+                     created_at=datetime.datetime.utcnow(), details=details_text)
+    db.session.add(rec)
+    db.session.commit()
+    return rec.id
+
+
+def _regraded_score(rec_id):
+    regrade_service.run(workers=1, restart=True)
+    db.session.expire_all()
+    return db.session.get(ExamRecord, rec_id).score
+
+
+def test_exam_service_format_keeps_score(questions):
+    # ExamService 旧格式：答对的题只有 ok，没有 score 和 got
+    q1, q2 = questions
+    rec_id = _add_record(json.dumps([
+        {'qid': q1, 'ok': True, 'type': 'choice'},
+        {'qid': q2, 'ok': False, 'type': 'fill', 'expected': 'x', 'got': 'y'},
+    ]), 1.0)
+    assert _regraded_score(rec_id) == pytest.approx(1.0)
+
+
+def test_str_list_format_keeps_score(questions):
+    # 考试路由旧格式：str(list)，有 score 没有 ok
+    q1, q2 = questions
+    rec_id = _add_record(str([
+        {'qid': q1, 'type': 'choice', 'score': 1.0, 'got': 'A'},
+        {'qid': q2, 'type': 'fill', 'score': 0.0, 'got': 'y'},
+    ]), 1.0)
+    assert _regraded_score(rec_id) == pytest.approx(1.0)
+
+
+def test_changed_key_counts_legacy_correct_items(questions):
+    # 答案修正后，被改动的记录重新汇总时，旧格式中答对的题仍按 1 分计
+    q1, q2 = questions
+    rec_id = _add_record(json.dumps([
+        {'qid': q1, 'ok': True, 'type': 'choice'},
+        {'qid': q2, 'ok': False, 'type': 'fill', 'expected': 'x', 'got': 'y'},
+    ]), 1.0)
+    QuestionService().update_question(q2, answer='y')
+    assert _regraded_score(rec_id) == pytest.approx(2.0)